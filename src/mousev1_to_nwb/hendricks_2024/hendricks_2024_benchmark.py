@@ -0,0 +1,675 @@
+"""Benchmarks for the Hendricks2024 conversion."""
+
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import numpy as np
+import h5py
+
+from neuroconv.utils import FolderPathType, FilePathType, load_dict_from_file, dict_deep_update
+
+from pynwb import NWBFile
+from pynwb.device import Device
+from pynwb.ophys import ImageSegmentation
+from ndx_patterned_ogen import PatternedOptogeneticStimulusTable
+
+from hendricks_2024_nwbconverter import Hendricks2024NWBConverter, get_default_segmentation_to_imaging_name_mapping
+from hendricks_2024_holostiminterface import (
+    Hendricks2024HolographicStimulationInterface,
+    create_patterned_optogenetic_stimulus_table,
+    match_targets_to_rois,
+)
+from hendricks_2024_imaginginterface import Hendricks2024SinglePlaneImagingInterface
+from hendricks_2024_imagingextractor import (
+    Hendricks2024DeinterleavedSinglePlaneImagingExtractor,
+    Hendricks2024DeinterleavingTiffReader,
+    Hendricks2024ImagingPrefetcher,
+    Hendricks2024PrefetchingImagingExtractor,
+    Hendricks2024WrappedImagingExtractor,
+    read_into_page_cache,
+)
+from hendricks_2024_visualstimulusinterface import (
+    Hendricks2024VisualStimuliInterface,
+    create_visual_stimuli_table,
+    get_visual_stimulus_group_columns,
+)
+from hendricks_2024_datasetconfiguration import configure_imaging_datasets
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex
+from hendricks_2024_segmentationextractor import Hendricks2024Suite2pSessionStore
+from hendricks_2024_convert_session import session_to_nwb
+
+
+def benchmark_converter_construction(
+    imaging_folder_path: FolderPathType,
+    segmentation_folder_path: Optional[FolderPathType] = None,
+    segmentation_start_frame: int = 0,
+    segmentation_end_frame: int = 100,
+    holographic_stimulation_file_path: Optional[FilePathType] = None,
+    epoch_name: Optional[str] = None,
+    visual_stimulus_file_path: Optional[FilePathType] = None,
+    visual_stimulus_type: Optional[str] = None,
+) -> dict:
+    """
+    Time the construction of Hendricks2024NWBConverter for one epoch.
+
+    Returns the time spent constructing the converter, the time spent listing the interfaces, the time spent
+    constructing each interface the first time it is accessed, and the time spent constructing the segmentation and
+    stimulus interfaces a second time, which is what the converter used to pay eagerly.
+    """
+    imaging_folder_path = Path(imaging_folder_path)
+    segmentation_to_imaging_map = None
+    if segmentation_folder_path:
+        segmentation_to_imaging_map = get_default_segmentation_to_imaging_name_mapping(
+            imaging_folder_path, segmentation_folder_path
+        )
+
+    start_time = time.perf_counter()
+    converter = Hendricks2024NWBConverter(
+        imaging_folder_path=imaging_folder_path,
+        segmentation_folder_path=segmentation_folder_path,
+        segmentation_to_imaging_map=segmentation_to_imaging_map,
+        segmentation_start_frame=segmentation_start_frame,
+        segmentation_end_frame=segmentation_end_frame,
+        holographic_stimulation_file_path=holographic_stimulation_file_path,
+        epoch_name=epoch_name,
+        visual_stimulus_file_path=visual_stimulus_file_path,
+        visual_stimulus_type=visual_stimulus_type,
+        verbose=False,
+    )
+    results = dict(converter_construction_time=time.perf_counter() - start_time, interface_construction_time=dict())
+
+    # The channels and planes are probed when the names of the interfaces are first needed
+    start_time = time.perf_counter()
+    interface_names = list(converter.data_interface_objects)
+    results.update(interface_listing_time=time.perf_counter() - start_time)
+
+    duplicated_construction_time = 0.0
+    for interface_name in interface_names:
+        start_time = time.perf_counter()
+        converter.data_interface_objects[interface_name]
+        results["interface_construction_time"][interface_name] = time.perf_counter() - start_time
+
+        if "Imaging" not in interface_name:
+            interface_class, source_data = converter.data_interface_objects.get_interface_class_and_source_data(
+                interface_name
+            )
+            start_time = time.perf_counter()
+            interface_class(**source_data)
+            duplicated_construction_time += time.perf_counter() - start_time
+
+    results["total_interface_construction_time"] = sum(results["interface_construction_time"].values())
+    results["duplicated_construction_time"] = duplicated_construction_time
+
+    return results
+
+
+def _create_patterned_optogenetic_stimulus_table_row_wise(
+    stimulus_onsets: dict, stimulus_pattern, stimulus_site, targets: list
+) -> PatternedOptogeneticStimulusTable:
+    """Reference implementation adding one row per stimulus onset, as the interface used to do."""
+    stimulus_table = PatternedOptogeneticStimulusTable(
+        name="PatternedOptogeneticStimulusTable", description="Patterned stimulus"
+    )
+    for onset_index in range(len(stimulus_onsets["start_time"])):
+        power = np.zeros(stimulus_onsets["num_rois"][onset_index])
+        power[stimulus_onsets["roi_position"][onset_index]] = stimulus_onsets["power"][onset_index]
+        stimulus_table.add_row(
+            start_time=stimulus_onsets["start_time"][onset_index],
+            stop_time=stimulus_onsets["stop_time"][onset_index],
+            power_per_roi=power,
+            frequency=stimulus_onsets["frequency"][onset_index],
+            stimulus_pattern=stimulus_pattern,
+            targets=targets[onset_index],
+            stimulus_site=stimulus_site,
+            tags=[f"trial {stimulus_onsets['trial'][onset_index]}"],
+        )
+    return stimulus_table
+
+
+def benchmark_holographic_stimulus_table(
+    imaging_folder_path: FolderPathType,
+    holographic_stimulation_file_path: FilePathType,
+    epoch_name: str,
+    num_repeats: int = 3,
+) -> dict:
+    """
+    Time the construction of the PatternedOptogeneticStimulusTable of one epoch, column-wise against row-wise.
+
+    Returns the number of stimulus onsets and the best time (over `num_repeats`) of each step.
+    """
+    interface = Hendricks2024HolographicStimulationInterface(
+        folder_path=imaging_folder_path,
+        holographic_stimulation_file_path=holographic_stimulation_file_path,
+        epoch_name=epoch_name,
+        verbose=False,
+    )
+    metadata = interface.get_metadata()
+    holographic_metadata_path = Path(__file__).parent / "hendricks_2024_holostim_metadata.yaml"
+    metadata = dict_deep_update(metadata, load_dict_from_file(holographic_metadata_path))
+    metadata["Ophys"]["Device"] = [dict(name="CustomMicroscope")]
+
+    nwbfile = NWBFile(
+        session_description="Benchmark of the holographic stimulation table.",
+        identifier="benchmark",
+        session_start_time=datetime.now().astimezone(),
+    )
+    nwbfile.add_device(Device(name="CustomMicroscope"))
+    nwbfile.create_processing_module(name="ophys", description="optical physiology processed data")
+    nwbfile.processing["ophys"].add(ImageSegmentation(name="ImageSegmentation"))
+    interface.add_to_nwbfile(nwbfile=nwbfile, metadata=metadata)
+
+    stimulus_pattern = nwbfile.lab_meta_data["TemporalFocusing"]
+    stimulus_site = list(nwbfile.ogen_sites.values())[0]
+    image_segmentation = nwbfile.processing["ophys"]["ImageSegmentation"]
+    targeted_plane_segmentation = image_segmentation[interface.targeted_plane_segmentation_name]
+    plane_segmentation = image_segmentation["PlaneSegmentationChannel1ConcatenatedPlanes"]
+
+    results = dict(stimulus_onsets_time=np.inf, column_wise_time=np.inf, row_wise_time=np.inf)
+    for _ in range(num_repeats):
+        start_time = time.perf_counter()
+        stimulus_onsets = interface.get_stimulus_onsets()
+        holograms = interface.add_holograms_to_nwbfile(
+            nwbfile=nwbfile,
+            targeted_plane_segmentation=targeted_plane_segmentation,
+            plane_segmentation=plane_segmentation,
+        )
+        targets = [holograms[stim_id] for stim_id in stimulus_onsets["stim_id"]]
+        results["stimulus_onsets_time"] = min(results["stimulus_onsets_time"], time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        create_patterned_optogenetic_stimulus_table(
+            stimulus_onsets=stimulus_onsets,
+            stimulus_pattern=stimulus_pattern,
+            stimulus_site=stimulus_site,
+            targets=targets,
+        )
+        results["column_wise_time"] = min(results["column_wise_time"], time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        _create_patterned_optogenetic_stimulus_table_row_wise(
+            stimulus_onsets=stimulus_onsets,
+            stimulus_pattern=stimulus_pattern,
+            stimulus_site=stimulus_site,
+            targets=targets,
+        )
+        results["row_wise_time"] = min(results["row_wise_time"], time.perf_counter() - start_time)
+    results["num_stimulus_onsets"] = len(stimulus_onsets["start_time"])
+
+    return results
+
+
+def benchmark_visual_stimuli_table(
+    imaging_folder_path: FolderPathType,
+    visual_stimulus_file_path: FilePathType,
+    visual_stimulus_type: str,
+    num_repeats: int = 3,
+) -> dict:
+    """
+    Time the construction of the VisualStimuli table of one epoch.
+
+    Returns the number of trials, the time spent reading the trial start times from the .tif files (once) and the
+    best time (over `num_repeats`) to read the visual stimulus group and build the table.
+    """
+    interface = Hendricks2024VisualStimuliInterface(
+        folder_path=imaging_folder_path,
+        visual_stimulus_file_path=visual_stimulus_file_path,
+        visual_stimulus_type=visual_stimulus_type,
+        verbose=False,
+    )
+    start_time = time.perf_counter()
+    trial_start_times = interface.trial_start_times
+    results = dict(trial_start_times_time=time.perf_counter() - start_time, table_time=np.inf)
+
+    for _ in range(num_repeats):
+        start_time = time.perf_counter()
+        visual_stimulus_groups = {
+            visual_stimulus_type: get_visual_stimulus_group_columns(
+                trial_start_times=trial_start_times, visual_stim_dict=visual_stim_dict
+            )
+            for visual_stimulus_type, visual_stim_dict in interface.visual_stim_dicts.items()
+        }
+        create_visual_stimuli_table(visual_stimulus_groups=visual_stimulus_groups)
+        results["table_time"] = min(results["table_time"], time.perf_counter() - start_time)
+    results["num_trials"] = len(trial_start_times)
+    interface.stimulus_file.close()
+
+    return results
+
+
+def benchmark_holographic_target_matching(
+    imaging_folder_path: FolderPathType,
+    holographic_stimulation_file_path: FilePathType,
+    epoch_name: str,
+    segmentation_folder_path: Optional[FolderPathType] = None,
+    max_target_distance: float = 5.0,
+) -> dict:
+    """
+    Time the matching of the ScanImage targets of one epoch to the segmented rois, and compare it to 'targeted_cells'.
+
+    Returns the number of targets, the number of targets matched to a roi, the number of targets where the match
+    differs from 'targeted_cells' and the time of the matching (including the read of 'stat.npy' when the Suite2p
+    folder is given).
+    """
+    suite2p_store = None
+    if segmentation_folder_path is not None:
+        suite2p_store = Hendricks2024Suite2pSessionStore(folder_path=segmentation_folder_path)
+    interface = Hendricks2024HolographicStimulationInterface(
+        folder_path=imaging_folder_path,
+        holographic_stimulation_file_path=holographic_stimulation_file_path,
+        epoch_name=epoch_name,
+        max_target_distance=max_target_distance,
+        suite2p_store=suite2p_store,
+        verbose=False,
+    )
+    start_time = time.perf_counter()
+    matched_roi_ids = interface.match_targets_to_segmented_rois()
+    results = dict(matching_time=time.perf_counter() - start_time)
+    mismatched_targets = interface.verify_targeted_cells(matched_roi_ids=matched_roi_ids)
+    results.update(
+        num_targets=len(matched_roi_ids),
+        num_matched_targets=int(np.sum(~np.isnan(matched_roi_ids))),
+        num_mismatched_targets=len(mismatched_targets),
+    )
+    interface.stimulus_file.close()
+
+    return results
+
+
+def benchmark_target_matching(
+    num_rois: int = 50_000,
+    num_targets: int = 20_000,
+    num_planes: int = 3,
+    frame_shape: tuple = (512, 512),
+    max_distance: float = 5.0,
+    num_repeats: int = 3,
+    seed: int = 0,
+) -> dict:
+    """
+    Time the matching of random targets to random rois, at a scale above the one of the example data.
+
+    Each target is drawn within one pixel of a roi, the result also counts how many targets are matched to that roi
+    (the other ones are matched to a closer roi, or to none when the rois are sparse).
+    """
+    rng = np.random.default_rng(seed)
+    roi_coordinates = np.column_stack(
+        [
+            rng.uniform(0, frame_shape[1], size=num_rois),
+            rng.uniform(0, frame_shape[0], size=num_rois),
+            rng.integers(0, num_planes, size=num_rois),
+        ]
+    )
+    source_rois = rng.integers(0, num_rois, size=num_targets)
+    target_coordinates = roi_coordinates[source_rois].copy()
+    target_coordinates[:, :2] += rng.uniform(-0.5, 0.5, size=(num_targets, 2))
+
+    results = dict(matching_time=np.inf)
+    for _ in range(num_repeats):
+        start_time = time.perf_counter()
+        matched_roi_ids = match_targets_to_rois(
+            target_coordinates=target_coordinates, roi_coordinates=roi_coordinates, max_distance=max_distance
+        )
+        results["matching_time"] = min(results["matching_time"], time.perf_counter() - start_time)
+    results.update(
+        num_rois=num_rois,
+        num_targets=num_targets,
+        num_matched_to_source_roi=int(np.sum(matched_roi_ids == source_rois)),
+    )
+
+    return results
+
+
+def benchmark_imaging_write_settings(
+    imaging_folder_path: FolderPathType,
+    output_folder_path: FolderPathType,
+    write_settings: dict,
+    channel_name: str = "Channel 1",
+    plane_name: str = "0",
+    stub_test: bool = True,
+    frames_per_read: int = 100,
+) -> dict:
+    """
+    Write the TwoPhotonSeries of one channel and plane with each write setting and time it.
+
+    Parameters
+    ----------
+    imaging_folder_path : FolderPathType
+        The folder path that contains the ScanImage TIF imaging output (.tif files) of one epoch.
+    output_folder_path : FolderPathType
+        The folder where the NWB file of each setting is written.
+    write_settings : dict
+        The keyword arguments of `configure_imaging_datasets` (e.g. dict(frames_per_chunk=10, compression_method="lzf"))
+        for each setting, keyed by the name of the setting.
+    frames_per_read : int, default: 100
+        The number of frames read at once when the series is read back frame-sequentially.
+
+    Returns
+    -------
+    dict
+        For each setting: the write time, the write throughput (in MB/s of raw data), the size of the output file,
+        the compression ratio and the time to read the whole series back frame-sequentially.
+    """
+    output_folder_path = Path(output_folder_path)
+    output_folder_path.mkdir(parents=True, exist_ok=True)
+    tiff_index = Hendricks2024ScanImageTiffIndex(folder_path=imaging_folder_path)
+
+    results = dict()
+    for setting_name, dataset_options in write_settings.items():
+        interface = Hendricks2024SinglePlaneImagingInterface(
+            folder_path=imaging_folder_path,
+            channel_name=channel_name,
+            plane_name=plane_name,
+            tiff_index=tiff_index,
+            verbose=False,
+        )
+        metadata = interface.get_metadata()
+        nwbfile_path = output_folder_path / f"benchmark_imaging_{setting_name}.nwb"
+
+        start_time = time.perf_counter()
+        nwbfile = interface.create_nwbfile(
+            metadata=metadata, stub_test=stub_test, buffer_gb=dataset_options.get("buffer_gb")
+        )
+        backend_configuration = interface.get_default_backend_configuration(nwbfile=nwbfile, backend="hdf5")
+        configure_imaging_datasets(backend_configuration=backend_configuration, **dataset_options)
+        interface.run_conversion(
+            nwbfile_path=nwbfile_path,
+            nwbfile=nwbfile,
+            metadata=metadata,
+            overwrite=True,
+            backend_configuration=backend_configuration,
+        )
+        write_time = time.perf_counter() - start_time
+
+        series_name = metadata["Ophys"]["TwoPhotonSeries"][0]["name"]
+        start_time = time.perf_counter()
+        with h5py.File(nwbfile_path, "r") as file:
+            dataset = file["acquisition"][series_name]["data"]
+            raw_size_in_bytes = dataset.size * dataset.dtype.itemsize
+            for start_frame in range(0, dataset.shape[0], frames_per_read):
+                dataset[start_frame : start_frame + frames_per_read]
+        read_time = time.perf_counter() - start_time
+
+        file_size_in_bytes = nwbfile_path.stat().st_size
+        results[setting_name] = dict(
+            write_time=write_time,
+            write_throughput_in_mb_per_s=raw_size_in_bytes / 1e6 / write_time,
+            file_size_in_mb=file_size_in_bytes / 1e6,
+            compression_ratio=raw_size_in_bytes / file_size_in_bytes,
+            sequential_read_time=read_time,
+        )
+
+    return results
+
+
+class _TimedImagingExtractor(Hendricks2024WrappedImagingExtractor):
+    """Wrapper of an imaging extractor that records when its frames are read, optionally slowed down."""
+
+    extractor_name = "_TimedImagingExtractor"
+
+    def __init__(self, imaging_extractor, read_intervals: list, read_time_per_frame: float = 0.0) -> None:
+        super().__init__(imaging_extractor=imaging_extractor)
+        self.read_intervals = read_intervals
+        self.read_time_per_frame = read_time_per_frame
+
+    def get_video(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0):
+        start_time = time.perf_counter()
+        frames = read_into_page_cache(self._imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame))
+        if self.read_time_per_frame:
+            time.sleep(self.read_time_per_frame * len(frames))
+        self.read_intervals.append((start_time, time.perf_counter()))
+        return frames
+
+
+def _merge_intervals(intervals: list) -> list:
+    merged_intervals = []
+    for start_time, end_time in sorted(intervals):
+        if merged_intervals and start_time <= merged_intervals[-1][1]:
+            merged_intervals[-1][1] = max(merged_intervals[-1][1], end_time)
+        else:
+            merged_intervals.append([start_time, end_time])
+    return merged_intervals
+
+
+def _get_overlap_time(intervals: list, other_intervals: list) -> float:
+    """Return the time during which at least one interval of each list is running."""
+    overlap_time = 0.0
+    for start_time, end_time in _merge_intervals(intervals):
+        for other_start_time, other_end_time in _merge_intervals(other_intervals):
+            overlap_time += max(0.0, min(end_time, other_end_time) - max(start_time, other_start_time))
+    return overlap_time
+
+
+def benchmark_imaging_prefetch(
+    imaging_folder_path: FolderPathType,
+    output_folder_path: FolderPathType,
+    frames_per_block: int = 100,
+    prefetch_depth: int = 2,
+    frames_per_write: int = 100,
+    compression_method: str = "gzip",
+    read_time_per_frame: float = 0.0,
+) -> dict:
+    """
+    Write all the imaging series of one epoch one after the other, with the frames read by the writer and with the
+    frames read ahead by the reader threads of a Hendricks2024ImagingPrefetcher, and measure how much the reads
+    overlap the writes.
+
+    Parameters
+    ----------
+    imaging_folder_path : FolderPathType
+        The folder path that contains the ScanImage TIF imaging output (.tif files) of one epoch.
+    output_folder_path : FolderPathType
+        The folder where the HDF5 files are written.
+    frames_per_block : int, default: 100
+        The number of frames read at once by the reader threads.
+    prefetch_depth : int, default: 2
+        The number of blocks queued ahead for each series.
+    frames_per_write : int, default: 100
+        The number of frames written at once (and the number of frames per chunk).
+    compression_method : str, default: "gzip"
+        The compression of the HDF5 datasets.
+    read_time_per_frame : float, default: 0.0
+        An extra time (in s) spent reading each frame, to emulate a slow drive when the .tif files are in the page
+        cache.
+
+    Returns
+    -------
+    dict
+        For the "sequential" and the "pipelined" writes: the write time, the time spent reading and the time spent
+        writing, and the time during which frames were read while frames were written. Also the speedup of the
+        pipelined write.
+    """
+    output_folder_path = Path(output_folder_path)
+    output_folder_path.mkdir(parents=True, exist_ok=True)
+    tiff_index = Hendricks2024ScanImageTiffIndex(folder_path=imaging_folder_path)
+
+    results = dict()
+    for setting_name in ("sequential", "pipelined"):
+        deinterleaving_reader = Hendricks2024DeinterleavingTiffReader(tiff_index=tiff_index)
+        read_intervals, write_intervals = [], []
+        imaging_extractors = dict()
+        for channel_name in tiff_index.get_available_channels():
+            for plane_name in tiff_index.get_available_planes():
+                imaging_extractor = Hendricks2024DeinterleavedSinglePlaneImagingExtractor(
+                    folder_path=imaging_folder_path,
+                    channel_name=channel_name,
+                    plane_name=plane_name,
+                    tiff_index=tiff_index,
+                    deinterleaving_reader=deinterleaving_reader,
+                )
+                series_name = f"{channel_name.replace(' ', '')}Plane{plane_name}"
+                imaging_extractors[series_name] = _TimedImagingExtractor(
+                    imaging_extractor=imaging_extractor,
+                    read_intervals=read_intervals,
+                    read_time_per_frame=read_time_per_frame,
+                )
+        prefetcher = None
+        if setting_name == "pipelined":
+            prefetcher = Hendricks2024ImagingPrefetcher(
+                imaging_extractors=imaging_extractors, frames_per_block=frames_per_block, prefetch_depth=prefetch_depth
+            )
+            imaging_extractors = {
+                series_name: Hendricks2024PrefetchingImagingExtractor(
+                    imaging_extractor=imaging_extractor, prefetcher=prefetcher, series_name=series_name
+                )
+                for series_name, imaging_extractor in imaging_extractors.items()
+            }
+
+        file_path = output_folder_path / f"benchmark_imaging_prefetch_{setting_name}.h5"
+        start_time = time.perf_counter()
+        try:
+            if prefetcher is not None:
+                prefetcher.start()
+            with h5py.File(file_path, mode="w") as file:
+                for series_name, imaging_extractor in imaging_extractors.items():
+                    num_frames = imaging_extractor.get_num_frames()
+                    dataset = file.create_dataset(
+                        series_name,
+                        shape=(num_frames, *imaging_extractor.get_image_size()),
+                        dtype=imaging_extractor.get_dtype(),
+                        chunks=(min(frames_per_write, max(1, num_frames)), *imaging_extractor.get_image_size()),
+                        compression=compression_method,
+                    )
+                    for start_frame in range(0, num_frames, frames_per_write):
+                        end_frame = min(start_frame + frames_per_write, num_frames)
+                        frames = imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame)
+                        write_start_time = time.perf_counter()
+                        dataset[start_frame:end_frame] = frames
+                        write_intervals.append((write_start_time, time.perf_counter()))
+        finally:
+            if prefetcher is not None:
+                prefetcher.stop()
+            deinterleaving_reader.cleanup()
+        total_time = time.perf_counter() - start_time
+
+        results[setting_name] = dict(
+            total_time=total_time,
+            read_time=sum(end_time - start_time for start_time, end_time in _merge_intervals(read_intervals)),
+            write_time=sum(end_time - start_time for start_time, end_time in write_intervals),
+            read_write_overlap_time=_get_overlap_time(read_intervals, write_intervals),
+        )
+    results.update(speedup=results["sequential"]["total_time"] / results["pipelined"]["total_time"])
+
+    return results
+
+
+def _get_size_in_bytes(path: Path) -> int:
+    if path.is_dir():  # NWB-Zarr is a folder
+        return sum(file_path.stat().st_size for file_path in path.rglob("*") if file_path.is_file())
+    return path.stat().st_size
+
+
+def benchmark_output_backends(session_to_nwb_kwargs: dict, backend_settings: dict) -> dict:
+    """
+    Convert the same epoch with each output backend (HDF5 or Zarr, with the number of parallel jobs for Zarr),
+    optionally with the imaging frames read ahead (pipeline_imaging=True).
+
+    Parameters
+    ----------
+    session_to_nwb_kwargs : dict
+        The arguments for session_to_nwb, except the backend options.
+    backend_settings : dict
+        The backend options of session_to_nwb (e.g. dict(backend="zarr", number_of_jobs=6)) for each setting,
+        keyed by the name of the setting.
+
+    Returns
+    -------
+    dict
+        For each setting: the conversion time, the speedup relative to the first setting and the output size.
+    """
+    results = dict()
+    for setting_name, backend_options in backend_settings.items():
+        start_time = time.perf_counter()
+        nwbfile_path = session_to_nwb(**session_to_nwb_kwargs, **backend_options)
+        conversion_time = time.perf_counter() - start_time
+        results[setting_name] = dict(
+            conversion_time=conversion_time, output_size_in_mb=_get_size_in_bytes(nwbfile_path) / 1e6
+        )
+
+    reference_time = next(iter(results.values()))["conversion_time"]
+    for setting_results in results.values():
+        setting_results.update(speedup=reference_time / setting_results["conversion_time"])
+
+    return results
+
+
+if __name__ == "__main__":
+    # Parameters for the benchmarks
+    root_path = Path("/media/amtra/Samsung_T5/CN_data")
+    data_dir_path = root_path / "MouseV1-to-nwb"
+    epoch_name = "5stim"
+
+    results = benchmark_converter_construction(
+        imaging_folder_path=data_dir_path / "raw-tiffs" / epoch_name,
+        segmentation_folder_path=data_dir_path / "processed-suite2p-data/suite2p",
+        holographic_stimulation_file_path=data_dir_path / "example_data_rev20242501.hdf5",
+        epoch_name=epoch_name,
+    )
+    print(f"Converter construction: {results['converter_construction_time']:.3f} s")
+    for interface_name, construction_time in results["interface_construction_time"].items():
+        print(f"  {interface_name}: {construction_time:.3f} s")
+    print(f"Construction of all the interfaces (once): {results['total_interface_construction_time']:.3f} s")
+    print(f"Saved by not constructing interfaces twice: {results['duplicated_construction_time']:.3f} s")
+
+    results = benchmark_holographic_stimulus_table(
+        imaging_folder_path=data_dir_path / "raw-tiffs" / "7expt",
+        holographic_stimulation_file_path=data_dir_path / "example_data_rev20242501.hdf5",
+        epoch_name="7expt",
+    )
+    print(f"PatternedOptogeneticStimulusTable with {results['num_stimulus_onsets']} stimulus onsets:")
+    print(f"  stimulus onsets: {results['stimulus_onsets_time']:.3f} s")
+    print(f"  column-wise: {results['column_wise_time']:.3f} s")
+    print(f"  row-wise: {results['row_wise_time']:.3f} s")
+
+    results = benchmark_imaging_write_settings(
+        imaging_folder_path=data_dir_path / "raw-tiffs" / epoch_name,
+        output_folder_path=root_path / "MouseV1-conversion_nwb/benchmark",
+        write_settings=dict(
+            default=dict(),
+            gzip_frame_chunks=dict(frames_per_chunk=1, tile_shape=(512, 512), compression_method="gzip"),
+            gzip_tiles=dict(frames_per_chunk=64, tile_shape=(128, 128), compression_method="gzip"),
+            lzf_tiles=dict(frames_per_chunk=64, tile_shape=(128, 128), compression_method="lzf"),
+            blosc_tiles=dict(frames_per_chunk=64, tile_shape=(128, 128), compression_method="Blosc"),
+        ),
+    )
+    for setting_name, setting_results in results.items():
+        print(
+            f"TwoPhotonSeries {setting_name}: "
+            f"{setting_results['write_throughput_in_mb_per_s']:.1f} MB/s, "
+            f"{setting_results['file_size_in_mb']:.1f} MB (x{setting_results['compression_ratio']:.2f}), "
+            f"sequential read {setting_results['sequential_read_time']:.3f} s"
+        )
+
+    results = benchmark_imaging_prefetch(
+        imaging_folder_path=data_dir_path / "raw-tiffs" / epoch_name,
+        output_folder_path=root_path / "MouseV1-conversion_nwb/benchmark",
+    )
+    for setting_name in ("sequential", "pipelined"):
+        setting_results = results[setting_name]
+        print(
+            f"Imaging series {setting_name}: {setting_results['total_time']:.1f} s, "
+            f"read {setting_results['read_time']:.1f} s, write {setting_results['write_time']:.1f} s, "
+            f"read while writing {setting_results['read_write_overlap_time']:.1f} s"
+        )
+    print(f"Imaging series pipelined speedup: x{results['speedup']:.2f}")
+
+    results = benchmark_output_backends(
+        session_to_nwb_kwargs=dict(
+            epoch_name=epoch_name,
+            subject_id="w57_1",
+            output_dir_path=root_path / "MouseV1-conversion_nwb/benchmark",
+            imaging_folder_path=data_dir_path / "raw-tiffs" / epoch_name,
+            epoch_name_description_mapping={epoch_name: ""},
+            stub_test=True,
+        ),
+        backend_settings=dict(
+            hdf5=dict(backend="hdf5"),
+            hdf5_pipelined=dict(backend="hdf5", pipeline_imaging=True),
+            zarr_1_job=dict(backend="zarr", number_of_jobs=1),
+            zarr_6_jobs=dict(backend="zarr", number_of_jobs=6),
+        ),
+    )
+    for setting_name, setting_results in results.items():
+        print(
+            f"{setting_name}: {setting_results['conversion_time']:.1f} s (x{setting_results['speedup']:.2f}), "
+            f"{setting_results['output_size_in_mb']:.1f} MB"
+        )
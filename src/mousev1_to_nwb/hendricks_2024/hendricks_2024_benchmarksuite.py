@@ -0,0 +1,498 @@
+"""Benchmarks of the Hendricks2024 conversion on synthetic sessions of several scales, tracked across commits."""
+
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from neuroconv.utils import FilePathType, FolderPathType
+
+from hendricks_2024_benchmark import (
+    benchmark_converter_construction,
+    benchmark_holographic_stimulus_table,
+    benchmark_holographic_target_matching,
+    benchmark_imaging_prefetch,
+    benchmark_imaging_write_settings,
+    benchmark_visual_stimuli_table,
+)
+from hendricks_2024_convert_session import get_epoch_frame_ranges, session_to_nwb
+from hendricks_2024_syntheticdata import generate_synthetic_session
+
+# The parameters of generate_synthetic_session at each scale, the size of the .tif files of each epoch is
+# num_trials * volumes_per_trial * 3 planes * 2 channels frames of frame_shape int16 pixels (~20 MB, 300 MB and 2.5 GB)
+SYNTHETIC_SESSION_SCALES = dict(
+    small=dict(
+        num_trials=10,
+        volumes_per_trial=10,
+        frame_shape=(128, 128),
+        num_cells_per_plane=30,
+        num_targets=20,
+        num_holograms=8,
+        max_rois_per_hologram=5,
+    ),
+    medium=dict(
+        num_trials=20,
+        volumes_per_trial=20,
+        frame_shape=(256, 256),
+        num_cells_per_plane=100,
+        num_targets=60,
+        num_holograms=20,
+        max_rois_per_hologram=10,
+    ),
+    large=dict(
+        num_trials=40,
+        volumes_per_trial=20,
+        frame_shape=(512, 512),
+        num_cells_per_plane=300,
+        num_targets=150,
+        num_holograms=50,
+        max_rois_per_hologram=10,
+    ),
+)
+
+
+def get_git_revision(repository_path: Optional[FolderPathType] = None) -> dict:
+    """
+    Return the 'commit' checked out in the repository and whether the working tree is 'dirty' (has uncommitted
+    changes). Both are None when git or the repository is not available.
+    """
+    repository_path = Path(repository_path or Path(__file__).parent)
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repository_path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=repository_path,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return dict(commit=None, dirty=None)
+    return dict(commit=commit, dirty=bool(status.strip()))
+
+
+def _add_metrics(metrics: dict, results: dict, prefix: str) -> None:
+    """Add the numeric results (of nested dicts) to the flat metrics, keyed by their dotted path."""
+    for name, value in results.items():
+        if isinstance(value, dict):
+            _add_metrics(metrics=metrics, results=value, prefix=f"{prefix}.{name}")
+        elif isinstance(value, (int, float)):
+            metrics[f"{prefix}.{name}"] = value
+
+
+def benchmark_synthetic_session(session: dict, output_folder_path: FolderPathType, num_repeats: int = 3) -> dict:
+    """
+    Run the benchmarks of the conversion steps on each epoch of a synthetic session: the construction of the
+    interfaces, the construction of the stimulus tables, the write throughput of one imaging series, the overlap of
+    the reads and the writes of the imaging series when their frames are read ahead and the full
+    `session_to_nwb` (with the time of each of its phases).
+
+    Parameters
+    ----------
+    session : dict
+        The synthetic session, as returned by `generate_synthetic_session`.
+    output_folder_path : FolderPathType
+        The folder where the NWB files are written.
+    num_repeats : int, default: 3
+        The number of times the stimulus tables are built, the best time is kept.
+
+    Returns
+    -------
+    dict
+        The metrics, keyed by "<epoch_name>.<benchmark>.<metric>" (e.g. "5stim.session_to_nwb.conversion_time").
+    """
+    output_folder_path = Path(output_folder_path)
+    stimulus_file_path = session["stimulus_file_path"]
+    epoch_frame_ranges = get_epoch_frame_ranges(
+        segmentation_folder_path=session["segmentation_folder_path"], epoch_names=session["epoch_names"]
+    )
+
+    metrics = dict()
+    for epoch_name in session["epoch_names"]:
+        imaging_folder_path = session["imaging_folder_path"] / epoch_name
+        segmentation_start_frame, segmentation_end_frame = epoch_frame_ranges[epoch_name]
+        is_holographic_epoch = epoch_name in session["holographic_epoch_names"]
+        visual_stimulus_type = session["epoch_name_visual_stimulus_mapping"].get(epoch_name)
+
+        results = benchmark_converter_construction(
+            imaging_folder_path=imaging_folder_path,
+            segmentation_folder_path=session["segmentation_folder_path"],
+            segmentation_start_frame=segmentation_start_frame,
+            segmentation_end_frame=segmentation_end_frame,
+            holographic_stimulation_file_path=stimulus_file_path if is_holographic_epoch else None,
+            epoch_name=epoch_name,
+            visual_stimulus_file_path=stimulus_file_path if visual_stimulus_type else None,
+            visual_stimulus_type=visual_stimulus_type,
+        )
+        _add_metrics(metrics=metrics, results=results, prefix=f"{epoch_name}.converter_construction")
+
+        if is_holographic_epoch:
+            results = benchmark_holographic_stimulus_table(
+                imaging_folder_path=imaging_folder_path,
+                holographic_stimulation_file_path=stimulus_file_path,
+                epoch_name=epoch_name,
+                num_repeats=num_repeats,
+            )
+            _add_metrics(metrics=metrics, results=results, prefix=f"{epoch_name}.holographic_stimulus_table")
+            # The synthetic 'targeted_cells' are the ground truth of the matching, no target should be mismatched
+            results = benchmark_holographic_target_matching(
+                imaging_folder_path=imaging_folder_path,
+                holographic_stimulation_file_path=stimulus_file_path,
+                epoch_name=epoch_name,
+                segmentation_folder_path=session["segmentation_folder_path"],
+            )
+            _add_metrics(metrics=metrics, results=results, prefix=f"{epoch_name}.holographic_target_matching")
+        if visual_stimulus_type:
+            results = benchmark_visual_stimuli_table(
+                imaging_folder_path=imaging_folder_path,
+                visual_stimulus_file_path=stimulus_file_path,
+                visual_stimulus_type=visual_stimulus_type,
+                num_repeats=num_repeats,
+            )
+            _add_metrics(metrics=metrics, results=results, prefix=f"{epoch_name}.visual_stimuli_table")
+
+        results = benchmark_imaging_write_settings(
+            imaging_folder_path=imaging_folder_path,
+            output_folder_path=output_folder_path / "imaging",
+            write_settings=dict(default=dict()),
+            stub_test=False,
+        )
+        _add_metrics(metrics=metrics, results=results["default"], prefix=f"{epoch_name}.imaging_write")
+
+        # The reads of the frames by the reader threads should overlap the writes of the series
+        results = benchmark_imaging_prefetch(
+            imaging_folder_path=imaging_folder_path, output_folder_path=output_folder_path / "imaging"
+        )
+        _add_metrics(metrics=metrics, results=results, prefix=f"{epoch_name}.imaging_prefetch")
+
+        input_size_in_bytes = sum(file_path.stat().st_size for file_path in imaging_folder_path.glob("*.tif"))
+        start_time = time.perf_counter()
+        nwbfile_path = session_to_nwb(
+            epoch_name=epoch_name,
+            subject_id="synthetic",
+            output_dir_path=output_folder_path,
+            imaging_folder_path=imaging_folder_path,
+            segmentation_folder_path=session["segmentation_folder_path"],
+            segmentation_start_frame=segmentation_start_frame,
+            segmentation_end_frame=segmentation_end_frame,
+            visual_stimulus_file_path=stimulus_file_path if visual_stimulus_type else None,
+            epoch_name_visual_stimulus_mapping=session["epoch_name_visual_stimulus_mapping"],
+            holographic_stimulation_file_path=stimulus_file_path if is_holographic_epoch else None,
+            epoch_name_description_mapping={epoch_name: f"Synthetic epoch {epoch_name}."},
+            use_tiff_metadata_cache=False,
+            profile=True,
+        )
+        conversion_time = time.perf_counter() - start_time
+        results = dict(
+            conversion_time=conversion_time,
+            input_throughput_in_mb_per_s=input_size_in_bytes / 1e6 / conversion_time,
+            output_size_in_mb=nwbfile_path.stat().st_size / 1e6,
+        )
+        with open(nwbfile_path.with_name(nwbfile_path.name + ".profile.json"), mode="r") as file:
+            profile_report = json.load(file)
+        results.update(process_peak_rss_in_mb=profile_report["process_peak_rss_in_mb"])
+        results.update(
+            phases={phase_name: phase["wall_time_in_s"] for phase_name, phase in profile_report["phases"].items()}
+        )
+        _add_metrics(metrics=metrics, results=results, prefix=f"{epoch_name}.session_to_nwb")
+
+    return metrics
+
+
+def get_anonymous_rss_in_mb() -> Optional[float]:
+    """
+    Return the resident memory of the process that is not backed by a file (from /proc/self/status), or None when it
+    is not available. Unlike the peak RSS, it does not count the pages of the memory-mapped .tif and Suite2p files,
+    which the kernel can drop at any time.
+    """
+    try:
+        with open("/proc/self/status", mode="r") as file:
+            for line in file:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def _measure_peak_anonymous_rss(session_to_nwb_kwargs: dict, sampling_interval: float = 0.01) -> float:
+    """Run `session_to_nwb` and return the peak anonymous memory (in MB) it used above the memory before the run."""
+    baseline_in_mb = get_anonymous_rss_in_mb()
+    if baseline_in_mb is None:
+        raise ValueError("The anonymous memory of the process can only be measured on Linux.")
+    peak_in_mb = baseline_in_mb
+    stop_event = threading.Event()
+
+    def sample() -> None:
+        nonlocal peak_in_mb
+        while not stop_event.is_set():
+            peak_in_mb = max(peak_in_mb, get_anonymous_rss_in_mb())
+            stop_event.wait(sampling_interval)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        session_to_nwb(**session_to_nwb_kwargs)
+    finally:
+        stop_event.set()
+        sampler.join()
+    peak_in_mb = max(peak_in_mb, get_anonymous_rss_in_mb())
+    return peak_in_mb - baseline_in_mb
+
+
+def benchmark_memory_budget(
+    folder_path: FolderPathType,
+    output_folder_path: FolderPathType,
+    memory_budget_gb: float = 0.1,
+    trial_counts: Sequence[int] = (20, 40, 80),
+    scale_name: str = "medium",
+    epoch_name: str = "5stim",
+    margin: float = 0.25,
+    min_epoch_size_to_budget_ratio: float = 3.0,
+    seed: int = 0,
+) -> Dict[int, float]:
+    """
+    Check that the conversion of an epoch with a memory budget stays within the budget, and that its peak memory does
+    not grow with the length of the epoch.
+
+    A synthetic session is generated for each number of trials, and each epoch is converted in a new process, so that
+    the memory of the previous conversions and of the generation of the data does not count.
+
+    Parameters
+    ----------
+    folder_path : FolderPathType
+        The folder of the synthetic sessions, with one folder per number of trials.
+    output_folder_path : FolderPathType
+        The folder where the NWB files are written.
+    memory_budget_gb : float, default: 0.1
+        The memory budget passed to `session_to_nwb`.
+    trial_counts : sequence of int, default: (20, 40, 80)
+        The number of trials of the epochs to convert, with the "medium" scale the .tif files of the epochs are about
+        0.3, 0.6 and 1.3 GB.
+    scale_name : str, default: "medium"
+        The scale of SYNTHETIC_SESSION_SCALES of the other parameters of the synthetic sessions.
+    epoch_name : str, default: "5stim"
+        The epoch to convert, "5stim" has both the imaging, the segmentation and the holographic stimulation.
+    margin : float, default: 0.25
+        The fraction of the budget allowed above it, for the Python objects of the conversion, and the maximum
+        difference of the peak memory between the epochs, as a fraction of the budget.
+    min_epoch_size_to_budget_ratio : float, default: 3.0
+        The minimum size of the .tif files of each epoch, as a multiple of the budget, so that an epoch can not fit
+        in the budget and the bound is actually tested.
+
+    Returns
+    -------
+    dict
+        The peak anonymous memory (in MB) above the memory before the conversion, for each number of trials.
+    """
+    folder_path = Path(folder_path)
+    output_folder_path = Path(output_folder_path)
+    scale_parameters = dict(SYNTHETIC_SESSION_SCALES[scale_name])
+
+    peak_memory_in_mb = dict()
+    # The conversions are run in new processes, which do not inherit the memory of this one
+    context = multiprocessing.get_context("spawn")
+    for num_trials in trial_counts:
+        scale_parameters.update(num_trials=num_trials)
+        session = generate_synthetic_session(
+            folder_path=folder_path / f"{scale_name}_{num_trials}_trials", seed=seed, **scale_parameters
+        )
+        epoch_frame_ranges = get_epoch_frame_ranges(
+            segmentation_folder_path=session["segmentation_folder_path"], epoch_names=session["epoch_names"]
+        )
+        segmentation_start_frame, segmentation_end_frame = epoch_frame_ranges[epoch_name]
+        imaging_folder_path = session["imaging_folder_path"] / epoch_name
+        epoch_size_in_bytes = sum(file_path.stat().st_size for file_path in imaging_folder_path.glob("*.tif"))
+        if epoch_size_in_bytes < min_epoch_size_to_budget_ratio * memory_budget_gb * 1e9:
+            raise ValueError(
+                f"The epoch of {num_trials} trials ({epoch_size_in_bytes / 1e6:.1f} MB) is less than "
+                f"{min_epoch_size_to_budget_ratio} times the budget of {memory_budget_gb} GB, use more trials, "
+                "a larger scale or a smaller budget."
+            )
+        is_holographic_epoch = epoch_name in session["holographic_epoch_names"]
+        visual_stimulus_type = session["epoch_name_visual_stimulus_mapping"].get(epoch_name)
+        session_to_nwb_kwargs = dict(
+            epoch_name=epoch_name,
+            subject_id="synthetic",
+            output_dir_path=output_folder_path / f"{scale_name}_{num_trials}_trials",
+            imaging_folder_path=imaging_folder_path,
+            segmentation_folder_path=session["segmentation_folder_path"],
+            segmentation_start_frame=segmentation_start_frame,
+            segmentation_end_frame=segmentation_end_frame,
+            visual_stimulus_file_path=session["stimulus_file_path"] if visual_stimulus_type else None,
+            epoch_name_visual_stimulus_mapping=session["epoch_name_visual_stimulus_mapping"],
+            holographic_stimulation_file_path=session["stimulus_file_path"] if is_holographic_epoch else None,
+            epoch_name_description_mapping={epoch_name: f"Synthetic epoch {epoch_name}."},
+            use_tiff_metadata_cache=False,
+            memory_budget_gb=memory_budget_gb,
+        )
+        with context.Pool(processes=1) as pool:
+            peak_memory_in_mb[num_trials] = pool.apply(_measure_peak_anonymous_rss, (session_to_nwb_kwargs,))
+        print(f"{num_trials} trials: peak memory of {peak_memory_in_mb[num_trials]:.1f} MB.")
+
+    budget_in_mb = memory_budget_gb * 1e3
+    for num_trials, peak_in_mb in peak_memory_in_mb.items():
+        assert peak_in_mb <= budget_in_mb * (1 + margin), (
+            f"The conversion of {num_trials} trials used {peak_in_mb:.1f} MB, "
+            f"above the budget of {budget_in_mb:.1f} MB."
+        )
+    memory_growth_in_mb = max(peak_memory_in_mb.values()) - min(peak_memory_in_mb.values())
+    assert (
+        memory_growth_in_mb <= budget_in_mb * margin
+    ), f"The peak memory grew by {memory_growth_in_mb:.1f} MB from {min(trial_counts)} to {max(trial_counts)} trials."
+    return peak_memory_in_mb
+
+
+def run_benchmark_suite(
+    folder_path: FolderPathType,
+    output_folder_path: FolderPathType,
+    results_file_path: FilePathType,
+    scale_names: Sequence[str] = ("small", "medium"),
+    num_repeats: int = 3,
+    seed: int = 0,
+) -> List[dict]:
+    """
+    Generate a synthetic session at each scale (once, the sessions are reused by the next runs) and benchmark its
+    conversion. The results of each scale are appended as one JSON line to `results_file_path`, tagged with the
+    commit they were measured at, to compare them across commits with `compare_benchmark_results`.
+
+    Parameters
+    ----------
+    folder_path : FolderPathType
+        The folder of the synthetic sessions, with one folder per scale.
+    output_folder_path : FolderPathType
+        The folder where the NWB files are written, with one folder per scale.
+    results_file_path : FilePathType
+        The .jsonl file the results are appended to.
+    scale_names : sequence of str, default: ("small", "medium")
+        The scales of SYNTHETIC_SESSION_SCALES to benchmark.
+
+    Returns
+    -------
+    list of dict
+        The record of each scale, as appended to `results_file_path`.
+    """
+    folder_path = Path(folder_path)
+    output_folder_path = Path(output_folder_path)
+    results_file_path = Path(results_file_path)
+    results_file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    records = []
+    for scale_name in scale_names:
+        if scale_name not in SYNTHETIC_SESSION_SCALES:
+            raise ValueError(
+                f"'{scale_name}' is not a valid scale, it must be one of {list(SYNTHETIC_SESSION_SCALES)}."
+            )
+        scale_parameters = SYNTHETIC_SESSION_SCALES[scale_name]
+        start_time = time.perf_counter()
+        session = generate_synthetic_session(folder_path=folder_path / scale_name, seed=seed, **scale_parameters)
+        print(f"Synthetic session '{scale_name}' ready in {time.perf_counter() - start_time:.1f} s.")
+
+        metrics = benchmark_synthetic_session(
+            session=session, output_folder_path=output_folder_path / scale_name, num_repeats=num_repeats
+        )
+        record = dict(
+            date=datetime.now().isoformat(timespec="seconds"),
+            **get_git_revision(),
+            scale=scale_name,
+            scale_parameters=scale_parameters,
+            seed=seed,
+            python_version=platform.python_version(),
+            platform=platform.platform(),
+            cpu_count=os.cpu_count(),
+            metrics=metrics,
+        )
+        with open(results_file_path, mode="a") as file:
+            file.write(json.dumps(record) + "\n")
+        records.append(record)
+    return records
+
+
+def load_benchmark_results(results_file_path: FilePathType) -> List[dict]:
+    """Return the records of the benchmark suite, in the order they were run."""
+    results_file_path = Path(results_file_path)
+    if not results_file_path.is_file():
+        return []
+    with open(results_file_path, mode="r") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def compare_benchmark_results(
+    results_file_path: FilePathType, scale_name: str, reference_commit: Optional[str] = None
+) -> dict:
+    """
+    Compare the latest run of a scale to a run at another commit.
+
+    Parameters
+    ----------
+    results_file_path : FilePathType
+        The .jsonl file of the results of the benchmark suite.
+    scale_name : str
+        The scale to compare.
+    reference_commit : str, optional
+        The commit (or the start of it) to compare to. Defaults to the latest run at a commit other than the one of
+        the latest run.
+
+    Returns
+    -------
+    dict
+        For each metric of both runs: the 'reference' value, the 'latest' value and their 'ratio' (latest/reference),
+        or an empty dict when there is no run to compare to.
+    """
+    records = [record for record in load_benchmark_results(results_file_path) if record["scale"] == scale_name]
+    if not records:
+        return dict()
+    latest_record = records[-1]
+    if reference_commit is None:
+        reference_records = [record for record in records[:-1] if record["commit"] != latest_record["commit"]]
+    else:
+        reference_records = [
+            record for record in records[:-1] if record["commit"] and record["commit"].startswith(reference_commit)
+        ]
+    if not reference_records:
+        return dict()
+    reference_metrics = reference_records[-1]["metrics"]
+
+    comparison = dict()
+    for metric_name, value in latest_record["metrics"].items():
+        if metric_name not in reference_metrics:
+            continue
+        reference_value = reference_metrics[metric_name]
+        comparison[metric_name] = dict(
+            reference=reference_value, latest=value, ratio=value / reference_value if reference_value else None
+        )
+    return comparison
+
+
+if __name__ == "__main__":
+    # Parameters for the benchmark suite
+    root_path = Path("/media/amtra/Samsung_T5/CN_data")
+    folder_path = root_path / "MouseV1-synthetic-data"
+    output_folder_path = root_path / "MouseV1-conversion_nwb/benchmark/synthetic"
+    results_file_path = root_path / "MouseV1-conversion_nwb/benchmark/synthetic_benchmark_results.jsonl"
+    scale_names = ("small", "medium")
+
+    records = run_benchmark_suite(
+        folder_path=folder_path,
+        output_folder_path=output_folder_path,
+        results_file_path=results_file_path,
+        scale_names=scale_names,
+    )
+    for record in records:
+        print(f"Scale '{record['scale']}' at commit {record['commit']}{' (dirty)' if record['dirty'] else ''}:")
+        comparison = compare_benchmark_results(results_file_path=results_file_path, scale_name=record["scale"])
+        for metric_name, value in record["metrics"].items():
+            if not metric_name.endswith("_time") and ".phases." not in metric_name:
+                continue
+            change = ""
+            if metric_name in comparison and comparison[metric_name]["ratio"] is not None:
+                change = f" (x{comparison[metric_name]['ratio']:.2f} from the previous commit)"
+            print(f"  {metric_name}: {value:.3f} s{change}")
@@ -1,6 +1,6 @@
 from pathlib import Path
-import numpy as np
-from hendricks_2024_convert_session import session_to_nwb
+from hendricks_2024_convert_session import get_epoch_frame_ranges, split_session_to_nwb
+from hendricks_2024_convert_all_sessions import dataset_to_nwb
 
 # Specify the data directory and the output directory for the nwb files
 root_path = Path("/media/amtra/Samsung_T5/CN_data")
@@ -11,10 +11,36 @@ imaging_folder_path = data_dir_path / "raw-tiffs"
 segmentation_folder_path = data_dir_path / "processed-suite2p-data/suite2p"
 holographic_stimulation_file_path = data_dir_path / "example_data_rev20242501.hdf5"
 visual_stimulus_file_path = None #data_dir_path / "example_data_rev20242501.hdf5"
+# To check the 'targeted_cells' of the holographic stimulation against the ScanImage targets matched to the closest
+# Suite2p rois: holographic_target_matching = "verify", or to use the matched rois instead: "recompute"
+holographic_target_matching = None
 
 # To test the conversion pipeline on a smaller portion of the dataset: stub_test = True
 stub_test = False
 
+# To fingerprint the inputs of each epoch next to its NWB file, so that the epochs whose inputs have not changed since
+# they were converted are skipped, only the metadata of the epochs whose metadata .yaml changed is patched, and the
+# imaging series of the epochs whose conversion was interrupted are resumed: resume = True
+resume = False
+# To only rewrite the metadata (e.g. after editing hendricks_2024_metadata.yaml) of the NWB files already converted,
+# without reading or writing the imaging data again: metadata_only = True
+metadata_only = False
+# To only check the inputs and list the interfaces of each epoch, without converting anything: dry_run = True
+dry_run = False
+# To save the wall time, the bytes read and written and the peak memory of each phase of the conversion of each
+# epoch in a "<nwbfile>.profile.json" report: profile = True, and to also capture the call stacks:
+# profile_capture = "cprofile"
+profile = False
+profile_capture = None
+# To stream the imaging frames, the Suite2p traces and the stimulus onsets in blocks sized from a memory budget (in GB),
+# so that the peak memory of each epoch does not grow with its length: e.g. memory_budget_gb = 2.0
+memory_budget_gb = None
+
+# Specify the number of epochs converted in parallel and the maximum memory (in GB) for each of them
+# With max_workers = 1 the epochs are converted in a single pass that loads the Suite2p output only once
+max_workers = 1
+max_memory_per_job_gb = None
+
 # Specify the subject_id
 subject_id = "w57_1"
 
@@ -36,28 +62,59 @@ epoch_name_visual_stimulus_mapping = {
     "4ori": "vis_orientation_tuning_example",
 }
 
-for epoch_name in epoch_names:
-    epoch_imaging_folder_path = imaging_folder_path / epoch_name
-
-    file_npy_path = segmentation_folder_path / "plane0/ops.npy"
-    ops = np.load(file_npy_path, allow_pickle=True).item()
-    frames_per_epoch = ops["frames_per_folder"]
-    epoch_index = epoch_names.index(epoch_name)
-
-    segmentation_start_frame = np.sum(frames_per_epoch[:epoch_index])
-    segmentation_end_frame = segmentation_start_frame + frames_per_epoch[epoch_index]
-
-    session_to_nwb(
-        epoch_name=epoch_name,
-        subject_id=subject_id,
-        output_dir_path=output_dir_path,
-        imaging_folder_path=epoch_imaging_folder_path,
-        segmentation_folder_path=segmentation_folder_path,
-        visual_stimulus_file_path=visual_stimulus_file_path,
-        epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
-        holographic_stimulation_file_path=holographic_stimulation_file_path,
-        segmentation_start_frame=segmentation_start_frame,
-        segmentation_end_frame=segmentation_end_frame,
-        epoch_name_description_mapping=epoch_name_description_mapping,
-        stub_test=stub_test,
-    )
+if __name__ == "__main__":
+    if max_workers == 1:
+        split_session_to_nwb(
+            subject_id=subject_id,
+            epoch_names=epoch_names,
+            output_dir_path=output_dir_path,
+            imaging_folder_path=imaging_folder_path,
+            segmentation_folder_path=segmentation_folder_path,
+            visual_stimulus_file_path=visual_stimulus_file_path,
+            epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
+            holographic_stimulation_file_path=holographic_stimulation_file_path,
+            holographic_target_matching=holographic_target_matching,
+            epoch_name_description_mapping=epoch_name_description_mapping,
+            stub_test=stub_test,
+            resume=resume,
+            metadata_only=metadata_only,
+            dry_run=dry_run,
+            profile=profile,
+            profile_capture=profile_capture,
+            memory_budget_gb=memory_budget_gb,
+        )
+    else:
+        epoch_frame_ranges = get_epoch_frame_ranges(
+            segmentation_folder_path=segmentation_folder_path, epoch_names=epoch_names
+        )
+        session_to_nwb_kwargs_per_epoch = []
+        for epoch_name in epoch_names:
+            segmentation_start_frame, segmentation_end_frame = epoch_frame_ranges[epoch_name]
+            session_to_nwb_kwargs_per_epoch.append(
+                dict(
+                    epoch_name=epoch_name,
+                    subject_id=subject_id,
+                    imaging_folder_path=imaging_folder_path / epoch_name,
+                    segmentation_folder_path=segmentation_folder_path,
+                    visual_stimulus_file_path=visual_stimulus_file_path,
+                    epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
+                    holographic_stimulation_file_path=holographic_stimulation_file_path,
+                    holographic_target_matching=holographic_target_matching,
+                    segmentation_start_frame=segmentation_start_frame,
+                    segmentation_end_frame=segmentation_end_frame,
+                    epoch_name_description_mapping=epoch_name_description_mapping,
+                    stub_test=stub_test,
+                    resume=resume,
+                    metadata_only=metadata_only,
+                    dry_run=dry_run,
+                    profile=profile,
+                    profile_capture=profile_capture,
+                    memory_budget_gb=memory_budget_gb,
+                )
+            )
+        dataset_to_nwb(
+            session_to_nwb_kwargs_per_epoch=session_to_nwb_kwargs_per_epoch,
+            output_dir_path=output_dir_path,
+            max_workers=max_workers,
+            max_memory_per_job_gb=max_memory_per_job_gb,
+        )
@@ -0,0 +1,221 @@
+"""Run the conversion of several epochs (and subjects) in parallel, with one process per epoch."""
+
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from pprint import pformat
+from typing import List, Optional, Tuple, Union
+
+from hendricks_2024_convert_session import session_to_nwb
+
+
+def _limit_memory_per_job(max_memory_per_job_gb: Optional[float]) -> None:
+    """Limit the address space of the current process, so that a runaway epoch fails instead of swapping the node."""
+    if max_memory_per_job_gb is None:
+        return
+    try:
+        import resource
+    except ImportError:  # The resource module is not available on Windows
+        print("Warning: 'max_memory_per_job_gb' is only supported on POSIX systems and will be ignored.")
+        return
+    max_memory_in_bytes = int(max_memory_per_job_gb * 1e9)
+    resource.setrlimit(resource.RLIMIT_AS, (max_memory_in_bytes, max_memory_in_bytes))
+
+
+def safe_session_to_nwb(
+    *,
+    session_to_nwb_kwargs: dict,
+    exception_file_path: Union[Path, str],
+    running_file_path: Optional[Union[Path, str]] = None,
+) -> dict:
+    """
+    Convert one epoch and return a summary of the outcome instead of raising,
+    so that the failure of one epoch does not stop the others.
+
+    Parameters
+    ----------
+    session_to_nwb_kwargs : dict
+        The arguments for session_to_nwb.
+    exception_file_path : Path
+        The path to the file where the traceback is written if the conversion fails.
+    running_file_path : Path, optional
+        The path to the file that exists while the epoch is converted, which is left behind if the process dies.
+    """
+    exception_file_path = Path(exception_file_path)
+    summary = dict(
+        subject_id=session_to_nwb_kwargs["subject_id"],
+        epoch_name=session_to_nwb_kwargs["epoch_name"],
+        status="success",
+        error=None,
+    )
+    if running_file_path is not None:
+        Path(running_file_path).touch()
+    start_time = time.perf_counter()
+    try:
+        session_to_nwb(**session_to_nwb_kwargs)
+    except Exception as exception:
+        summary.update(status="failed", error=repr(exception), exception_file_path=str(exception_file_path))
+        with open(exception_file_path, mode="w") as file:
+            file.write(f"session_to_nwb_kwargs: \n {pformat(session_to_nwb_kwargs)}\n\n")
+            file.write(traceback.format_exc())
+    finally:
+        if running_file_path is not None:
+            Path(running_file_path).unlink(missing_ok=True)
+    summary.update(duration_in_s=time.perf_counter() - start_time)
+    return summary
+
+
+def _get_failed_summary(session_to_nwb_kwargs: dict, error: str) -> dict:
+    return dict(
+        subject_id=session_to_nwb_kwargs["subject_id"],
+        epoch_name=session_to_nwb_kwargs["epoch_name"],
+        status="failed",
+        error=error,
+        duration_in_s=None,
+    )
+
+
+def _run_epochs_in_pool(
+    session_to_nwb_kwargs_per_epoch: List[dict],
+    output_dir_path: Path,
+    max_workers: int,
+    max_memory_per_job_gb: Optional[float],
+) -> Tuple[List[dict], List[dict], List[dict]]:
+    """
+    Convert the epochs with a process pool, until they are all converted or a worker process dies.
+
+    Returns
+    -------
+    tuple of list
+        The summaries of the epochs that were converted (or that failed with an exception), the arguments of the
+        epochs that were being converted when a worker process died, and the arguments of the epochs that were not
+        started.
+    """
+    summaries, interrupted_epochs, not_started_epochs = [], [], []
+    futures = dict()
+    with ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_limit_memory_per_job, initargs=(max_memory_per_job_gb,)
+    ) as executor:
+        for session_to_nwb_kwargs in session_to_nwb_kwargs_per_epoch:
+            subject_id = session_to_nwb_kwargs["subject_id"]
+            epoch_name = session_to_nwb_kwargs["epoch_name"]
+            running_file_path = output_dir_path / f"RUNNING_{subject_id}-{epoch_name}"
+            running_file_path.unlink(missing_ok=True)
+            future = executor.submit(
+                safe_session_to_nwb,
+                session_to_nwb_kwargs=session_to_nwb_kwargs,
+                exception_file_path=output_dir_path / f"ERROR_{subject_id}-{epoch_name}.txt",
+                running_file_path=running_file_path,
+            )
+            futures[future] = (session_to_nwb_kwargs, running_file_path)
+        for future in as_completed(futures):
+            session_to_nwb_kwargs, running_file_path = futures[future]
+            try:
+                summaries.append(future.result())
+            except BrokenProcessPool:
+                # A worker process died (e.g. killed by the OOM killer) and the pool stopped all the epochs
+                if running_file_path.exists():
+                    running_file_path.unlink()
+                    interrupted_epochs.append(session_to_nwb_kwargs)
+                else:
+                    not_started_epochs.append(session_to_nwb_kwargs)
+            except Exception as exception:
+                summaries.append(
+                    _get_failed_summary(session_to_nwb_kwargs=session_to_nwb_kwargs, error=repr(exception))
+                )
+    return summaries, interrupted_epochs, not_started_epochs
+
+
+def dataset_to_nwb(
+    *,
+    session_to_nwb_kwargs_per_epoch: List[dict],
+    output_dir_path: Union[str, Path],
+    max_workers: int = 1,
+    max_memory_per_job_gb: Optional[float] = None,
+    verbose: bool = True,
+) -> List[dict]:
+    """
+    Convert several epochs (of one or more subjects) in parallel with a process pool.
+
+    When a worker process dies (e.g. killed by the OOM killer), the pool is recreated: the epochs that were not
+    started are converted by the new pool, and the epochs that were being converted are converted again one at a
+    time, so that only the epoch that makes its worker process die fails.
+
+    Parameters
+    ----------
+    session_to_nwb_kwargs_per_epoch : list of dict
+        The arguments for session_to_nwb, one dictionary per epoch.
+    output_dir_path : Union[str, Path]
+        The path to the directory where the NWB files, the error files and the summary report are saved.
+    max_workers : int, default: 1
+        The number of epochs converted at the same time.
+    max_memory_per_job_gb : float, optional
+        The maximum memory (address space) in GB of each worker process. Only supported on POSIX systems.
+    verbose : bool, default: True
+        Whether to print the summary report.
+
+    Returns
+    -------
+    list of dict
+        The summary of each conversion (subject_id, epoch_name, status, error and duration_in_s).
+    """
+    output_dir_path = Path(output_dir_path)
+    output_dir_path.mkdir(parents=True, exist_ok=True)
+
+    summaries = []
+    pending_epochs = [
+        dict(session_to_nwb_kwargs, output_dir_path=output_dir_path)
+        for session_to_nwb_kwargs in session_to_nwb_kwargs_per_epoch
+    ]
+    while pending_epochs:
+        epoch_summaries, interrupted_epochs, not_started_epochs = _run_epochs_in_pool(
+            session_to_nwb_kwargs_per_epoch=pending_epochs,
+            output_dir_path=output_dir_path,
+            max_workers=max_workers,
+            max_memory_per_job_gb=max_memory_per_job_gb,
+        )
+        summaries += epoch_summaries
+        for session_to_nwb_kwargs in interrupted_epochs:
+            retry_summaries, interrupted_epoch, _ = _run_epochs_in_pool(
+                session_to_nwb_kwargs_per_epoch=[session_to_nwb_kwargs],
+                output_dir_path=output_dir_path,
+                max_workers=1,
+                max_memory_per_job_gb=max_memory_per_job_gb,
+            )
+            summaries += retry_summaries
+            if interrupted_epoch:
+                summaries.append(
+                    _get_failed_summary(
+                        session_to_nwb_kwargs=session_to_nwb_kwargs,
+                        error="The worker process died (e.g. killed because it ran out of memory).",
+                    )
+                )
+        if not_started_epochs and not epoch_summaries and not interrupted_epochs:
+            # The worker processes die before starting any epoch (e.g. in the initializer)
+            summaries += [
+                _get_failed_summary(session_to_nwb_kwargs=session_to_nwb_kwargs, error="The worker process died.")
+                for session_to_nwb_kwargs in not_started_epochs
+            ]
+            not_started_epochs = []
+        pending_epochs = not_started_epochs
+
+    summaries = sorted(summaries, key=lambda summary: (summary["subject_id"], summary["epoch_name"]))
+    summary_file_path = output_dir_path / "conversion_summary.json"
+    with open(summary_file_path, mode="w") as file:
+        json.dump(summaries, file, indent=4)
+
+    if verbose:
+        for summary in summaries:
+            message = f"{summary['subject_id']} {summary['epoch_name']}: {summary['status']}"
+            if summary["duration_in_s"] is not None:
+                message += f" ({summary['duration_in_s']:.1f} s)"
+            if summary["error"] is not None:
+                message += f" - {summary['error']}"
+            print(message)
+        num_failed = sum(summary["status"] == "failed" for summary in summaries)
+        print(f"{len(summaries) - num_failed}/{len(summaries)} epochs converted, summary saved in {summary_file_path}")
+
+    return summaries
@@ -1,14 +1,238 @@
 """Primary script to run to convert an entire session for of data using the NWBConverter."""
 
+import inspect
+from contextlib import nullcontext
+from copy import deepcopy
+from functools import lru_cache
 from pathlib import Path
-from typing import Union, Optional
-import h5py
+from typing import Callable, Union, Optional, List, Literal
 from zoneinfo import ZoneInfo
 import numpy as np
 
-from neuroconv.utils import load_dict_from_file, dict_deep_update
+from neuroconv.utils import FolderPathType, load_dict_from_file, dict_deep_update
 
 from hendricks_2024_nwbconverter import Hendricks2024NWBConverter, get_default_segmentation_to_imaging_name_mapping
+from hendricks_2024_imaginginterface import Hendricks2024SinglePlaneImagingInterface, get_session_start_time
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex
+from hendricks_2024_tiffcache import Hendricks2024TiffMetadataCache
+from hendricks_2024_stimulusfile import Hendricks2024StimulusFile
+from hendricks_2024_segmentationextractor import Hendricks2024Suite2pSessionStore, get_suite2p_store
+from hendricks_2024_datasetconfiguration import configure_imaging_datasets
+from hendricks_2024_metadatapatch import patch_nwbfile_metadata
+from hendricks_2024_profiling import Hendricks2024ConversionProfiler
+from hendricks_2024_memorybudget import get_frame_size_in_bytes, get_memory_budget_options
+from hendricks_2024_manifest import (
+    Hendricks2024ConversionManifest,
+    get_epoch_fingerprint,
+    get_metadata_fingerprint,
+    resume_imaging_series,
+    write_nwbfile_with_manifest,
+)
+
+# The number of frames written by the imaging interfaces for a stub test, unless `stub_frames` is given
+DEFAULT_STUB_FRAMES = (
+    inspect.signature(Hendricks2024SinglePlaneImagingInterface.add_to_nwbfile).parameters["stub_frames"].default
+)
+
+
+@lru_cache(maxsize=None)
+def _load_metadata_file(file_name: str) -> dict:
+    return load_dict_from_file(Path(__file__).parent / file_name)
+
+
+def load_metadata_file(file_name: str) -> dict:
+    """Return a copy of the content of a metadata .yaml file of this conversion, which is read only once per process."""
+    return deepcopy(_load_metadata_file(file_name))
+
+
+def get_session_metadata(subject_id: str) -> dict:
+    """
+    Return the metadata shared by all the epochs of a session: the editable metadata of hendricks_2024_metadata.yaml
+    (the NWBFile fields, the subject and the imaging device) with the id of the subject.
+    """
+    session_metadata = load_metadata_file("hendricks_2024_metadata.yaml")
+    session_metadata["Subject"].update(subject_id=subject_id.replace("_", "-"))
+    return session_metadata
+
+
+def get_epoch_frame_ranges(
+    segmentation_folder_path: FolderPathType,
+    epoch_names: List[str],
+    suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
+) -> dict:
+    """
+    Get the (start_frame, end_frame) of each epoch in the Suite2p output, where the epochs are concatenated in time.
+
+    Parameters
+    ----------
+    segmentation_folder_path: FolderPathType
+        The folder that contains the Suite2P segmentation output. (usually named "suite2p")
+    epoch_names: list of str
+        The name of the epochs, in the order they were concatenated by Suite2p.
+    suite2p_store: Hendricks2024Suite2pSessionStore, optional
+        The store of the Suite2p output in `segmentation_folder_path`. If not provided, a new one is created.
+    """
+    suite2p_store = get_suite2p_store(folder_path=segmentation_folder_path, suite2p_store=suite2p_store)
+    ops = suite2p_store.get_ops(plane_name="plane0")
+    frames_per_epoch = ops["frames_per_folder"]
+    epoch_frame_ranges = dict()
+    for epoch_index, epoch_name in enumerate(epoch_names):
+        start_frame = int(np.sum(frames_per_epoch[:epoch_index]))
+        epoch_frame_ranges[epoch_name] = (start_frame, start_frame + int(frames_per_epoch[epoch_index]))
+    return epoch_frame_ranges
+
+
+def _resume_imaging_series(
+    converter: Hendricks2024NWBConverter,
+    metadata: dict,
+    conversion_options: dict,
+    manifest: Hendricks2024ConversionManifest,
+) -> bool:
+    """Write the missing frames of the imaging series of an interrupted NWB file, return whether it succeeded."""
+    imaging_extractors = dict()
+    photon_series_names = dict()
+    for interface_name in converter.get_imaging_interface_names():
+        imaging_extractor = converter.data_interface_objects[interface_name].imaging_extractor
+        interface_conversion_options = conversion_options[interface_name]
+        if interface_conversion_options["stub_test"]:
+            # Same frames as written by the interface for a stub test
+            stub_frames = interface_conversion_options.get("stub_frames", DEFAULT_STUB_FRAMES)
+            num_frames = min(stub_frames, imaging_extractor.get_num_frames())
+            imaging_extractor = imaging_extractor.frame_slice(start_frame=0, end_frame=num_frames)
+        imaging_extractors[interface_name] = imaging_extractor
+        photon_series_index = interface_conversion_options["photon_series_index"]
+        photon_series_names[interface_name] = metadata["Ophys"]["TwoPhotonSeries"][photon_series_index]["name"]
+    return resume_imaging_series(
+        nwbfile_path=manifest.nwbfile_path,
+        imaging_extractors=imaging_extractors,
+        photon_series_names=photon_series_names,
+        manifest=manifest,
+    )
+
+
+def _write_nwbfile(
+    converter: Hendricks2024NWBConverter,
+    metadata: dict,
+    conversion_options: dict,
+    nwbfile_path: Path,
+    backend: Literal["hdf5", "zarr"] = "hdf5",
+    number_of_jobs: Optional[int] = None,
+    imaging_buffer_gb: Optional[float] = None,
+    imaging_dataset_options: Optional[dict] = None,
+    manifest: Optional[Hendricks2024ConversionManifest] = None,
+    input_fingerprint: Optional[dict] = None,
+    phase: Callable = lambda name: nullcontext(),
+) -> None:
+    """Write the NWB file of an epoch from scratch, recording the progress of its imaging series in the manifest."""
+    if not imaging_dataset_options and backend == "hdf5" and manifest is None:
+        with phase("run_conversion"):
+            converter.run_conversion(
+                metadata=metadata, nwbfile_path=nwbfile_path, conversion_options=conversion_options, overwrite=True
+            )
+        return
+
+    if manifest is not None:
+        manifest.start(
+            input_fingerprint=input_fingerprint,
+            interface_names=list(converter.data_interface_objects),
+            imaging_interface_names=converter.get_imaging_interface_names(),
+        )
+        if backend == "hdf5":
+            converter.manifest = manifest
+    # Tune the chunking and the compression of the TwoPhotonSeries, e.g. dict(frames_per_chunk=...,
+    # tile_shape=..., compression_method="lzf"), see configure_imaging_datasets for all the options
+    with phase("create_nwbfile"):
+        nwbfile = converter.create_nwbfile(metadata=metadata, conversion_options=conversion_options)
+    backend_configuration = converter.get_default_backend_configuration(nwbfile=nwbfile, backend=backend)
+    if backend == "zarr" and number_of_jobs is not None:
+        # The chunks of the datasets are compressed and written in parallel by `number_of_jobs` processes
+        backend_configuration.number_of_jobs = number_of_jobs
+    dataset_options = dict(buffer_gb=imaging_buffer_gb)
+    dataset_options.update(imaging_dataset_options or dict())
+    configure_imaging_datasets(backend_configuration=backend_configuration, **dataset_options)
+    if converter.manifest is not None:
+        # The imaging series are written last and their progress is recorded, to resume them after a crash
+        with phase("write"):
+            write_nwbfile_with_manifest(
+                nwbfile=nwbfile,
+                nwbfile_path=nwbfile_path,
+                backend_configuration=backend_configuration,
+                manifest=manifest,
+            )
+    else:
+        with phase("write"):
+            converter.run_conversion(
+                nwbfile=nwbfile,
+                metadata=metadata,
+                nwbfile_path=nwbfile_path,
+                overwrite=True,
+                backend=backend,
+                backend_configuration=backend_configuration,
+            )
+    if manifest is not None:
+        manifest.mark_completed()
+
+
+def _run_conversion_step(
+    conversion_step: Literal["patch_metadata", "resume", "write"],
+    converter: Hendricks2024NWBConverter,
+    metadata: dict,
+    conversion_options: dict,
+    nwbfile_path: Path,
+    manifest: Optional[Hendricks2024ConversionManifest] = None,
+    input_fingerprint: Optional[dict] = None,
+    **write_options,
+) -> None:
+    """
+    Bring the NWB file of an epoch up to date, as decided by `Hendricks2024ConversionManifest.get_conversion_step`:
+    patch its metadata, resume its imaging series (or write it from scratch if they can not be resumed) or write it.
+    """
+    if conversion_step == "patch_metadata":
+        patched_fields = patch_nwbfile_metadata(nwbfile_path=nwbfile_path, metadata=metadata)
+        print(f"Patched the metadata of '{nwbfile_path}': {', '.join(patched_fields) or 'no field changed'}.")
+        manifest.mark_completed(input_fingerprint=input_fingerprint)
+    elif conversion_step == "resume" and _resume_imaging_series(
+        converter=converter, metadata=metadata, conversion_options=conversion_options, manifest=manifest
+    ):
+        manifest.mark_completed()
+    else:
+        _write_nwbfile(
+            converter=converter,
+            metadata=metadata,
+            conversion_options=conversion_options,
+            nwbfile_path=nwbfile_path,
+            manifest=manifest,
+            input_fingerprint=input_fingerprint,
+            **write_options,
+        )
+
+
+def _get_epoch_metadata(
+    metadata: dict,
+    session_metadata: dict,
+    session_id: str,
+    experiment_description: Optional[str],
+    holographic_stimulation: bool = False,
+) -> dict:
+    """Return the metadata of an epoch: the metadata of its interfaces updated with the metadata of the session."""
+    # Update default metadata with the editable in the corresponding yaml file and the subject, shared by the epochs
+    metadata = dict_deep_update(metadata, deepcopy(session_metadata))
+
+    # Update metadata with the holographic stimulation data
+    if holographic_stimulation:
+        holographic_metadata = load_metadata_file("hendricks_2024_holostim_metadata.yaml")
+        metadata = dict_deep_update(metadata, holographic_metadata)
+
+    # Add the correct metadata for the session
+    timezone = ZoneInfo("America/Los_Angeles")  # Time zone for Berkeley, California
+    session_start_time = metadata["NWBFile"].get("session_start_time")
+    if session_start_time is not None:
+        metadata["NWBFile"].update(session_start_time=session_start_time.replace(tzinfo=timezone))
+    metadata["NWBFile"]["experiment_description"] = experiment_description
+
+    # Each epoch will be saved in a different nwb file but they will have the same session_id.
+    metadata["NWBFile"].update(session_id=session_id)
+    return metadata
 
 
 def session_to_nwb(
@@ -20,99 +244,376 @@ def session_to_nwb(
     visual_stimulus_file_path: Optional[Union[str, Path]] = None,
     epoch_name_visual_stimulus_mapping: Optional[dict] = None,
     holographic_stimulation_file_path: Optional[Union[str, Path]] = None,
+    holographic_target_matching: Optional[Literal["verify", "recompute"]] = None,
     segmentation_start_frame: Optional[int] = 0,
     segmentation_end_frame: Optional[int] = 100,
     epoch_name_description_mapping: Optional[dict] = None,
     stub_test: bool = False,
-):
+    session_metadata: Optional[dict] = None,
+    segmentation_to_imaging_plane_map: Optional[dict] = None,
+    use_tiff_metadata_cache: bool = True,
+    deinterleave_imaging: bool = False,
+    deinterleaving_buffer_folder_path: Optional[Union[str, Path]] = None,
+    suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
+    stimulus_files: Optional[List[Hendricks2024StimulusFile]] = None,
+    imaging_buffer_gb: Optional[float] = None,
+    memory_budget_gb: Optional[float] = None,
+    imaging_dataset_options: Optional[dict] = None,
+    backend: Literal["hdf5", "zarr"] = "hdf5",
+    number_of_jobs: Optional[int] = None,
+    pipeline_imaging: bool = False,
+    resume: bool = False,
+    metadata_only: bool = False,
+    dry_run: bool = False,
+    profile: bool = False,
+    profile_capture: Optional[Literal["cprofile", "pyinstrument"]] = None,
+) -> Optional[Path]:
     conversion_options = dict()
 
-    # Add Imaging
-    imaging_folder_path = Path(imaging_folder_path)
+    # The wall time, the bytes read and written and the peak memory of each phase are saved in a JSON report next to
+    # the NWB file, optionally along with a cProfile or pyinstrument capture of the whole conversion
+    profiler = None
+    if profile or profile_capture is not None:
+        profiler = Hendricks2024ConversionProfiler(capture=profile_capture)
+        profiler.start()
+    phase = profiler.phase if profiler is not None else lambda name: nullcontext()
+
+    # The resources opened by the conversion are released in the `finally` block, whatever step it stops at
+    tiff_metadata_cache, opened_stimulus_files, converter, nwbfile_path = None, [], None, None
+    try:
+        # Add Imaging
+        imaging_folder_path = Path(imaging_folder_path)
+        # The .tif headers and timestamps are cached in the output folder, so that re-runs do not re-open the .tif files
+        if use_tiff_metadata_cache:
+            cache_file_path = Path(output_dir_path) / Hendricks2024TiffMetadataCache.cache_file_name
+            tiff_metadata_cache = Hendricks2024TiffMetadataCache(cache_file_path=cache_file_path)
+        # The .tif files of the epoch are indexed once and shared by all the interfaces
+        tiff_index = Hendricks2024ScanImageTiffIndex(folder_path=imaging_folder_path, cache=tiff_metadata_cache)
+
+        # Add Segmentation
+        if segmentation_folder_path:
+            segmentation_folder_path = Path(segmentation_folder_path)
+            # The Suite2p output is concatenated over the epochs, pass the same store to each epoch to load it only once
+            suite2p_store = get_suite2p_store(folder_path=segmentation_folder_path, suite2p_store=suite2p_store)
+
+        # Each stimulus file is opened once for the checks and all the interfaces of the conversion, the files that are
+        # not shared by the caller are closed at the end of the conversion
+        stimulus_files = {stimulus_file.file_path.resolve(): stimulus_file for stimulus_file in (stimulus_files or [])}
+        for stimulus_file_path in (holographic_stimulation_file_path, visual_stimulus_file_path):
+            if stimulus_file_path and Path(stimulus_file_path).resolve() not in stimulus_files:
+                stimulus_file = Hendricks2024StimulusFile(file_path=stimulus_file_path)
+                stimulus_files[stimulus_file.file_path.resolve()] = stimulus_file
+                opened_stimulus_files.append(stimulus_file)
+
+        if holographic_stimulation_file_path:
+            # Check if session has holographic photostimulation data
+            holographic_stimulation_file = stimulus_files[Path(holographic_stimulation_file_path).resolve()]
+            if epoch_name not in holographic_stimulation_file:
+                holographic_stimulation_file_path = None
 
-    # Add Segmentation
-    if segmentation_folder_path:
-        segmentation_folder_path = Path(segmentation_folder_path)
-        segmentation_to_imaging_plane_map = get_default_segmentation_to_imaging_name_mapping(
-            imaging_folder_path, segmentation_folder_path
+        visual_stimulus_type = None
+        if visual_stimulus_file_path:
+            if epoch_name_visual_stimulus_mapping is None:
+                epoch_name_visual_stimulus_mapping = {
+                    "2ret": "vis_retinotopy_example",
+                    "3ori": "vis_simple_example",
+                    "4ori": "vis_orientation_tuning_example",
+                }
+            if epoch_name in epoch_name_visual_stimulus_mapping.keys():
+                visual_stimulus_type = epoch_name_visual_stimulus_mapping[epoch_name]
+
+        # Each epoch will be saved in a different nwb file but they will have the same session_id, which is known from
+        # the header of the first .tif file before any interface is built
+        subject_id = subject_id.replace("_", "-")
+        session_start_time = get_session_start_time(image_metadata=tiff_index.get_extra_metadata())
+        assert session_start_time is not None, f"The session start time is missing from '{tiff_index.file_paths[0]}'."
+        session_id = f"{subject_id}-{session_start_time.year}{session_start_time.month}{session_start_time.day}"
+        experiment_description = epoch_name_description_mapping.get(epoch_name)
+
+        output_dir_path = Path(output_dir_path)
+        if stub_test:
+            output_dir_path = output_dir_path / f"nwb_stub/{session_id}"
+        else:
+            output_dir_path = output_dir_path / f"{session_id}"
+        output_dir_path.mkdir(parents=True, exist_ok=True)
+        nwbfile_suffix = ".nwb.zarr" if backend == "zarr" else ".nwb"
+        nwbfile_path = output_dir_path / f"{session_id}-{epoch_name}{nwbfile_suffix}"
+
+        if session_metadata is None:
+            session_metadata = get_session_metadata(subject_id=subject_id)
+        metadata_file_paths = [Path(__file__).parent / "hendricks_2024_metadata.yaml"]
+        if holographic_stimulation_file_path:
+            metadata_file_paths.append(Path(__file__).parent / "hendricks_2024_holostim_metadata.yaml")
+        # The metadata of the epoch that does not come from its interfaces, which is known without reading the data
+        session_level_metadata = _get_epoch_metadata(
+            metadata=dict(NWBFile=dict()),
+            session_metadata=session_metadata,
+            session_id=session_id,
+            experiment_description=experiment_description,
+            holographic_stimulation=bool(holographic_stimulation_file_path),
         )
+        metadata_parameters = dict(metadata=session_level_metadata)
 
-    if holographic_stimulation_file_path:
-        # Check if session has holographic photostimulation data
-        holographic_stimulation_data = h5py.File(holographic_stimulation_file_path, "r")
-        if epoch_name not in holographic_stimulation_data.keys():
-            holographic_stimulation_file_path = None
-
-    visual_stimulus_type = None
-    if visual_stimulus_file_path:
-        if epoch_name_visual_stimulus_mapping is None:
-            epoch_name_visual_stimulus_mapping = {
-                "2ret": "vis_retinotopy_example",
-                "3ori": "vis_simple_example",
-                "4ori": "vis_orientation_tuning_example",
-            }
-        if epoch_name in epoch_name_visual_stimulus_mapping.keys():
-            visual_stimulus_type = epoch_name_visual_stimulus_mapping[epoch_name]
-
-    converter = Hendricks2024NWBConverter(
-        imaging_folder_path=imaging_folder_path,
-        segmentation_folder_path=segmentation_folder_path,
-        segmentation_to_imaging_map=segmentation_to_imaging_plane_map,
-        segmentation_start_frame=segmentation_start_frame,
-        segmentation_end_frame=segmentation_end_frame,
-        visual_stimulus_file_path=visual_stimulus_file_path,
-        visual_stimulus_type=visual_stimulus_type,
-        holographic_stimulation_file_path=holographic_stimulation_file_path,
-        epoch_name=epoch_name,
-        verbose=False,
-    )
+        if metadata_only:
+            # Only the metadata of the existing file is rewritten from the metadata .yaml files, the interfaces are not
+            # built and the imaging data and the tables are not re-read
+            if backend != "hdf5":
+                raise ValueError("The metadata can only be rewritten in place with the 'hdf5' backend.")
+            if not nwbfile_path.is_file():
+                raise FileNotFoundError(f"The NWB file '{nwbfile_path}' to rewrite the metadata of is missing.")
+            patched_fields = patch_nwbfile_metadata(nwbfile_path=nwbfile_path, metadata=session_level_metadata)
+            print(f"Patched the metadata of '{nwbfile_path}': {', '.join(patched_fields) or 'no field changed'}.")
+            if resume:
+                manifest = Hendricks2024ConversionManifest(nwbfile_path=nwbfile_path)
+                manifest.record_metadata_patch(
+                    metadata_fingerprint=get_metadata_fingerprint(
+                        metadata_file_paths=metadata_file_paths, metadata_parameters=metadata_parameters
+                    )
+                )
+            return nwbfile_path
 
-    photon_series_index = 0
-    for interface_name in converter.data_interface_objects.keys():
-        if "Imaging" in interface_name:
-            conversion_options[interface_name] = {"stub_test": stub_test, "photon_series_index": photon_series_index}
-            photon_series_index += 1
-        if "Segmentation" in interface_name:
-            conversion_options[interface_name] = {"stub_test": stub_test}
+        if segmentation_folder_path and segmentation_to_imaging_plane_map is None:
+            segmentation_to_imaging_plane_map = get_default_segmentation_to_imaging_name_mapping(
+                imaging_folder_path, segmentation_folder_path, tiff_index=tiff_index, suite2p_store=suite2p_store
+            )
 
-    # Add datetime to conversion
-    metadata = converter.get_metadata()
+        manifest, input_fingerprint, conversion_step = None, None, "write"
+        if resume:
+            # The inputs of the epoch are fingerprinted, split into the data and the metadata inputs: an epoch whose
+            # inputs have not changed since it was written is skipped, before its interfaces are built, and only the
+            # metadata of an epoch whose metadata inputs have changed is patched
+            stimulus_groups = []
+            if holographic_stimulation_file_path:
+                stimulus_groups.append(stimulus_files[Path(holographic_stimulation_file_path).resolve()][epoch_name])
+            if visual_stimulus_type:
+                visual_stimulus_file = stimulus_files[Path(visual_stimulus_file_path).resolve()]
+                visual_stimulus_types = visual_stimulus_type
+                if isinstance(visual_stimulus_type, str):
+                    visual_stimulus_types = [visual_stimulus_type]
+                stimulus_groups.extend(visual_stimulus_file[name] for name in visual_stimulus_types)
+            data_parameters = dict(
+                epoch_name=epoch_name,
+                segmentation_start_frame=segmentation_start_frame,
+                segmentation_end_frame=segmentation_end_frame,
+                visual_stimulus_type=visual_stimulus_type,
+                holographic_target_matching=holographic_target_matching,
+                stub_test=stub_test,
+                imaging_dataset_options=imaging_dataset_options,
+                segmentation_to_imaging_plane_map=segmentation_to_imaging_plane_map,
+                backend=backend,
+            )
+            input_fingerprint = get_epoch_fingerprint(
+                imaging_file_paths=tiff_index.file_paths,
+                segmentation_folder_path=segmentation_folder_path,
+                stimulus_groups=stimulus_groups,
+                data_parameters=data_parameters,
+                metadata_file_paths=metadata_file_paths,
+                metadata_parameters=metadata_parameters,
+            )
+            manifest = Hendricks2024ConversionManifest(nwbfile_path=nwbfile_path)
+            conversion_step = manifest.get_conversion_step(input_fingerprint=input_fingerprint, backend=backend)
+            if conversion_step == "skip":
+                print(f"Skipping '{nwbfile_path}', the inputs of the epoch have not changed since it was written.")
+                return nwbfile_path
+            if backend != "hdf5":
+                print("Warning: the interrupted imaging series can only be resumed with the 'hdf5' backend.")
 
-    # Update default metadata with the editable in the corresponding yaml file
-    editable_metadata_path = Path(__file__).parent / "hendricks_2024_metadata.yaml"
-    editable_metadata = load_dict_from_file(editable_metadata_path)
-    metadata = dict_deep_update(metadata, editable_metadata)
+        # The imaging frames, the Suite2p traces and the stimulus onsets are streamed in blocks sized from the memory
+        # budget, so that the peak memory does not grow with the length of the epoch
+        memory_budget_options = dict()
+        if memory_budget_gb is not None:
+            num_imaging_series = len(tiff_index.get_available_channels()) * len(tiff_index.get_available_planes())
+            memory_budget_options = get_memory_budget_options(
+                memory_budget_gb=memory_budget_gb,
+                frame_size_in_bytes=get_frame_size_in_bytes(tiff_index=tiff_index),
+                num_imaging_series=num_imaging_series,
+                pipeline_imaging=pipeline_imaging,
+                deinterleave_imaging=deinterleave_imaging,
+            )
+            if imaging_buffer_gb is None:
+                imaging_buffer_gb = memory_budget_options["imaging_buffer_gb"]
+        converter_options = dict()
+        if memory_budget_options:
+            converter_options.update(
+                prefetch_frames_per_block=memory_budget_options["prefetch_frames_per_block"],
+                deinterleaving_pages_per_read=memory_budget_options["deinterleaving_pages_per_read"],
+            )
 
-    # Update metadata with the holographic stimulation data
-    if "HolographicStimulation" in converter.data_interface_objects:
-        holographic_stimulation_metadata_path = Path(__file__).parent / "hendricks_2024_holostim_metadata.yaml"
-        holographic_metadata = load_dict_from_file(holographic_stimulation_metadata_path)
-        metadata = dict_deep_update(metadata, holographic_metadata)
+        with phase("converter.__init__"):
+            converter = Hendricks2024NWBConverter(
+                imaging_folder_path=imaging_folder_path,
+                segmentation_folder_path=segmentation_folder_path,
+                segmentation_to_imaging_map=segmentation_to_imaging_plane_map,
+                segmentation_start_frame=segmentation_start_frame,
+                segmentation_end_frame=segmentation_end_frame,
+                visual_stimulus_file_path=visual_stimulus_file_path,
+                visual_stimulus_type=visual_stimulus_type,
+                holographic_stimulation_file_path=holographic_stimulation_file_path,
+                epoch_name=epoch_name,
+                tiff_index=tiff_index,
+                deinterleave_imaging=deinterleave_imaging,
+                deinterleaving_buffer_folder_path=deinterleaving_buffer_folder_path,
+                stimulus_files=list(stimulus_files.values()),
+                suite2p_store=suite2p_store,
+                holographic_target_matching=holographic_target_matching,
+                pipeline_imaging=pipeline_imaging,
+                profiler=profiler,
+                verbose=False,
+                **converter_options,
+            )
 
-    # Add the correct metadata for the session
-    timezone = ZoneInfo("America/Los_Angeles")  # Time zone for Berkeley, California
-    session_start_time = metadata["NWBFile"]["session_start_time"]
-    metadata["NWBFile"].update(session_start_time=session_start_time.replace(tzinfo=timezone))
-    metadata["NWBFile"]["experiment_description"] = epoch_name_description_mapping.get(epoch_name)
-    subject_id = subject_id.replace("_", "-")
-    metadata["Subject"].update(subject_id=subject_id)
+        if dry_run:
+            # Only the inputs and the interfaces of the epoch are checked, the data and the metadata are not read
+            print(f"{epoch_name}: {', '.join(converter.data_interface_objects)}")
+            return None
 
-    # Each epoch will be saved in a different nwb file but they will have the same session_id.
-    session_id = f"{subject_id}-{session_start_time.year}{session_start_time.month}{session_start_time.day}"
-    metadata["NWBFile"].update(session_id=session_id)
+        photon_series_index = 0
+        for interface_name in converter.data_interface_objects.keys():
+            if "Imaging" in interface_name:
+                conversion_options[interface_name] = {
+                    "stub_test": stub_test,
+                    "photon_series_index": photon_series_index,
+                }
+                if imaging_buffer_gb is not None:
+                    conversion_options[interface_name].update(buffer_gb=imaging_buffer_gb)
+                photon_series_index += 1
+            if "Segmentation" in interface_name:
+                conversion_options[interface_name] = {"stub_test": stub_test}
+                if memory_budget_options:
+                    conversion_options[interface_name].update(
+                        iterator_options=dict(buffer_gb=memory_budget_options["segmentation_buffer_gb"])
+                    )
+        if "HolographicStimulation" in converter.data_interface_objects and memory_budget_options:
+            conversion_options["HolographicStimulation"] = {"buffer_gb": memory_budget_options["stimulus_buffer_gb"]}
 
-    output_dir_path = Path(output_dir_path)
-    if stub_test:
-        output_dir_path = output_dir_path / f"nwb_stub/{session_id}"
-    else:
-        output_dir_path = output_dir_path / f"{session_id}"
-    output_dir_path.mkdir(parents=True, exist_ok=True)
-    nwbfile_path = output_dir_path / f"{session_id}-{epoch_name}.nwb"
-    # Run conversion
-    converter.run_conversion(
-        metadata=metadata, nwbfile_path=nwbfile_path, conversion_options=conversion_options, overwrite=True
+        with phase("get_metadata"):
+            metadata = _get_epoch_metadata(
+                metadata=converter.get_metadata(),
+                session_metadata=session_metadata,
+                session_id=session_id,
+                experiment_description=experiment_description,
+                holographic_stimulation="HolographicStimulation" in converter.data_interface_objects,
+            )
+
+        _run_conversion_step(
+            conversion_step=conversion_step,
+            converter=converter,
+            metadata=metadata,
+            conversion_options=conversion_options,
+            nwbfile_path=nwbfile_path,
+            manifest=manifest,
+            input_fingerprint=input_fingerprint,
+            backend=backend,
+            number_of_jobs=number_of_jobs,
+            imaging_buffer_gb=imaging_buffer_gb,
+            imaging_dataset_options=imaging_dataset_options,
+            phase=phase,
+        )
+    finally:
+        if converter is not None:
+            converter.stop_imaging_prefetch()
+            if converter.deinterleaving_reader is not None:
+                converter.deinterleaving_reader.cleanup()
+        for stimulus_file in opened_stimulus_files:
+            stimulus_file.close()
+        if tiff_metadata_cache is not None:
+            tiff_metadata_cache.close()
+        if profiler is not None:
+            profiler.stop()
+        if profiler is not None and nwbfile_path is not None:
+            report_file_path = profiler.save_report(
+                nwbfile_path.with_name(nwbfile_path.name + ".profile.json"),
+                epoch_name=epoch_name,
+                subject_id=subject_id,
+                nwbfile_path=str(nwbfile_path),
+                stub_test=stub_test,
+                backend=backend,
+                deinterleave_imaging=deinterleave_imaging,
+                imaging_buffer_gb=imaging_buffer_gb,
+                memory_budget_gb=memory_budget_gb,
+            )
+            print(f"Saved the profile of the conversion to '{report_file_path}'.")
+
+    return nwbfile_path
+
+
+def split_session_to_nwb(
+    *,
+    subject_id: str,
+    epoch_names: List[str],
+    output_dir_path: Union[str, Path],
+    imaging_folder_path: Union[str, Path],
+    segmentation_folder_path: Union[str, Path],
+    visual_stimulus_file_path: Optional[Union[str, Path]] = None,
+    epoch_name_visual_stimulus_mapping: Optional[dict] = None,
+    holographic_stimulation_file_path: Optional[Union[str, Path]] = None,
+    epoch_name_description_mapping: Optional[dict] = None,
+    stub_test: bool = False,
+    **session_to_nwb_kwargs,
+) -> None:
+    """
+    Split a session, whose epochs were concatenated by Suite2p, into one NWB file per epoch in a single pass.
+
+    The Suite2p output (options, ROI masks and memory-mapped traces) is loaded once and each epoch is a view of its
+    frames, the stimulus files are opened once, and the metadata shared by the epochs (the editable metadata, the
+    subject and the mapping of the segmentation planes to the imaging planes) is built once for all the epochs.
+
+    Parameters
+    ----------
+    subject_id : str
+        The subject id of the session.
+    epoch_names : list of str
+        The name of the epochs, in the order they were concatenated by Suite2p.
+    output_dir_path : Union[str, Path]
+        The path to the directory where the NWB files are saved.
+    imaging_folder_path : Union[str, Path]
+        The folder with one folder of ScanImage .tif files per epoch (usually named "raw-tiffs").
+    segmentation_folder_path : Union[str, Path]
+        The folder that contains the Suite2P segmentation output. (usually named "suite2p")
+    session_to_nwb_kwargs : dict
+        The other arguments for session_to_nwb, shared by all the epochs.
+    """
+    suite2p_store = get_suite2p_store(folder_path=segmentation_folder_path)
+    epoch_frame_ranges = get_epoch_frame_ranges(
+        segmentation_folder_path=segmentation_folder_path, epoch_names=epoch_names, suite2p_store=suite2p_store
+    )
+    session_metadata = get_session_metadata(subject_id=subject_id)
+    # The channels and planes are the same for all the epochs of the session
+    segmentation_to_imaging_plane_map = get_default_segmentation_to_imaging_name_mapping(
+        Path(imaging_folder_path) / epoch_names[0], segmentation_folder_path, suite2p_store=suite2p_store
     )
 
+    stimulus_files = dict()
+    for stimulus_file_path in (holographic_stimulation_file_path, visual_stimulus_file_path):
+        if stimulus_file_path and Path(stimulus_file_path).resolve() not in stimulus_files:
+            stimulus_files[Path(stimulus_file_path).resolve()] = Hendricks2024StimulusFile(file_path=stimulus_file_path)
+
+    try:
+        for epoch_name in epoch_names:
+            segmentation_start_frame, segmentation_end_frame = epoch_frame_ranges[epoch_name]
+            session_to_nwb(
+                epoch_name=epoch_name,
+                subject_id=subject_id,
+                output_dir_path=output_dir_path,
+                imaging_folder_path=Path(imaging_folder_path) / epoch_name,
+                segmentation_folder_path=segmentation_folder_path,
+                visual_stimulus_file_path=visual_stimulus_file_path,
+                epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
+                holographic_stimulation_file_path=holographic_stimulation_file_path,
+                segmentation_start_frame=segmentation_start_frame,
+                segmentation_end_frame=segmentation_end_frame,
+                epoch_name_description_mapping=epoch_name_description_mapping,
+                stub_test=stub_test,
+                session_metadata=session_metadata,
+                segmentation_to_imaging_plane_map=segmentation_to_imaging_plane_map,
+                suite2p_store=suite2p_store,
+                stimulus_files=list(stimulus_files.values()),
+                **session_to_nwb_kwargs,
+            )
+    finally:
+        for stimulus_file in stimulus_files.values():
+            stimulus_file.close()
+
 
 if __name__ == "__main__":
     # Parameters for conversion
@@ -143,28 +644,16 @@ if __name__ == "__main__":
         "4ori": "vis_orientation_tuning_example",
     }
 
-    for epoch_name in epoch_names:
-        imaging_folder_path = data_dir_path / "raw-tiffs" / epoch_name
-
-        file_npy_path = segmentation_folder_path / "plane0/ops.npy"
-        ops = np.load(file_npy_path, allow_pickle=True).item()
-        frames_per_epoch = ops["frames_per_folder"]
-        epoch_index = epoch_names.index(epoch_name)
-
-        segmentation_start_frame = np.sum(frames_per_epoch[:epoch_index])
-        segmentation_end_frame = segmentation_start_frame + frames_per_epoch[epoch_index]
-
-        session_to_nwb(
-            epoch_name=epoch_name,
-            subject_id=subject_id,
-            output_dir_path=output_dir_path,
-            imaging_folder_path=imaging_folder_path,
-            segmentation_folder_path=segmentation_folder_path,
-            visual_stimulus_file_path=visual_stimulus_file_path,
-            epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
-            holographic_stimulation_file_path=holographic_stimulation_file_path,
-            segmentation_start_frame=segmentation_start_frame,
-            segmentation_end_frame=segmentation_end_frame,
-            epoch_name_description_mapping=epoch_name_description_mapping,
-            stub_test=stub_test,
-        )
+    # All the epochs of the session are converted in one pass, sharing the Suite2p output and the stimulus file
+    split_session_to_nwb(
+        subject_id=subject_id,
+        epoch_names=epoch_names,
+        output_dir_path=output_dir_path,
+        imaging_folder_path=data_dir_path / "raw-tiffs",
+        segmentation_folder_path=segmentation_folder_path,
+        visual_stimulus_file_path=visual_stimulus_file_path,
+        epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
+        holographic_stimulation_file_path=holographic_stimulation_file_path,
+        epoch_name_description_mapping=epoch_name_description_mapping,
+        stub_test=stub_test,
+    )
@@ -0,0 +1,74 @@
+import math
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+from neuroconv.tools.nwb_helpers import HDF5BackendConfiguration, ZarrBackendConfiguration
+
+
+def configure_imaging_datasets(
+    backend_configuration: Union[HDF5BackendConfiguration, ZarrBackendConfiguration],
+    frames_per_chunk: Optional[int] = None,
+    tile_shape: Optional[Tuple[int, int]] = None,
+    compression_method: Optional[str] = None,
+    compression_options: Optional[dict] = None,
+    buffer_gb: Optional[float] = None,
+) -> Union[HDF5BackendConfiguration, ZarrBackendConfiguration]:
+    """
+    Set the chunking, the compression and the write buffer of the TwoPhotonSeries datasets of a backend configuration.
+
+    The TwoPhotonSeries datasets are the bulk of the output, the other datasets keep the default configuration.
+
+    Parameters
+    ----------
+    backend_configuration : HDF5BackendConfiguration or ZarrBackendConfiguration
+        The backend configuration as returned by `get_default_backend_configuration`, which is modified in place.
+    frames_per_chunk : int, optional
+        The number of frames in each chunk. If not provided, the default chunking is kept along the frame axis.
+    tile_shape : tuple of int, optional
+        The (width, height) of each chunk in pixels. If not provided, the default chunking is kept along the
+        spatial axes.
+    compression_method : str, optional
+        The compression filter, e.g. "gzip", "lzf" or "Blosc" (requires hdf5plugin) for HDF5, or "gzip", "blosc"
+        or "zstd" for Zarr. If not provided, the default compression is kept.
+    compression_options : dict, optional
+        The options of the compression filter (e.g. dict(level=4) for "gzip").
+    buffer_gb : float, optional
+        The maximum memory (in GB) used to buffer the frames written at once. The buffer always spans whole frames
+        and a whole number of chunks.
+
+    Returns
+    -------
+    HDF5BackendConfiguration or ZarrBackendConfiguration
+        The modified backend configuration.
+    """
+    for location_in_file, dataset_configuration in backend_configuration.dataset_configurations.items():
+        if "TwoPhotonSeries" not in location_in_file or not location_in_file.endswith("/data"):
+            continue
+
+        full_shape = dataset_configuration.full_shape
+        chunk_shape = list(dataset_configuration.chunk_shape)
+        if frames_per_chunk is not None:
+            chunk_shape[0] = frames_per_chunk
+        if tile_shape is not None:
+            chunk_shape[1:3] = tile_shape
+        chunk_shape = tuple(min(chunk_axis, full_axis) for chunk_axis, full_axis in zip(chunk_shape, full_shape))
+
+        buffer_shape = dataset_configuration.buffer_shape
+        if buffer_gb is not None or chunk_shape != dataset_configuration.chunk_shape:
+            # The buffer covers whole frames, and as many chunks along the frame axis as fit in `buffer_gb`
+            itemsize = np.dtype(dataset_configuration.dtype).itemsize
+            frame_size_in_bytes = math.prod(full_shape[1:]) * itemsize
+            if buffer_gb is None:
+                buffer_size_in_bytes = math.prod(dataset_configuration.buffer_shape) * itemsize
+            else:
+                buffer_size_in_bytes = buffer_gb * 1e9
+            chunks_per_buffer = max(1, int(buffer_size_in_bytes // (frame_size_in_bytes * chunk_shape[0])))
+            buffer_shape = (min(chunks_per_buffer * chunk_shape[0], full_shape[0]), *full_shape[1:])
+
+        update = dict(chunk_shape=chunk_shape, buffer_shape=buffer_shape)
+        if compression_method is not None:
+            update.update(compression_method=compression_method, compression_options=compression_options)
+        backend_configuration.dataset_configurations[location_in_file] = dataset_configuration.model_copy(update=update)
+
+    return backend_configuration
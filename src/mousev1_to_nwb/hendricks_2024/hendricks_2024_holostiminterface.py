@@ -1,10 +1,10 @@
 from copy import deepcopy
-from natsort import natsorted
 from pathlib import Path
-from typing import Optional
+from typing import List, Literal, Optional
 import numpy as np
-import pandas as pd
-import h5py
+from scipy.spatial import cKDTree
+
+from hdmf.common import VectorData, VectorIndex
 
 from neuroconv import BaseDataInterface
 from neuroconv.tools.roiextractors.roiextractors import get_default_segmentation_metadata
@@ -15,12 +15,6 @@ from pynwb.device import Device
 from pynwb.ogen import OptogeneticStimulusSite
 from pynwb.ophys import PlaneSegmentation, OpticalChannel
 
-from roiextractors.extractors.tiffimagingextractors.scanimagetiff_utils import (
-    parse_metadata,
-    extract_extra_metadata,
-    extract_timestamps_from_file,
-)
-
 from ndx_patterned_ogen import (
     PatternedOptogeneticStimulusTable,
     OptogeneticStimulusTarget,
@@ -30,6 +24,10 @@ from ndx_patterned_ogen import (
     LightSource,
 )
 
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex, get_tiff_index
+from hendricks_2024_stimulusfile import Hendricks2024StimulusFile, get_stimulus_file
+from hendricks_2024_segmentationextractor import Hendricks2024Suite2pSessionStore
+
 
 def check_optogenetic_stim_data(
     file_path: FilePathType,
@@ -45,18 +43,32 @@ def check_optogenetic_stim_data(
         "suite2p_targets",
         "scanimage_hologram_list",
     ],
+    stimulus_file: Optional[Hendricks2024StimulusFile] = None,
 ):
-    with h5py.File(file_path, "r") as file:
-        if epoch_name not in file:
-            raise ValueError(
-                f"'{epoch_name}' is not a valid name for an epoch with holographic stimulation. "
-                f"This file only contains holographic stimulation data for epochs: {list(file.keys())}"
-            )
+    stimulus_file = get_stimulus_file(file_path=file_path, stimulus_file=stimulus_file)
+    if epoch_name not in stimulus_file:
+        raise ValueError(
+            f"'{epoch_name}' is not a valid name for an epoch with holographic stimulation. "
+            f"This file only contains holographic stimulation data for epochs: {stimulus_file.keys()}"
+        )
 
-        else:
-            for i in fields_to_check:
-                if i not in file[epoch_name]:
-                    raise ValueError(f"'{i}' missing from {epoch_name} holographic stimulation data")
+    else:
+        for i in fields_to_check:
+            if i not in stimulus_file[epoch_name]:
+                raise ValueError(f"'{i}' missing from {epoch_name} holographic stimulation data")
+
+
+def _stimulation_data(dataset_name: str, per_trial: bool = False, scale: Optional[float] = None) -> property:
+    """Property reading a dataset of the epoch group from the stimulus file on first access."""
+
+    def read_stimulation_data(self) -> np.ndarray:
+        if dataset_name not in self._stimulation_data:
+            dataset = self._stimulation_group[dataset_name]
+            data = dataset.read(num_rows=self._num_trials if per_trial else None)
+            self._stimulation_data[dataset_name] = data if scale is None else data * scale
+        return self._stimulation_data[dataset_name]
+
+    return property(read_stimulation_data)
 
 
 class Hendricks2024HolographicStimulationInterface(BaseDataInterface):
@@ -71,6 +83,11 @@ class Hendricks2024HolographicStimulationInterface(BaseDataInterface):
         holographic_stimulation_file_path: FilePathType,
         epoch_name: str = None,
         targeted_plane_segmentation_name: Optional[str] = None,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
+        stimulus_file: Optional[Hendricks2024StimulusFile] = None,
+        target_matching: Optional[Literal["verify", "recompute"]] = None,
+        max_target_distance: float = 5.0,
+        suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
         verbose: bool = True,
     ):
         """
@@ -86,44 +103,152 @@ class Hendricks2024HolographicStimulationInterface(BaseDataInterface):
             The file path for the .hdf5 file that contains the holographic stimulation data
         epoch_name: str,
             The name of the epoch where the holographic stimulation is carried out
+        tiff_index: Hendricks2024ScanImageTiffIndex, optional
+            The index of the .tif files in `folder_path`, shared between the interfaces of the same epoch.
+            If not provided, a new one is created.
+        stimulus_file: Hendricks2024StimulusFile, optional
+            The open handle on `holographic_stimulation_file_path`, shared between the interfaces of the conversion.
+            If not provided, a new one is created.
+        target_matching: {"verify", "recompute"}, optional
+            Whether to match the ScanImage targets to the segmented rois (see `match_targets_to_rois`) and either
+            warn about the targets where the match differs from 'targeted_cells' ("verify"), or use the match
+            instead of 'targeted_cells' ("recompute"). By default 'targeted_cells' is used as is.
+        max_target_distance: float, default: 5.0
+            The maximum distance (in pixels) between a ScanImage target and the segmented roi it is matched to.
+        suite2p_store: Hendricks2024Suite2pSessionStore, optional
+            The Suite2p output of the session, to match the targets to the median locations of the rois of
+            'stat.npy' instead of 'suite2p_targets'.
         verbose : bool, default: True
         """
+        if target_matching not in (None, "verify", "recompute"):
+            raise ValueError(f"'{target_matching}' is not a valid target matching, it must be 'verify' or 'recompute'.")
+        self.target_matching = target_matching
+        self.max_target_distance = max_target_distance
+        self.suite2p_store = suite2p_store
         folder_path = Path(folder_path)
-        tif_file_paths = natsorted(folder_path.glob("*.tif"))
-        assert tif_file_paths, f"The TIF image files are missing from '{folder_path}'."
-        self._total_number_of_trials = len(tif_file_paths)
-
-        self.trial_start_times = []
-        for tif_file_path in tif_file_paths:
-            timestamps = extract_timestamps_from_file(file_path=tif_file_path)
-            self.trial_start_times.append(timestamps[0])
-
-        self.image_metadata = extract_extra_metadata(file_path=tif_file_paths[0])
-        self.metadata_parsed = parse_metadata(self.image_metadata)
-        self.rois_metadata = self.metadata_parsed["roi_metadata"]
+        self.tiff_index = get_tiff_index(folder_path=folder_path, tiff_index=tiff_index)
+        # The .tif headers and timestamps are only read (once, by the shared index) when they are used
+        self._total_number_of_trials = len(self.tiff_index)
 
         self.targeted_plane_segmentation_name = targeted_plane_segmentation_name or "PlaneSegmentationTargetedHologram"
+        self.stimulus_file = get_stimulus_file(file_path=holographic_stimulation_file_path, stimulus_file=stimulus_file)
         try:
-            check_optogenetic_stim_data(file_path=holographic_stimulation_file_path, epoch_name=epoch_name)
+            check_optogenetic_stim_data(
+                file_path=holographic_stimulation_file_path, epoch_name=epoch_name, stimulus_file=self.stimulus_file
+            )
         except ValueError as ve:
             print(f"Error: {str(ve)}")
 
-        data = h5py.File(holographic_stimulation_file_path, "r")
-        data = data[epoch_name]
-        self._targeted_to_segmented_roi_ids_map = data["targeted_cells"][:]
-        self._suite2p_segmented_coordinates = data["suite2p_targets"][:]
-        self._scanimage_hologram_list = data["scanimage_hologram_list"][:]
-        self._scanimage_target_coordinates = data["scanimage_targets"][:]
-        self._trial_to_stimulation_ids_map = data["stim_id"][:]
-        self._frequency_per_trial = data["hz_per_cell"][:]
-        self._n_spike_per_trial = data["spikes_per_cell"][:]
-        self._stimulus_time_per_targeted_rois = data["stim_times"][:]
-        self._stimulus_power_per_targeted_rois = data["roi_powers_mW"][:] * 1e-3  # conversion from mW to W
+        # The datasets are only read when they are used, and the per-trial ones only up to the last recorded trial
+        self._stimulation_group = self.stimulus_file[epoch_name]
+        self._stimulation_data = dict()
+        self._roi_id_index = None
+        # 7expt has incomplete data
+        self._num_trials = min(len(self._stimulation_group["stim_id"]), self._total_number_of_trials)
 
         self.epoch_name = epoch_name
         super().__init__(folder_path=folder_path)
         self.verbose = verbose
 
+    @property
+    def trial_start_times(self) -> List[float]:
+        return self.tiff_index.get_trial_start_times()
+
+    @property
+    def image_metadata(self) -> dict:
+        return self.tiff_index.get_extra_metadata()
+
+    @property
+    def metadata_parsed(self) -> dict:
+        return self.tiff_index.get_parsed_metadata()
+
+    @property
+    def rois_metadata(self) -> dict:
+        return self.metadata_parsed["roi_metadata"]
+
+    _targeted_to_segmented_roi_ids_map = _stimulation_data("targeted_cells")
+    _suite2p_segmented_coordinates = _stimulation_data("suite2p_targets")
+    _scanimage_hologram_list = _stimulation_data("scanimage_hologram_list")
+    _scanimage_target_coordinates = _stimulation_data("scanimage_targets")
+    _trial_to_stimulation_ids_map = _stimulation_data("stim_id", per_trial=True)
+    _frequency_per_trial = _stimulation_data("hz_per_cell", per_trial=True)
+    _n_spike_per_trial = _stimulation_data("spikes_per_cell", per_trial=True)
+    _stimulus_time_per_targeted_rois = _stimulation_data("stim_times")
+    _stimulus_power_per_targeted_rois = _stimulation_data("roi_powers_mW", scale=1e-3)  # conversion from mW to W
+
+    def get_roi_id_index(self) -> "Hendricks2024RoiIdIndex":
+        """Return the mapping between the targeted, the segmented and the global roi ids, computed once."""
+        if self._roi_id_index is None:
+            targeted_to_segmented_roi_ids = self._targeted_to_segmented_roi_ids_map
+            if self.target_matching is not None:
+                matched_roi_ids = self.match_targets_to_segmented_rois()
+                if self.target_matching == "recompute":
+                    targeted_to_segmented_roi_ids = matched_roi_ids
+                else:
+                    self.verify_targeted_cells(matched_roi_ids=matched_roi_ids)
+            self._roi_id_index = Hendricks2024RoiIdIndex(
+                targeted_to_segmented_roi_ids=targeted_to_segmented_roi_ids,
+                num_segmented_rois=len(np.asarray(self._suite2p_segmented_coordinates).reshape(-1, 3)),
+            )
+        return self._roi_id_index
+
+    def match_targets_to_segmented_rois(self) -> np.ndarray:
+        """
+        Match each ScanImage target to the closest segmented roi of the same plane, within `max_target_distance`.
+
+        The segmented rois are located by the median locations of the accepted rois of 'stat.npy' when the Suite2p
+        store is given, and by 'suite2p_targets' otherwise.
+
+        Returns
+        -------
+        np.ndarray
+            The id of the segmented roi matched to each target, NaN when no roi is close enough, as 'targeted_cells'.
+        """
+        roi_coordinates = np.asarray(self._suite2p_segmented_coordinates, dtype=float).reshape(-1, 3)
+        if self.suite2p_store is not None:
+            store_roi_coordinates = self.suite2p_store.get_accepted_roi_coordinates()
+            if len(store_roi_coordinates) != len(roi_coordinates):
+                raise ValueError(
+                    f"The Suite2p output has {len(store_roi_coordinates)} accepted rois, but the holographic "
+                    f"stimulation data of '{self.epoch_name}' has {len(roi_coordinates)} segmented rois."
+                )
+            # The rois are only matched to the targets of their own plane, so the planes must be the same
+            mismatched_planes = np.flatnonzero(store_roi_coordinates[:, 2] != roi_coordinates[:, 2])
+            if len(mismatched_planes):
+                raise ValueError(
+                    f"The plane of {len(mismatched_planes)} of the accepted rois of the Suite2p output differs from "
+                    f"the plane of the 'suite2p_targets' of '{self.epoch_name}' (first rois: "
+                    f"{list(mismatched_planes[:10])})."
+                )
+            roi_coordinates = store_roi_coordinates
+        return match_targets_to_rois(
+            target_coordinates=self._scanimage_target_coordinates,
+            roi_coordinates=roi_coordinates,
+            max_distance=self.max_target_distance,
+        )
+
+    def verify_targeted_cells(self, matched_roi_ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compare 'targeted_cells' to the targets matched to the segmented rois, and print a warning when they differ.
+
+        Returns
+        -------
+        np.ndarray
+            The indexes of the targets where 'targeted_cells' differs from the match.
+        """
+        if matched_roi_ids is None:
+            matched_roi_ids = self.match_targets_to_segmented_rois()
+        targeted_cells = np.asarray(self._targeted_to_segmented_roi_ids_map, dtype=float).ravel()
+        is_same = (targeted_cells == matched_roi_ids) | (np.isnan(targeted_cells) & np.isnan(matched_roi_ids))
+        mismatched_targets = np.flatnonzero(~is_same)
+        if len(mismatched_targets):
+            print(
+                f"Warning: {len(mismatched_targets)} of the {len(targeted_cells)} targets of {self.epoch_name} are "
+                f"not matched to the same segmented roi as in 'targeted_cells' (first targets: "
+                f"{list(mismatched_targets[:10])})."
+            )
+        return mismatched_targets
+
     def get_metadata_schema(self) -> dict:
         metadata_schema = super().get_metadata_schema()
         metadata_schema["required"] = ["Ophys"]
@@ -155,7 +280,20 @@ class Hendricks2024HolographicStimulationInterface(BaseDataInterface):
         nwbfile: NWBFile,
         metadata: Optional[dict] = None,
         stub_test: bool = False,
+        buffer_gb: Optional[float] = None,
     ) -> None:
+        """
+        Add the holographic stimulation (devices, targeted rois, holograms and stimulus table) to the NWB file.
+
+        Parameters
+        ----------
+        nwbfile : NWBFile
+        metadata : dict, optional
+        stub_test : bool, default: False
+        buffer_gb : float, optional
+            The maximum memory (in GB) used to compute the stimulus onsets, which are then computed by blocks of
+            trials. By default the onsets of all the trials are computed at once.
+        """
         metadata_copy = deepcopy(metadata)
 
         device_name = metadata_copy["Ophys"]["Device"][0]["name"]
@@ -217,133 +355,426 @@ class Hendricks2024HolographicStimulationInterface(BaseDataInterface):
             origin_coords_unit="micrometers",
         )
 
+        # The segmented rois keep their index as global id, the targeted rois matched to a segmented roi take its
+        # global id and the other targeted rois are numbered after the segmented rois
+        roi_id_index = self.get_roi_id_index()
+
         # Add plane segmentation to store the Accepted Suite2p ROIs concatenated over the planes
-        plane_segmentation = PlaneSegmentation(
+        plane_segmentation = create_point_plane_segmentation(
             name="PlaneSegmentationChannel1ConcatenatedPlanes",
             description="Accepted Suite2p ROIs concatenated over the planes",
             imaging_plane=imaging_plane,
+            coordinates=self._suite2p_segmented_coordinates,
+            global_ids=roi_id_index.segmented_to_global_ids,
         )
-
-        for segmented_roi in self._suite2p_segmented_coordinates:
-            plane_segmentation.add_roi(voxel_mask=[np.append(segmented_roi, 1)])
-
-        # add global_ids
-        segmented_to_glob_ids = np.array(plane_segmentation[:].index)
-        plane_segmentation.add_column(
-            name="global_ids",
-            description="Global roi ids to match targeted and segmented ROIs",
-            data=segmented_to_glob_ids,
-        )
-
         nwbfile.processing["ophys"]["ImageSegmentation"].add_plane_segmentation(plane_segmentation)
 
         # Add plane segmentation to store the targeted ROIs
-        targeted_plane_segmentation = PlaneSegmentation(
+        targeted_plane_segmentation = create_point_plane_segmentation(
             name=self.targeted_plane_segmentation_name,
             description="Targeted ROIs from the ScanImage metadata",
             imaging_plane=imaging_plane,
+            coordinates=self._scanimage_target_coordinates,
+            global_ids=roi_id_index.targeted_to_global_ids,
         )
-
-        for target_roi in self._scanimage_target_coordinates:
-            targeted_plane_segmentation.add_roi(voxel_mask=[np.append(target_roi, 1)])
-
-        # add global_ids
-        targeted_not_stimulated_rois = self._targeted_to_segmented_roi_ids_map[
-            np.isnan(self._targeted_to_segmented_roi_ids_map)
-        ]
-        targeted_to_glob_ids = np.zeros((len(self._targeted_to_segmented_roi_ids_map)))
-        targeted_to_glob_ids[np.isnan(self._targeted_to_segmented_roi_ids_map)] = np.arange(
-            len(segmented_to_glob_ids), len(segmented_to_glob_ids) + len(targeted_not_stimulated_rois)
-        )
-        targeted_to_glob_ids[~np.isnan(self._targeted_to_segmented_roi_ids_map)] = (
-            self._targeted_to_segmented_roi_ids_map[~np.isnan(self._targeted_to_segmented_roi_ids_map)]
-        )
-
-        targeted_plane_segmentation.add_column(
-            name="global_ids",
-            description="Global roi ids to match targeted and segmented ROIs",
-            data=targeted_to_glob_ids.astype(int),
-        )
-
         nwbfile.processing["ophys"]["ImageSegmentation"].add_plane_segmentation(targeted_plane_segmentation)
 
-        stimulus_table = PatternedOptogeneticStimulusTable(
-            name="PatternedOptogeneticStimulusTable", description="Patterned stimulus"
+        # create each hologram once, trials refer to their hologram by stim_id
+        holograms = self.add_holograms_to_nwbfile(
+            nwbfile=nwbfile,
+            targeted_plane_segmentation=targeted_plane_segmentation,
+            plane_segmentation=plane_segmentation,
         )
-        colnames = [
-            "start_time",
-            "stop_time",
-            "power_per_roi",
-            "frequency",
-            "stimulus_pattern",
-            "targets",
-            "stimulus_site",
-            "tags",
-        ]
-        rows = []
-        for trial, hologram_index in enumerate(self._trial_to_stimulation_ids_map):
-            # 7expt has incomplete data
-            if trial >= self._total_number_of_trials:
-                break
-            # create hologram from hologram list
-            if hologram_index != 0:  #
-                hologram_index = hologram_index - 1
-                targeted_roi_indexes = self._scanimage_hologram_list[hologram_index]
-                targeted_roi_indexes = list(targeted_roi_indexes[~np.isnan(targeted_roi_indexes)].astype(int))
-                segmented_roi_indexes = self._targeted_to_segmented_roi_ids_map[targeted_roi_indexes]
-                segmented_roi_indexes = list(segmented_roi_indexes[~np.isnan(segmented_roi_indexes)].astype(int))
-
-                if len(targeted_roi_indexes) > 0:
-                    targeted_rois = targeted_plane_segmentation.create_roi_table_region(
-                        name="targeted_rois",
-                        description="targeted rois",
-                        region=targeted_roi_indexes,
-                    )
-                    segmented_rois = plane_segmentation.create_roi_table_region(
-                        name="segmented_rois",
-                        description="segmented rois",
-                        region=segmented_roi_indexes,
-                    )
-                    hologram_name = f"Hologram{hologram_index}"
-                    hologram = OptogeneticStimulusTarget(
-                        name=hologram_name, targeted_rois=targeted_rois, segmented_rois=segmented_rois
-                    )
-                    if hologram_name not in nwbfile.lab_meta_data:
-                        nwbfile.add_lab_meta_data(hologram)
-
-                    trial_start_time = self.trial_start_times[trial]
-                    frequency = self._frequency_per_trial[trial]
-                    n_spike = self._n_spike_per_trial[trial]
-                    stimulus_power = self._stimulus_power_per_targeted_rois[targeted_roi_indexes]
-                    stimulus_time = self._stimulus_time_per_targeted_rois[targeted_roi_indexes]
-                    start_time = trial_start_time + stimulus_time
-                    stop_time = start_time + np.round(n_spike / frequency, decimals=2)
-                    # Since each roi in the Hologram receive the stimuli at different times and different power,
-                    # here we add one interval for each stimulus time and indicate which roi has been stimulated
-                    # by setting power as an 1D array where the only non-zero element is
-                    # the one reffered to the roi stimulated in the current stimulus onset.
-                    # NB: if "power" is defined as array it must have the same lenght as "targeted_rois"
-                    for i in range(len(targeted_roi_indexes)):
-                        if ~np.isnan(start_time[i]) and ~np.isnan(stimulus_power[i]):
-                            power = np.zeros((len(targeted_roi_indexes)))
-                            power[i] = stimulus_power[i]
-                            row = [
-                                start_time[i],
-                                stop_time[i],
-                                power,
-                                frequency,
-                                temporal_focusing,
-                                nwbfile.lab_meta_data[hologram_name],
-                                stim_site,
-                                [f"trial {trial}"],
-                            ]
-                            rows.append(row)
-        stimulus_df = pd.DataFrame(rows, columns=colnames)
-        if len(stimulus_df["start_time"]) == 0:
+
+        stimulus_onsets = self.get_stimulus_onsets(trials_per_block=self.get_trials_per_block(buffer_gb=buffer_gb))
+        if len(stimulus_onsets["start_time"]) == 0:
             print(f"No stimulus onset has been found in {self.epoch_name}")
             print("No PatternedOptogeneticStimulusTable will be created")
         else:
-            stimulus_df = stimulus_df.sort_values(by="start_time")
-            for i, row in stimulus_df.iterrows():
-                stimulus_table.add_row(row.to_dict())
+            targets = [holograms[stim_id] for stim_id in stimulus_onsets["stim_id"]]
+            stimulus_table = create_patterned_optogenetic_stimulus_table(
+                stimulus_onsets=stimulus_onsets,
+                stimulus_pattern=temporal_focusing,
+                stimulus_site=stim_site,
+                targets=targets,
+            )
             nwbfile.add_time_intervals(stimulus_table)
+
+    def get_hologram_registry(self) -> dict:
+        """
+        Compute once the targeted and segmented roi indexes of each hologram stimulated in the epoch.
+
+        Returns
+        -------
+        dict
+            For each `stim_id` used by at least one trial (0, the control condition, excluded) and whose hologram
+            targets at least one roi: a dict with the 'name' of the hologram, the 'targeted_roi_indexes'
+            and the 'segmented_roi_indexes' (the targeted rois matched to a Suite2p roi).
+        """
+        stim_ids = np.unique(np.asarray(self._trial_to_stimulation_ids_map[: self._num_trials]).astype(int))
+        roi_id_index = self.get_roi_id_index()
+
+        hologram_registry = dict()
+        for stim_id in stim_ids[stim_ids != 0]:
+            hologram_index = stim_id - 1
+            targeted_roi_indexes = self._scanimage_hologram_list[hologram_index]
+            targeted_roi_indexes = list(targeted_roi_indexes[~np.isnan(targeted_roi_indexes)].astype(int))
+            if len(targeted_roi_indexes) == 0:
+                continue
+            segmented_roi_indexes = roi_id_index.targeted_to_segmented_ids[targeted_roi_indexes]
+            segmented_roi_indexes = list(segmented_roi_indexes[segmented_roi_indexes != -1])
+            hologram_registry[stim_id] = dict(
+                name=f"Hologram{hologram_index}",
+                targeted_roi_indexes=targeted_roi_indexes,
+                segmented_roi_indexes=segmented_roi_indexes,
+            )
+        return hologram_registry
+
+    def add_holograms_to_nwbfile(
+        self,
+        nwbfile: NWBFile,
+        targeted_plane_segmentation: PlaneSegmentation,
+        plane_segmentation: PlaneSegmentation,
+    ) -> dict:
+        """
+        Add one OptogeneticStimulusTarget per hologram of the registry (reusing the ones already in the NWB file).
+
+        Returns
+        -------
+        dict
+            The OptogeneticStimulusTarget of each `stim_id`.
+        """
+        holograms = dict()
+        for stim_id, hologram in self.get_hologram_registry().items():
+            if hologram["name"] not in nwbfile.lab_meta_data:
+                targeted_rois = targeted_plane_segmentation.create_roi_table_region(
+                    name="targeted_rois",
+                    description="targeted rois",
+                    region=hologram["targeted_roi_indexes"],
+                )
+                segmented_rois = plane_segmentation.create_roi_table_region(
+                    name="segmented_rois",
+                    description="segmented rois",
+                    region=hologram["segmented_roi_indexes"],
+                )
+                nwbfile.add_lab_meta_data(
+                    OptogeneticStimulusTarget(
+                        name=hologram["name"], targeted_rois=targeted_rois, segmented_rois=segmented_rois
+                    )
+                )
+            holograms[stim_id] = nwbfile.lab_meta_data[hologram["name"]]
+        return holograms
+
+    def get_trials_per_block(self, buffer_gb: Optional[float] = None) -> Optional[int]:
+        """
+        Return the number of trials whose stimulus onsets fit in `buffer_gb`, or None (all the trials at once) when
+        `buffer_gb` is not given.
+        """
+        if buffer_gb is None:
+            return None
+        # About ten (trials x rois of the largest hologram) arrays of 8 bytes are computed for each block
+        max_rois_per_hologram = np.atleast_2d(self._scanimage_hologram_list).shape[1]
+        trial_size_in_bytes = 10 * 8 * max_rois_per_hologram
+        return max(1, int(buffer_gb * 1e9 // trial_size_in_bytes))
+
+    def get_stimulus_onsets(self, trials_per_block: Optional[int] = None) -> dict:
+        """
+        Compute all the stimulus onsets of the epoch, sorted by start time.
+
+        Since each roi in the Hologram receive the stimuli at different times and different power, there is one
+        onset for each stimulated roi of each trial. Trials with `stim_id` 0 are control trials (no stimulation),
+        and rois with a NaN stimulus time or power are not stimulated.
+
+        Parameters
+        ----------
+        trials_per_block : int, optional
+            The number of trials whose onsets are computed at once, which bounds the memory used by the intermediate
+            (trials x rois) arrays. By default all the trials are computed at once.
+
+        Returns
+        -------
+        dict
+            One array per field, with one element per onset: 'start_time', 'stop_time', 'power' (in W),
+            'frequency', 'trial', 'stim_id', 'roi_position' (the position of the stimulated roi in the hologram)
+            and 'num_rois' (the number of rois in the hologram).
+        """
+        stim_ids = np.asarray(self._trial_to_stimulation_ids_map[: self._num_trials]).astype(int)
+        stimulated_trials = np.flatnonzero(stim_ids != 0)
+        trial_start_times = np.asarray(self.trial_start_times)
+        frequency = np.asarray(self._frequency_per_trial)
+        n_spike = np.asarray(self._n_spike_per_trial)
+
+        # The onsets of each block of trials are computed from (trials x rois) arrays, only the onsets are kept
+        trials_per_block = trials_per_block or max(1, len(stimulated_trials))
+        blocks = []
+        for start in range(0, max(1, len(stimulated_trials)), trials_per_block):
+            block_trials = stimulated_trials[start : start + trials_per_block]
+            blocks.append(
+                self._get_stimulus_onsets_of_trials(
+                    stimulated_trials=block_trials,
+                    stim_ids=stim_ids[block_trials],
+                    trial_start_times=trial_start_times[block_trials],
+                    frequency=frequency[block_trials],
+                    n_spike=n_spike[block_trials],
+                )
+            )
+        stimulus_onsets = {field: np.concatenate([block[field] for block in blocks]) for field in blocks[0]}
+        del blocks
+        sorting_indices = np.argsort(stimulus_onsets["start_time"], kind="stable")
+        return {field: values[sorting_indices] for field, values in stimulus_onsets.items()}
+
+    def _get_stimulus_onsets_of_trials(
+        self,
+        stimulated_trials: np.ndarray,
+        stim_ids: np.ndarray,
+        trial_start_times: np.ndarray,
+        frequency: np.ndarray,
+        n_spike: np.ndarray,
+    ) -> dict:
+        """Compute the stimulus onsets (unsorted) of the stimulated trials, given with their per-trial values."""
+        # Holograms are stored as rows of roi indexes, padded with NaN
+        hologram_rois = np.atleast_2d(self._scanimage_hologram_list)[stim_ids - 1]
+        is_roi = ~np.isnan(hologram_rois)
+        roi_indexes = np.where(is_roi, hologram_rois, 0).astype(int)
+        roi_positions = np.cumsum(is_roi, axis=1) - 1
+        num_rois = is_roi.sum(axis=1)
+
+        start_times = trial_start_times[:, np.newaxis] + self._stimulus_time_per_targeted_rois[roi_indexes]
+        stop_times = start_times + np.round(n_spike / frequency, decimals=2)[:, np.newaxis]
+        powers = self._stimulus_power_per_targeted_rois[roi_indexes]
+        is_onset = is_roi & ~np.isnan(start_times) & ~np.isnan(powers)
+
+        trial_positions, roi_columns = np.nonzero(is_onset)
+        return dict(
+            start_time=start_times[trial_positions, roi_columns],
+            stop_time=stop_times[trial_positions, roi_columns],
+            power=powers[trial_positions, roi_columns],
+            frequency=frequency[trial_positions],
+            trial=stimulated_trials[trial_positions],
+            stim_id=stim_ids[trial_positions],
+            roi_position=roi_positions[trial_positions, roi_columns],
+            num_rois=num_rois[trial_positions],
+        )
+
+
+def match_targets_to_rois(
+    target_coordinates: np.ndarray,
+    roi_coordinates: np.ndarray,
+    max_distance: float = 5.0,
+) -> np.ndarray:
+    """
+    Match each target to the closest roi of the same plane within `max_distance`, with a KD-tree over the rois that
+    is queried by all the targets at once.
+
+    Parameters
+    ----------
+    target_coordinates : np.ndarray
+        The (x, y, plane) coordinates of the targets, in pixels.
+    roi_coordinates : np.ndarray
+        The (x, y, plane) coordinates of the rois, in pixels.
+    max_distance : float, default: 5.0
+        The maximum distance (in pixels, in the plane) between a target and the roi it is matched to.
+
+    Returns
+    -------
+    np.ndarray
+        The index of the roi matched to each target, NaN when no roi of the plane is within `max_distance`.
+    """
+    target_coordinates = np.asarray(target_coordinates, dtype=float).reshape(-1, 3)
+    roi_coordinates = np.asarray(roi_coordinates, dtype=float).reshape(-1, 3)
+    matched_roi_ids = np.full(len(target_coordinates), np.nan)
+    if len(target_coordinates) == 0 or len(roi_coordinates) == 0:
+        return matched_roi_ids
+
+    # The planes are set further apart than `max_distance`, so that a target is only matched to the rois of its plane
+    plane_spacing = np.array([1.0, 1.0, 2 * max_distance + 1.0])
+    tree = cKDTree(roi_coordinates * plane_spacing)
+    distances, roi_ids = tree.query(target_coordinates * plane_spacing, k=1, distance_upper_bound=max_distance)
+    is_matched = np.isfinite(distances)
+    matched_roi_ids[is_matched] = roi_ids[is_matched]
+    return matched_roi_ids
+
+
+class Hendricks2024RoiIdIndex:
+    """
+    The mapping between the ids of the targeted rois (the ScanImage targets), the segmented rois (the accepted
+    Suite2p rois) and the global rois, computed once so that each lookup is an array indexing.
+
+    The segmented rois keep their id as global id. A targeted roi matched to a segmented roi has the global id of
+    that roi, and the targeted rois that are not matched are numbered after the segmented rois, in their order.
+    The lookup arrays hold -1 where an id has no counterpart.
+    """
+
+    def __init__(self, targeted_to_segmented_roi_ids: np.ndarray, num_segmented_rois: int):
+        """
+        Parameters
+        ----------
+        targeted_to_segmented_roi_ids : np.ndarray
+            The id of the segmented roi matched to each targeted roi, NaN when the targeted roi is not matched
+            ('targeted_cells' of the stimulus file).
+        num_segmented_rois : int
+            The number of segmented rois.
+        """
+        targeted_to_segmented_roi_ids = np.asarray(targeted_to_segmented_roi_ids, dtype=float).ravel()
+        is_matched = ~np.isnan(targeted_to_segmented_roi_ids)
+        matched_segmented_ids = targeted_to_segmented_roi_ids[is_matched].astype(int)
+        if np.any(matched_segmented_ids < 0) or np.any(matched_segmented_ids >= num_segmented_rois):
+            raise ValueError(
+                f"The targeted rois must be matched to segmented rois with ids between 0 and {num_segmented_rois - 1}."
+            )
+
+        self.num_segmented_rois = num_segmented_rois
+        self.num_targeted_rois = len(targeted_to_segmented_roi_ids)
+        num_unmatched_rois = self.num_targeted_rois - len(matched_segmented_ids)
+        self.num_global_rois = num_segmented_rois + num_unmatched_rois
+
+        targeted_ids = np.arange(self.num_targeted_rois)
+        self.targeted_to_segmented_ids = np.full(self.num_targeted_rois, -1, dtype=int)
+        self.targeted_to_segmented_ids[is_matched] = matched_segmented_ids
+        self.targeted_to_global_ids = np.empty(self.num_targeted_rois, dtype=int)
+        self.targeted_to_global_ids[is_matched] = matched_segmented_ids
+        self.targeted_to_global_ids[~is_matched] = np.arange(num_segmented_rois, self.num_global_rois)
+
+        self.segmented_to_global_ids = np.arange(num_segmented_rois)
+        # A segmented roi matched by several targeted rois maps back to the first of them
+        self.segmented_to_targeted_ids = np.full(num_segmented_rois, -1, dtype=int)
+        self.segmented_to_targeted_ids[matched_segmented_ids[::-1]] = targeted_ids[is_matched][::-1]
+
+        self.global_to_segmented_ids = np.full(self.num_global_rois, -1, dtype=int)
+        self.global_to_segmented_ids[:num_segmented_rois] = self.segmented_to_global_ids
+        self.global_to_targeted_ids = np.full(self.num_global_rois, -1, dtype=int)
+        self.global_to_targeted_ids[:num_segmented_rois] = self.segmented_to_targeted_ids
+        self.global_to_targeted_ids[num_segmented_rois:] = targeted_ids[~is_matched]
+
+
+def create_point_plane_segmentation(
+    name: str,
+    description: str,
+    imaging_plane,
+    coordinates: np.ndarray,
+    global_ids: np.ndarray,
+) -> PlaneSegmentation:
+    """
+    Create a PlaneSegmentation with one single-voxel roi per (x, y, z) coordinate from whole columns, instead of
+    adding the rois one by one.
+
+    Parameters
+    ----------
+    name : str
+    description : str
+    imaging_plane : ImagingPlane
+    coordinates : np.ndarray
+        The (x, y, z) coordinates of the rois, in pixels.
+    global_ids : np.ndarray
+        The global id of each roi, see `Hendricks2024RoiIdIndex`.
+    """
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 3)
+    num_rois = len(coordinates)
+    voxel_mask_data = np.empty(num_rois, dtype=[("x", float), ("y", float), ("z", float), ("weight", float)])
+    voxel_mask_data["x"], voxel_mask_data["y"], voxel_mask_data["z"] = coordinates.T
+    voxel_mask_data["weight"] = 1.0
+
+    voxel_mask = VectorData(
+        name="voxel_mask",
+        description="Voxel masks for each ROI: a list of indices and weights for the ROI.",
+        data=voxel_mask_data,
+    )
+    columns = [
+        voxel_mask,
+        VectorIndex(name="voxel_mask_index", target=voxel_mask, data=np.arange(1, num_rois + 1)),
+        VectorData(
+            name="global_ids",
+            description="Global roi ids to match targeted and segmented ROIs",
+            data=np.asarray(global_ids, dtype=int),
+        ),
+    ]
+    return PlaneSegmentation(name=name, description=description, imaging_plane=imaging_plane, columns=columns)
+
+
+def _get_stimulus_table_column_description(column_name: str) -> str:
+    for column_spec in PatternedOptogeneticStimulusTable.__columns__:
+        if column_spec["name"] == column_name:
+            return column_spec["description"]
+    return column_name.replace("_", " ")
+
+
+def create_patterned_optogenetic_stimulus_table(
+    stimulus_onsets: dict,
+    stimulus_pattern: TemporalFocusing,
+    stimulus_site: PatternedOptogeneticStimulusSite,
+    targets: list,
+    name: str = "PatternedOptogeneticStimulusTable",
+    description: str = "Patterned stimulus",
+) -> PatternedOptogeneticStimulusTable:
+    """
+    Create the PatternedOptogeneticStimulusTable from whole columns, instead of adding the onsets row by row.
+
+    Parameters
+    ----------
+    stimulus_onsets : dict
+        The stimulus onsets as returned by `Hendricks2024HolographicStimulationInterface.get_stimulus_onsets`.
+    stimulus_pattern : TemporalFocusing
+        The stimulus pattern shared by all the onsets.
+    stimulus_site : PatternedOptogeneticStimulusSite
+        The stimulus site shared by all the onsets.
+    targets : list of OptogeneticStimulusTarget
+        The hologram stimulated at each onset.
+    """
+    num_onsets = len(stimulus_onsets["start_time"])
+
+    # "power_per_roi" is a ragged column: for each onset an array with the length of the hologram where the only
+    # non-zero element is the power of the roi stimulated at this onset
+    power_per_roi_index = np.cumsum(stimulus_onsets["num_rois"])
+    power_per_roi_data = np.zeros(power_per_roi_index[-1] if num_onsets else 0)
+    row_offsets = power_per_roi_index - stimulus_onsets["num_rois"]
+    power_per_roi_data[row_offsets + stimulus_onsets["roi_position"]] = stimulus_onsets["power"]
+
+    tags = VectorData(
+        name="tags",
+        description=_get_stimulus_table_column_description("tags"),
+        data=[f"trial {trial}" for trial in stimulus_onsets["trial"]],
+    )
+    columns = [
+        VectorData(
+            name="start_time",
+            description=_get_stimulus_table_column_description("start_time"),
+            data=stimulus_onsets["start_time"],
+        ),
+        VectorData(
+            name="stop_time",
+            description=_get_stimulus_table_column_description("stop_time"),
+            data=stimulus_onsets["stop_time"],
+        ),
+        VectorData(
+            name="frequency",
+            description=_get_stimulus_table_column_description("frequency"),
+            data=stimulus_onsets["frequency"],
+        ),
+        VectorData(
+            name="stimulus_pattern",
+            description=_get_stimulus_table_column_description("stimulus_pattern"),
+            data=[stimulus_pattern] * num_onsets,
+        ),
+        VectorData(
+            name="targets",
+            description=_get_stimulus_table_column_description("targets"),
+            data=list(targets),
+        ),
+        VectorData(
+            name="stimulus_site",
+            description=_get_stimulus_table_column_description("stimulus_site"),
+            data=[stimulus_site] * num_onsets,
+        ),
+        tags,
+        VectorIndex(name="tags_index", target=tags, data=np.arange(1, num_onsets + 1)),
+    ]
+    stimulus_table = PatternedOptogeneticStimulusTable(name=name, description=description, columns=columns)
+    # The constructor checks the length of each row of the "_per_roi" columns with `len` on the flat data rather than
+    # on the rows of the ragged column, so "power_per_roi" is only added once the table is built
+    stimulus_table.add_column(
+        name="power_per_roi",
+        description=_get_stimulus_table_column_description("power_per_roi"),
+        data=power_per_roi_data,
+        index=power_per_roi_index.tolist(),
+    )
+    return stimulus_table
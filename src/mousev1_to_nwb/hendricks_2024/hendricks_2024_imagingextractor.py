@@ -1,14 +1,152 @@
-from typing import Optional
+import mmap
+import queue
+import shutil
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
 from pathlib import Path
-from natsort import natsorted
+import numpy as np
 
-from neuroconv.utils import FolderPathType
+from neuroconv.utils import FolderPathType, FilePathType
 
 from roiextractors.extractors.tiffimagingextractors.scanimagetiffimagingextractor import (
     ScanImageTiffMultiPlaneImagingExtractor,
     ScanImageTiffSinglePlaneImagingExtractor,
 )
 from roiextractors.multiimagingextractor import MultiImagingExtractor
+from roiextractors.imagingextractor import ImagingExtractor
+from ScanImageTiffReader import ScanImageTiffReader
+
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex, get_tiff_index
+
+
+_TIFF_TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 16: "Q"}  # BYTE, SHORT, LONG, LONG8
+_TIFF_SAMPLE_FORMATS = {1: "u", 2: "i", 3: "f"}
+_TIFF_TAGS = dict(
+    image_width=256,
+    image_length=257,
+    bits_per_sample=258,
+    compression=259,
+    strip_offsets=273,
+    samples_per_pixel=277,
+    strip_byte_counts=279,
+    sample_format=339,
+)
+
+
+def get_tiff_page_table(file_path: FilePathType) -> Optional[dict]:
+    """
+    Build the table of the offsets of the pixel data of each page of an uncompressed (Big)TIFF file.
+
+    The IFDs are parsed directly (no pixel data is read or decoded). Returns None when any page is compressed,
+    has more than one sample per pixel, or is not stored as a single contiguous block, in which case the file can
+    not be memory-mapped.
+
+    Returns
+    -------
+    dict
+        'page_offsets': the byte offset of the pixel data of each page, 'image_size': (rows, columns) and 'dtype'.
+    """
+    with open(file_path, "rb") as file:
+        byte_order = {b"II": "<", b"MM": ">"}.get(file.read(2))
+        if byte_order is None:
+            return None
+        (version,) = struct.unpack(f"{byte_order}H", file.read(2))
+        if version == 42:
+            count_format, offset_format, entry_size = "H", "I", 12
+            (ifd_offset,) = struct.unpack(f"{byte_order}I", file.read(4))
+        elif version == 43:
+            count_format, offset_format, entry_size = "Q", "Q", 20
+            file.read(4)
+            (ifd_offset,) = struct.unpack(f"{byte_order}Q", file.read(8))
+        else:
+            return None
+        inline_size = struct.calcsize(offset_format)
+        tag_to_name = {tag: name for name, tag in _TIFF_TAGS.items()}
+
+        page_offsets = []
+        image_size, dtype = None, None
+        while ifd_offset:
+            file.seek(ifd_offset)
+            (num_entries,) = struct.unpack(f"{byte_order}{count_format}", file.read(struct.calcsize(count_format)))
+            entries = file.read(num_entries * entry_size)
+            (ifd_offset,) = struct.unpack(f"{byte_order}{offset_format}", file.read(inline_size))
+
+            tags = dict()
+            for entry_index in range(num_entries):
+                entry = entries[entry_index * entry_size : (entry_index + 1) * entry_size]
+                tag, tag_type = struct.unpack(f"{byte_order}HH", entry[:4])
+                if tag not in tag_to_name or tag_type not in _TIFF_TYPE_FORMATS:
+                    continue
+                (count,) = struct.unpack(f"{byte_order}{count_format}", entry[4 : 4 + struct.calcsize(count_format)])
+                value_bytes = entry[4 + struct.calcsize(count_format) :]
+                value_format = _TIFF_TYPE_FORMATS[tag_type]
+                values_size = count * struct.calcsize(value_format)
+                if values_size > inline_size:
+                    (values_offset,) = struct.unpack(f"{byte_order}{offset_format}", value_bytes)
+                    position = file.tell()
+                    file.seek(values_offset)
+                    value_bytes = file.read(values_size)
+                    file.seek(position)
+                tags[tag_to_name[tag]] = np.frombuffer(
+                    value_bytes[:values_size], dtype=f"{byte_order}{value_format}", count=count
+                )
+
+            if tags.get("compression", [1])[0] != 1 or tags.get("samples_per_pixel", [1])[0] != 1:
+                return None
+            page_image_size = (int(tags["image_length"][0]), int(tags["image_width"][0]))
+            bits_per_sample = int(tags.get("bits_per_sample", [1])[0])
+            sample_format = _TIFF_SAMPLE_FORMATS.get(int(tags.get("sample_format", [1])[0]))
+            if sample_format is None or bits_per_sample % 8:
+                return None
+            page_dtype = np.dtype(f"{byte_order}{sample_format}{bits_per_sample // 8}")
+            if (image_size, dtype) != (page_image_size, page_dtype) and page_offsets:
+                return None
+            image_size, dtype = page_image_size, page_dtype
+
+            strip_offsets = tags["strip_offsets"].astype("int64")
+            strip_byte_counts = tags["strip_byte_counts"].astype("int64")
+            is_contiguous = np.all(strip_offsets[1:] == strip_offsets[:-1] + strip_byte_counts[:-1])
+            if not is_contiguous or strip_byte_counts.sum() != np.prod(image_size) * dtype.itemsize:
+                return None
+            page_offsets.append(int(strip_offsets[0]))
+
+    return dict(page_offsets=np.array(page_offsets, dtype="int64"), image_size=image_size, dtype=dtype)
+
+
+def get_memmap_frames(
+    file_path: FilePathType, page_table: dict, page_indices: np.ndarray, file_memmap: Optional[np.memmap] = None
+) -> np.ndarray:
+    """
+    Return the pages of an uncompressed .tif file as a (num_pages, rows, columns) array backed by a memory map.
+
+    When the pages are equally spaced in the file the result is a strided view (no copy and no decoding),
+    otherwise the pages are copied from the memory map.
+    """
+    if file_memmap is None:
+        file_memmap = np.memmap(file_path, dtype="uint8", mode="r")
+    image_size, dtype = page_table["image_size"], page_table["dtype"]
+    page_offsets = page_table["page_offsets"][page_indices]
+    if len(page_offsets) == 0:
+        return np.empty((0, *image_size), dtype=dtype)
+    page_strides = np.diff(page_offsets)
+    if len(page_offsets) == 1 or (np.all(page_strides == page_strides[0]) and page_strides[0] > 0):
+        page_stride = int(page_strides[0]) if len(page_offsets) > 1 else int(np.prod(image_size) * dtype.itemsize)
+        return np.ndarray(
+            shape=(len(page_offsets), *image_size),
+            dtype=dtype,
+            buffer=file_memmap,
+            offset=int(page_offsets[0]),
+            strides=(page_stride, image_size[1] * dtype.itemsize, dtype.itemsize),
+        )
+    return np.stack(
+        [
+            np.ndarray(shape=image_size, dtype=dtype, buffer=file_memmap, offset=int(page_offset))
+            for page_offset in page_offsets
+        ]
+    )
 
 
 class Hendricks2024MultiPlaneImagingExtractor(MultiImagingExtractor):
@@ -22,10 +160,11 @@ class Hendricks2024MultiPlaneImagingExtractor(MultiImagingExtractor):
         self,
         folder_path: FolderPathType,
         channel_name: Optional[str] = None,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
     ) -> None:
         self.folder_path = Path(folder_path)
-        tif_file_paths = natsorted(self.folder_path.glob("*.tif"))
-        assert tif_file_paths, f"The TIF image files are missing from '{self.folder_path}'."
+        self.tiff_index = get_tiff_index(folder_path=self.folder_path, tiff_index=tiff_index)
+        tif_file_paths = self.tiff_index.file_paths
 
         imaging_extractors = [
             ScanImageTiffMultiPlaneImagingExtractor(file_path=file_path, channel_name=channel_name)
@@ -47,10 +186,11 @@ class Hendricks2024SinglePlaneImagingExtractor(MultiImagingExtractor):
         folder_path: FolderPathType,
         channel_name: str,
         plane_name: str,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
     ) -> None:
         self.folder_path = Path(folder_path)
-        tif_file_paths = natsorted(self.folder_path.glob("*.tif"))
-        assert tif_file_paths, f"The TIF image files are missing from '{folder_path}'."
+        self.tiff_index = get_tiff_index(folder_path=self.folder_path, tiff_index=tiff_index)
+        tif_file_paths = self.tiff_index.file_paths
 
         imaging_extractors = [
             ScanImageTiffSinglePlaneImagingExtractor(
@@ -60,3 +200,571 @@ class Hendricks2024SinglePlaneImagingExtractor(MultiImagingExtractor):
         ]
 
         super().__init__(imaging_extractors=imaging_extractors)
+
+
+class Hendricks2024DeinterleavingTiffReader:
+    """
+    Reader for the round-robin (planes x channels) ScanImage .tif files of one epoch.
+
+    Each .tif file is read only once: every page is routed to the buffer of its (channel, plane), so that the
+    imaging series of all the channels and planes can be written from the buffers without reading the raw data again.
+    The buffers are memory-mapped files stored in `buffer_folder_path`, and a .tif file is de-interleaved the first
+    time one of its frames is requested. The .tif files are not opened before the first frame (or the number of frames,
+    the image size or the dtype) is requested, so that building the reader is cheap.
+
+    Uncompressed .tif files with contiguous pages (as written by ScanImage) are not buffered: their frames are
+    served as strided views of a memory map of the file, which requires neither a copy nor any decoding.
+    """
+
+    def __init__(
+        self,
+        tiff_index: Hendricks2024ScanImageTiffIndex,
+        buffer_folder_path: Optional[FolderPathType] = None,
+        pages_per_read: int = 600,
+        use_memmap: bool = True,
+        max_open_files: int = 16,
+    ):
+        """
+        Parameters
+        ----------
+        tiff_index : Hendricks2024ScanImageTiffIndex
+            The index of the .tif files of the epoch.
+        buffer_folder_path : FolderPathType, optional
+            The folder where the de-interleaved frames are stored, a temporary folder is used if not provided.
+            It must have enough space to hold the whole epoch.
+        pages_per_read : int, default: 600
+            The number of pages read at once from a .tif file.
+        use_memmap : bool, default: True
+            Whether to memory-map the uncompressed .tif files instead of de-interleaving them into the buffers.
+        max_open_files : int, default: 16
+            The number of memory-mapped .tif files kept open, the least recently read ones are closed first.
+        """
+        self.tiff_index = tiff_index
+        self.pages_per_read = pages_per_read
+        self.use_memmap = use_memmap
+        self.max_open_files = max_open_files
+        self._page_tables = dict()
+        self._file_memmaps = OrderedDict()
+
+        parsed_metadata = self.tiff_index.get_parsed_metadata()
+        self.channel_names = parsed_metadata["channel_names"]
+        self.num_channels = parsed_metadata["num_channels"]
+        self.num_planes = parsed_metadata["num_planes"]
+        self.frames_per_slice = parsed_metadata["frames_per_slice"]
+        self._pages_per_cycle = self.num_channels * self.num_planes * self.frames_per_slice
+        # The .tif files are only opened when the first frame is read (or the shape of the frames is requested)
+        self._file_start_frames = None
+        self._first_page = None
+
+        # The buffer folder is only created if a file has to be de-interleaved
+        self._is_temporary_buffer_folder = buffer_folder_path is None
+        self.buffer_folder_path = Path(buffer_folder_path) if buffer_folder_path is not None else None
+        self._buffers = dict()
+        self._deinterleaved_file_indices = set()
+        self._lock = threading.Lock()
+
+    def _get_file_start_frames(self) -> np.ndarray:
+        """Return the first frame of each file, and the number of frames of the epoch as the last element."""
+        if self._file_start_frames is None:
+            # Number of frames of each (channel, plane) in each file, the frames of an incomplete cycle are dropped
+            num_frames_per_file = [
+                (self.tiff_index.get_num_pages(file_index) // self._pages_per_cycle) * self.frames_per_slice
+                for file_index in range(len(self.tiff_index))
+            ]
+            self._file_start_frames = np.concatenate([[0], np.cumsum(num_frames_per_file)]).astype(int)
+        return self._file_start_frames
+
+    def _get_first_page(self) -> np.ndarray:
+        if self._first_page is None:
+            with ScanImageTiffReader(str(self.tiff_index.file_paths[0])) as io:
+                self._first_page = io.data(beg=0, end=1)
+        return self._first_page
+
+    @property
+    def num_frames(self) -> int:
+        return int(self._get_file_start_frames()[-1])
+
+    @property
+    def image_size(self) -> Tuple[int, int]:
+        return tuple(self._get_first_page().shape[1:])
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._get_first_page().dtype
+
+    def _get_buffer(self, channel_index: int, plane_index: int) -> np.memmap:
+        key = (channel_index, plane_index)
+        if key not in self._buffers:
+            if self.buffer_folder_path is None:
+                self.buffer_folder_path = Path(tempfile.mkdtemp(prefix="hendricks_2024_deinterleaved_"))
+            self.buffer_folder_path.mkdir(parents=True, exist_ok=True)
+            buffer_file_path = self.buffer_folder_path / f"channel{channel_index}_plane{plane_index}.dat"
+            self._buffers[key] = np.memmap(
+                buffer_file_path, dtype=self.dtype, mode="w+", shape=(self.num_frames, *self.image_size)
+            )
+        return self._buffers[key]
+
+    def _page_to_frame_location(self, page_indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return the channel index, plane index and frame index (within the file) of each page."""
+        channel_indices = page_indices % self.num_channels
+        slice_frame_indices = (page_indices // self.num_channels) % self.frames_per_slice
+        plane_indices = (page_indices // (self.num_channels * self.frames_per_slice)) % self.num_planes
+        cycle_indices = page_indices // self._pages_per_cycle
+        frame_indices = cycle_indices * self.frames_per_slice + slice_frame_indices
+        return channel_indices, plane_indices, frame_indices
+
+    def _frame_to_page_indices(self, channel_index: int, plane_index: int, frame_indices: np.ndarray) -> np.ndarray:
+        """Return the page index (within the file) of each frame of one (channel, plane)."""
+        cycle_indices = frame_indices // self.frames_per_slice
+        slice_frame_indices = frame_indices % self.frames_per_slice
+        return (
+            cycle_indices * self._pages_per_cycle
+            + plane_index * self.frames_per_slice * self.num_channels
+            + slice_frame_indices * self.num_channels
+            + channel_index
+        )
+
+    def _get_page_table(self, file_index: int) -> Optional[dict]:
+        """Return the page table of a file, or None if the file can not be memory-mapped."""
+        if not self.use_memmap:
+            return None
+        if file_index not in self._page_tables:
+            page_table = get_tiff_page_table(file_path=self.tiff_index.file_paths[file_index])
+            if page_table is not None and page_table["image_size"] != self.image_size:
+                page_table = None
+            self._page_tables[file_index] = page_table
+        return self._page_tables[file_index]
+
+    def _get_file_frames(
+        self, file_index: int, channel_index: int, plane_index: int, start_frame: int, end_frame: int
+    ) -> np.ndarray:
+        """Return the frames in [start_frame, end_frame) (relative to the start of the file) of one file."""
+        page_table = self._get_page_table(file_index=file_index)
+        if page_table is not None:
+            file_memmap = self._file_memmaps.pop(file_index, None)
+            if file_memmap is None:
+                file_memmap = np.memmap(self.tiff_index.file_paths[file_index], dtype="uint8", mode="r")
+            # Only the maps of the files read last are kept, the file of an evicted map is closed once the frames
+            # served from it are released
+            self._file_memmaps[file_index] = file_memmap
+            while len(self._file_memmaps) > self.max_open_files:
+                self._file_memmaps.popitem(last=False)
+            page_indices = self._frame_to_page_indices(
+                channel_index=channel_index, plane_index=plane_index, frame_indices=np.arange(start_frame, end_frame)
+            )
+            return get_memmap_frames(
+                file_path=self.tiff_index.file_paths[file_index],
+                page_table=page_table,
+                page_indices=page_indices,
+                file_memmap=file_memmap,
+            )
+
+        if file_index not in self._deinterleaved_file_indices:
+            self._deinterleave_file(file_index=file_index)
+        file_start_frame = self._get_file_start_frames()[file_index]
+        buffer = self._get_buffer(channel_index=channel_index, plane_index=plane_index)
+        return buffer[file_start_frame + start_frame : file_start_frame + end_frame]
+
+    def _deinterleave_file(self, file_index: int) -> None:
+        file_start_frames = self._get_file_start_frames()
+        file_start_frame = file_start_frames[file_index]
+        num_frames = file_start_frames[file_index + 1] - file_start_frame
+        num_pages = num_frames // self.frames_per_slice * self._pages_per_cycle
+        with ScanImageTiffReader(str(self.tiff_index.file_paths[file_index])) as io:
+            for start_page in range(0, num_pages, self.pages_per_read):
+                end_page = min(start_page + self.pages_per_read, num_pages)
+                pages = io.data(beg=start_page, end=end_page)
+                channel_indices, plane_indices, frame_indices = self._page_to_frame_location(
+                    np.arange(start_page, end_page)
+                )
+                for channel_index in range(self.num_channels):
+                    for plane_index in range(self.num_planes):
+                        mask = (channel_indices == channel_index) & (plane_indices == plane_index)
+                        if not np.any(mask):
+                            continue
+                        buffer = self._get_buffer(channel_index=channel_index, plane_index=plane_index)
+                        buffer[file_start_frame + frame_indices[mask]] = pages[mask]
+        for buffer in self._buffers.values():
+            buffer.flush()
+        self._deinterleaved_file_indices.add(file_index)
+
+    def get_timestamps(self, channel_name: str, plane_name: str) -> np.ndarray:
+        """Return the ScanImage 'frameTimestamps_sec' of each frame of one (channel, plane)."""
+        channel_index = self.channel_names.index(channel_name)
+        file_start_frames = self._get_file_start_frames()
+        timestamps = []
+        for file_index in range(len(self.tiff_index)):
+            num_frames = file_start_frames[file_index + 1] - file_start_frames[file_index]
+            page_indices = self._frame_to_page_indices(
+                channel_index=channel_index, plane_index=int(plane_name), frame_indices=np.arange(num_frames)
+            )
+            timestamps.append(self.tiff_index.get_timestamps(file_index=file_index)[page_indices])
+        return np.concatenate(timestamps)
+
+    def cleanup(self) -> None:
+        """Remove the buffers (and the buffer folder if it is temporary)."""
+        with self._lock:
+            buffer_file_paths = [Path(buffer.filename) for buffer in self._buffers.values()]
+            self._buffers = dict()
+            self._file_memmaps = OrderedDict()
+            self._deinterleaved_file_indices = set()
+            for buffer_file_path in buffer_file_paths:
+                buffer_file_path.unlink(missing_ok=True)
+            if self._is_temporary_buffer_folder and self.buffer_folder_path is not None:
+                shutil.rmtree(self.buffer_folder_path, ignore_errors=True)
+                self.buffer_folder_path = None
+
+    def get_frames(self, channel_name: str, plane_name: str, start_frame: int, end_frame: int) -> np.ndarray:
+        """
+        Return the frames in [start_frame, end_frame) of one (channel, plane).
+
+        When the frames come from a single memory-mapped file, the returned array is a view of the file.
+        """
+        channel_index = self.channel_names.index(channel_name)
+        plane_index = int(plane_name)
+        file_start_frames = self._get_file_start_frames()
+        first_file_index = max(np.searchsorted(file_start_frames, start_frame, side="right") - 1, 0)
+        last_file_index = np.searchsorted(file_start_frames, end_frame, side="left") - 1
+
+        frames = []
+        with self._lock:
+            for file_index in range(first_file_index, last_file_index + 1):
+                file_start_frame = file_start_frames[file_index]
+                file_end_frame = file_start_frames[file_index + 1]
+                frames.append(
+                    self._get_file_frames(
+                        file_index=file_index,
+                        channel_index=channel_index,
+                        plane_index=plane_index,
+                        start_frame=max(start_frame, file_start_frame) - file_start_frame,
+                        end_frame=min(end_frame, file_end_frame) - file_start_frame,
+                    )
+                )
+        if len(frames) == 1:
+            return frames[0]
+        if len(frames) == 0:
+            return np.empty((0, *self.image_size), dtype=self.dtype)
+        return np.concatenate(frames)
+
+
+class Hendricks2024DeinterleavedSinglePlaneImagingExtractor(ImagingExtractor):
+    """
+    Specialized extractor for Hendricks2024 conversion project: reading one (channel, plane) of the ScanImage .tif
+    files through a Hendricks2024DeinterleavingTiffReader shared by all the channels and planes of the epoch.
+    """
+
+    extractor_name = "Hendricks2024DeinterleavedSinglePlaneImagingExtractor"
+    is_writable = True
+    mode = "folder"
+
+    def __init__(
+        self,
+        folder_path: FolderPathType,
+        channel_name: str,
+        plane_name: str,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
+        deinterleaving_reader: Optional[Hendricks2024DeinterleavingTiffReader] = None,
+    ) -> None:
+        super().__init__()
+        self.folder_path = Path(folder_path)
+        self.tiff_index = get_tiff_index(folder_path=self.folder_path, tiff_index=tiff_index)
+        self.deinterleaving_reader = deinterleaving_reader or Hendricks2024DeinterleavingTiffReader(
+            tiff_index=self.tiff_index
+        )
+        assert (
+            channel_name in self.deinterleaving_reader.channel_names
+        ), f"Channel '{channel_name}' not found in {self.deinterleaving_reader.channel_names}."
+        self.channel_name = channel_name
+        self.plane_name = plane_name
+        self._sampling_frequency = float(self.tiff_index.get_extra_metadata()["SI.hRoiManager.scanVolumeRate"])
+
+    @property
+    def _times(self) -> Optional[np.ndarray]:
+        # The timestamps of the frames are read from the .tif files when first requested, as the frames themselves
+        if self._timestamps is None:
+            self._timestamps = self.deinterleaving_reader.get_timestamps(
+                channel_name=self.channel_name, plane_name=self.plane_name
+            )
+        return self._timestamps
+
+    @_times.setter
+    def _times(self, times: Optional[np.ndarray]) -> None:
+        self._timestamps = times
+
+    def get_image_size(self) -> Tuple[int, int]:
+        return self.deinterleaving_reader.image_size
+
+    def get_num_frames(self) -> int:
+        return self.deinterleaving_reader.num_frames
+
+    def get_sampling_frequency(self) -> float:
+        return self._sampling_frequency
+
+    def get_channel_names(self) -> list:
+        return [self.channel_name]
+
+    def get_num_channels(self) -> int:
+        return 1
+
+    def get_dtype(self):
+        return self.deinterleaving_reader.dtype
+
+    def get_video(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0):
+        start_frame = start_frame if start_frame is not None else 0
+        end_frame = end_frame if end_frame is not None else self.get_num_frames()
+        return self.deinterleaving_reader.get_frames(
+            channel_name=self.channel_name, plane_name=self.plane_name, start_frame=start_frame, end_frame=end_frame
+        )
+
+
+class Hendricks2024WrappedImagingExtractor(ImagingExtractor):
+    """Base class of the wrappers that change how the frames of an imaging extractor are read."""
+
+    extractor_name = "Hendricks2024WrappedImagingExtractor"
+    is_writable = True
+    mode = "folder"
+
+    def __init__(self, imaging_extractor: ImagingExtractor) -> None:
+        super().__init__()
+        self._imaging_extractor = imaging_extractor
+        self._times = getattr(imaging_extractor, "_times", None)
+
+    def get_image_size(self) -> Tuple[int, int]:
+        return self._imaging_extractor.get_image_size()
+
+    def get_num_frames(self) -> int:
+        return self._imaging_extractor.get_num_frames()
+
+    def get_sampling_frequency(self) -> float:
+        return self._imaging_extractor.get_sampling_frequency()
+
+    def get_channel_names(self) -> list:
+        return self._imaging_extractor.get_channel_names()
+
+    def get_num_channels(self) -> int:
+        return self._imaging_extractor.get_num_channels()
+
+    def get_dtype(self):
+        return self._imaging_extractor.get_dtype()
+
+    def get_video(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0):
+        return self._imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame)
+
+
+def read_into_page_cache(frames: np.ndarray) -> np.ndarray:
+    """
+    Read the pages of the file behind memory-mapped frames into the page cache, without copying the frames.
+
+    One element per memory page is read, so the frames are returned as they are and their later copy (e.g. by the
+    writer) is served from memory. Frames that are already in memory are returned as they are.
+    """
+    if frames.size:
+        step = max(1, mmap.PAGESIZE // frames.dtype.itemsize)
+        np.add.reduce(frames.reshape(len(frames), -1)[:, ::step], axis=None)
+    return frames
+
+
+class Hendricks2024ImagingPrefetcher:
+    """
+    Reader threads that read ahead the frames of all the imaging series of an epoch, while a single writer writes the
+    series one after the other.
+
+    Each series has a reader thread that reads its frames in order, in blocks of `frames_per_block` frames, and puts
+    them in the bounded queue of the series, so that at most `prefetch_depth` blocks (plus the one being read) are
+    read ahead per series. All the series are read from the start of the write, so the reads of the next series
+    overlap with the compression and the write of the current one. The blocks are not copied: the frames that are
+    memory-mapped (see Hendricks2024DeinterleavingTiffReader) are only read into the page cache.
+    """
+
+    def __init__(
+        self,
+        imaging_extractors: Dict[str, ImagingExtractor],
+        frames_per_block: int = 100,
+        prefetch_depth: int = 2,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        imaging_extractors : dict
+            The extractor of each imaging series the frames are read from, by series name.
+        frames_per_block : int, default: 100
+            The number of frames read at once.
+        prefetch_depth : int, default: 2
+            The size of the queue of each series, which bounds the memory used by the frames read ahead.
+        """
+        self.imaging_extractors = dict(imaging_extractors)
+        self.frames_per_block = frames_per_block
+        self.prefetch_depth = prefetch_depth
+        self._queues = {series_name: queue.Queue(maxsize=max(1, prefetch_depth)) for series_name in imaging_extractors}
+        self._threads = dict()
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        """Start the reader thread of each series."""
+        for series_name in self.imaging_extractors:
+            if series_name not in self._threads:
+                self._threads[series_name] = threading.Thread(
+                    target=self._read_series,
+                    args=(series_name,),
+                    name=f"Hendricks2024Prefetch{series_name}",
+                    daemon=True,
+                )
+                self._threads[series_name].start()
+
+    def _put(self, series_name: str, item) -> bool:
+        """Put an item in the queue of a series once there is room for it, return False if stopped before."""
+        while not self._stop_event.is_set():
+            try:
+                self._queues[series_name].put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_series(self, series_name: str) -> None:
+        imaging_extractor = self.imaging_extractors[series_name]
+        num_frames = imaging_extractor.get_num_frames()
+        for block_index, start_frame in enumerate(range(0, num_frames, self.frames_per_block)):
+            end_frame = min(start_frame + self.frames_per_block, num_frames)
+            try:
+                frames = read_into_page_cache(imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame))
+            except Exception as exception:  # Raised by the writer when it gets to this block
+                self._put(series_name, (block_index, exception))
+                return
+            if not self._put(series_name, (block_index, frames)):
+                return
+        # The end of the series
+        self._put(series_name, None)
+
+    def get_next_block(self, series_name: str) -> Optional[Tuple[int, np.ndarray]]:
+        """
+        Return the next (block index, frames) read ahead of a series, or None once all its blocks were returned or
+        the readers are stopped (or not started).
+        """
+        block_queue = self._queues[series_name]
+        while True:
+            try:
+                item = block_queue.get(timeout=0.1)
+            except queue.Empty:
+                thread = self._threads.get(series_name)
+                if not self._stop_event.is_set() and thread is not None and thread.is_alive():
+                    continue
+                try:
+                    item = block_queue.get_nowait()
+                except queue.Empty:
+                    return None
+            if item is None:
+                return None
+            block_index, frames = item
+            if isinstance(frames, Exception):
+                raise frames
+            return block_index, frames
+
+    def stop(self) -> None:
+        """Stop the reader threads and release the frames read ahead."""
+        self._stop_event.set()
+        for thread in self._threads.values():
+            thread.join()
+        for block_queue in self._queues.values():
+            while not block_queue.empty():
+                block_queue.get_nowait()
+
+
+class Hendricks2024PrefetchingImagingExtractor(Hendricks2024WrappedImagingExtractor):
+    """
+    Wrapper of an imaging extractor whose frames are read ahead by a Hendricks2024ImagingPrefetcher.
+
+    The frames are requested in order by the writer: the blocks read ahead are taken from the queue of the series,
+    and the frames before the blocks read ahead (or after the readers are stopped) are read directly.
+    """
+
+    extractor_name = "Hendricks2024PrefetchingImagingExtractor"
+
+    def __init__(
+        self, imaging_extractor: ImagingExtractor, prefetcher: Hendricks2024ImagingPrefetcher, series_name: str
+    ) -> None:
+        """
+        Parameters
+        ----------
+        imaging_extractor : ImagingExtractor
+            The extractor the frames are read from, the one read ahead by the prefetcher for `series_name`.
+        prefetcher : Hendricks2024ImagingPrefetcher
+            The reader threads of all the imaging series of the epoch.
+        series_name : str
+            The name of the series in the prefetcher.
+        """
+        super().__init__(imaging_extractor=imaging_extractor)
+        self.prefetcher = prefetcher
+        self.series_name = series_name
+        self.frames_per_block = prefetcher.frames_per_block
+
+        self._blocks = dict()  # block index -> frames, the blocks taken from the queue that are still needed
+        self._next_block_index = 0  # The index of the next block in the queue
+        self._lock = threading.Lock()
+
+    def _read_block(self, block_index: int) -> np.ndarray:
+        start_frame = block_index * self.frames_per_block
+        end_frame = min(start_frame + self.frames_per_block, self.get_num_frames())
+        return self._imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame)
+
+    def _get_block(self, block_index: int) -> np.ndarray:
+        if block_index in self._blocks:
+            return self._blocks[block_index]
+        while self._next_block_index <= block_index:
+            next_block = self.prefetcher.get_next_block(series_name=self.series_name)
+            if next_block is None:
+                break
+            queued_block_index, frames = next_block
+            self._next_block_index = queued_block_index + 1
+            if queued_block_index == block_index:
+                self._blocks[block_index] = frames
+        if block_index in self._blocks:
+            return self._blocks[block_index]
+        # Requested before the blocks in the queue (e.g. to resume a series) or after the readers are stopped
+        return self._read_block(block_index)
+
+    def get_video(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0):
+        start_frame = start_frame if start_frame is not None else 0
+        end_frame = end_frame if end_frame is not None else self.get_num_frames()
+        if end_frame <= start_frame:
+            return np.empty((0, *self.get_image_size()), dtype=self.get_dtype())
+
+        first_block_index = start_frame // self.frames_per_block
+        last_block_index = (end_frame - 1) // self.frames_per_block
+        with self._lock:
+            blocks = [self._get_block(block_index) for block_index in range(first_block_index, last_block_index + 1)]
+            # The frames are written in order: only the last block can still be needed by the next request
+            for block_index in [block_index for block_index in self._blocks if block_index < last_block_index]:
+                del self._blocks[block_index]
+
+        offset = first_block_index * self.frames_per_block
+        # The frames of a single block are returned as a view of the block
+        frames = blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+        return frames[start_frame - offset : end_frame - offset]
+
+
+class Hendricks2024ProgressImagingExtractor(Hendricks2024WrappedImagingExtractor):
+    """
+    Wrapper of an imaging extractor that reports the first frame of each read.
+
+    The frames are written in order, so when the frames from `start_frame` are requested all the frames before it
+    have been handed to the writer.
+    """
+
+    extractor_name = "Hendricks2024ProgressImagingExtractor"
+
+    def __init__(self, imaging_extractor: ImagingExtractor, on_frames_requested: Callable[[int], None]) -> None:
+        """
+        Parameters
+        ----------
+        imaging_extractor : ImagingExtractor
+            The extractor the frames are read from.
+        on_frames_requested : callable
+            Called with the first frame of each read, before the frames are read.
+        """
+        super().__init__(imaging_extractor=imaging_extractor)
+        self.on_frames_requested = on_frames_requested
+
+    def get_video(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0):
+        self.on_frames_requested(start_frame if start_frame is not None else 0)
+        return self._imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame)
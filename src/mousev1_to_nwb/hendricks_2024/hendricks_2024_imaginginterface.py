@@ -1,18 +1,33 @@
 from dateutil.parser import parse as dateparse
 import datetime
+from typing import Literal, Optional
 from pathlib import Path
-from natsort import natsorted
+
+from pynwb import NWBFile
 
 from neuroconv.datainterfaces.ophys.baseimagingextractorinterface import BaseImagingExtractorInterface
+from neuroconv.tools.roiextractors import add_imaging
 from neuroconv.utils import FolderPathType
 from neuroconv.utils.dict import DeepDict
 
-from roiextractors.extractors.tiffimagingextractors.scanimagetiff_utils import extract_extra_metadata
-from roiextractors.extractors.tiffimagingextractors.scanimagetiffimagingextractor import (
-    ScanImageTiffSinglePlaneImagingExtractor,
+from hendricks_2024_imagingextractor import (
+    Hendricks2024SinglePlaneImagingExtractor,
+    Hendricks2024DeinterleavedSinglePlaneImagingExtractor,
+    Hendricks2024DeinterleavingTiffReader,
 )
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex, get_tiff_index
+
 
-from hendricks_2024_imagingextractor import Hendricks2024SinglePlaneImagingExtractor
+def get_session_start_time(image_metadata: dict) -> Optional[datetime.datetime]:
+    """Return the start time of the session from the ScanImage header of the first .tif file, if it is stored."""
+    if "state.internal.triggerTimeString" in image_metadata:
+        return dateparse(image_metadata["state.internal.triggerTimeString"])
+    if "epoch" in image_metadata:
+        # Versions of ScanImage at least as recent as 2020, and possibly earlier, store the start time under keyword
+        # `epoch`, as a string encoding of a Matlab array, example `'[2022  8  8 16 56 7.329]'`
+        # dateparse can't cope with this representation, so using strptime directly
+        return datetime.datetime.strptime(image_metadata["epoch"], "[%Y %m %d %H %M %S.%f]")
+    return None
 
 
 class Hendricks2024SinglePlaneImagingInterface(BaseImagingExtractorInterface):
@@ -23,44 +38,58 @@ class Hendricks2024SinglePlaneImagingInterface(BaseImagingExtractorInterface):
     Extractor = Hendricks2024SinglePlaneImagingExtractor
 
     @classmethod
-    def get_available_channels(cls, folder_path):
-        tif_file_paths = natsorted(folder_path.glob("*.tif"))
-        return ScanImageTiffSinglePlaneImagingExtractor.get_available_channels(file_path=tif_file_paths[0])
+    def get_available_channels(cls, folder_path, tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None):
+        return get_tiff_index(folder_path=folder_path, tiff_index=tiff_index).get_available_channels()
 
     @classmethod
-    def get_available_planes(cls, folder_path):
-        tif_file_paths = natsorted(folder_path.glob("*.tif"))
-        return ScanImageTiffSinglePlaneImagingExtractor.get_available_planes(file_path=tif_file_paths[0])
+    def get_available_planes(cls, folder_path, tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None):
+        return get_tiff_index(folder_path=folder_path, tiff_index=tiff_index).get_available_planes()
 
     def __init__(
         self,
         folder_path: FolderPathType,
         channel_name: str,
         plane_name: str,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
         verbose: bool = True,
     ):
+        """
+        Parameters
+        ----------
+        folder_path : FolderPathType
+            The folder path that contains the ScanImage TIF imaging output (.tif files).
+        channel_name : str
+            The name of the channel to load (e.g. "Channel 1").
+        plane_name : str
+            The name of the plane to load (e.g. "0").
+        tiff_index : Hendricks2024ScanImageTiffIndex, optional
+            The index of the .tif files in `folder_path`, shared between the interfaces of the same epoch.
+            If not provided, a new one is created.
+        verbose : bool, default: True
+        """
         self.channel_name = channel_name
         self.plane_name = plane_name
 
         self.folder_path = Path(folder_path)
-        tif_file_paths = natsorted(self.folder_path.glob("*.tif"))
-        assert tif_file_paths, f"The TIF image files are missing from '{self.folder_path}'."
-        self.image_metadata = extract_extra_metadata(file_path=tif_file_paths[0])
-        super().__init__(folder_path=folder_path, channel_name=channel_name, plane_name=plane_name, verbose=verbose)
+        self.tiff_index = get_tiff_index(folder_path=self.folder_path, tiff_index=tiff_index)
+        super().__init__(
+            folder_path=folder_path,
+            channel_name=channel_name,
+            plane_name=plane_name,
+            tiff_index=self.tiff_index,
+            verbose=verbose,
+        )
+
+    @property
+    def image_metadata(self) -> dict:
+        # The header of the first .tif file, read once by the shared index
+        return self.tiff_index.get_extra_metadata()
 
     def get_metadata(self) -> DeepDict:
         metadata = super().get_metadata()
 
-        if "state.internal.triggerTimeString" in self.image_metadata:
-            extracted_session_start_time = dateparse(self.image_metadata["state.internal.triggerTimeString"])
-            metadata["NWBFile"].update(session_start_time=extracted_session_start_time)
-        elif "epoch" in self.image_metadata:
-            # Versions of ScanImage at least as recent as 2020, and possibly earlier, store the start time under keyword
-            # `epoch`, as a string encoding of a Matlab array, example `'[2022  8  8 16 56 7.329]'`
-            # dateparse can't cope with this representation, so using strptime directly
-            extracted_session_start_time = datetime.datetime.strptime(
-                self.image_metadata["epoch"], "[%Y %m %d %H %M %S.%f]"
-            )
+        extracted_session_start_time = get_session_start_time(image_metadata=self.image_metadata)
+        if extracted_session_start_time is not None:
             metadata["NWBFile"].update(session_start_time=extracted_session_start_time)
 
         ophys_metadata = metadata["Ophys"]
@@ -120,3 +149,104 @@ class Hendricks2024SinglePlaneImagingInterface(BaseImagingExtractorInterface):
         )
 
         return metadata
+
+    def add_to_nwbfile(
+        self,
+        nwbfile: NWBFile,
+        metadata: Optional[dict] = None,
+        photon_series_type: Literal["TwoPhotonSeries", "OnePhotonSeries"] = "TwoPhotonSeries",
+        photon_series_index: int = 0,
+        parent_container: Literal["acquisition", "processing/ophys"] = "acquisition",
+        stub_test: bool = False,
+        stub_frames: int = 100,
+        buffer_gb: Optional[float] = None,
+        iterator_options: Optional[dict] = None,
+    ) -> None:
+        """
+        Add the TwoPhotonSeries to the NWB file, the frames are written iteratively with a bounded memory.
+
+        Parameters
+        ----------
+        nwbfile : NWBFile
+        metadata : dict, optional
+        photon_series_type : {"TwoPhotonSeries", "OnePhotonSeries"}, default: "TwoPhotonSeries"
+        photon_series_index : int, default: 0
+        parent_container : {"acquisition", "processing/ophys"}, default: "acquisition"
+        stub_test : bool, default: False
+        stub_frames : int, default: 100
+            The number of frames written for a stub test.
+        buffer_gb : float, optional
+            The maximum memory (in GB) used to buffer the frames written at once.
+            The chunking and the compression of the dataset are set with the backend configuration
+            (see `configure_imaging_datasets`).
+        iterator_options : dict, optional
+            The options of the ImagingExtractorDataChunkIterator, `buffer_gb` takes precedence over the one in there.
+        """
+        iterator_options = dict(iterator_options or dict())
+        if buffer_gb is not None:
+            iterator_options.update(buffer_gb=buffer_gb)
+
+        imaging_extractor = self.imaging_extractor
+        if stub_test:
+            stub_frames = min(stub_frames, imaging_extractor.get_num_frames())
+            imaging_extractor = imaging_extractor.frame_slice(start_frame=0, end_frame=stub_frames)
+        # The iterator options are not passed through by `BaseImagingExtractorInterface.add_to_nwbfile`
+        add_imaging(
+            imaging=imaging_extractor,
+            nwbfile=nwbfile,
+            metadata=metadata,
+            photon_series_type=photon_series_type,
+            photon_series_index=photon_series_index,
+            iterator_options=iterator_options,
+            parent_container=parent_container,
+        )
+
+
+class Hendricks2024DeinterleavedSinglePlaneImagingInterface(Hendricks2024SinglePlaneImagingInterface):
+    """
+    Data Interface for writing imaging data for the MouseV1 to NWB file using
+    Hendricks2024DeinterleavedSinglePlaneImagingExtractor, where the raw .tif files are read once for all the
+    channels and planes.
+    """
+
+    Extractor = Hendricks2024DeinterleavedSinglePlaneImagingExtractor
+
+    def __init__(
+        self,
+        folder_path: FolderPathType,
+        channel_name: str,
+        plane_name: str,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
+        deinterleaving_reader: Optional[Hendricks2024DeinterleavingTiffReader] = None,
+        verbose: bool = True,
+    ):
+        """
+        Parameters
+        ----------
+        folder_path : FolderPathType
+            The folder path that contains the ScanImage TIF imaging output (.tif files).
+        channel_name : str
+            The name of the channel to load (e.g. "Channel 1").
+        plane_name : str
+            The name of the plane to load (e.g. "0").
+        tiff_index : Hendricks2024ScanImageTiffIndex, optional
+            The index of the .tif files in `folder_path`, shared between the interfaces of the same epoch.
+            If not provided, a new one is created.
+        deinterleaving_reader : Hendricks2024DeinterleavingTiffReader, optional
+            The reader shared between the imaging interfaces of the same epoch. If not provided, a new one is created.
+        verbose : bool, default: True
+        """
+        self.channel_name = channel_name
+        self.plane_name = plane_name
+
+        self.folder_path = Path(folder_path)
+        self.tiff_index = get_tiff_index(folder_path=self.folder_path, tiff_index=tiff_index)
+        BaseImagingExtractorInterface.__init__(
+            self,
+            folder_path=folder_path,
+            channel_name=channel_name,
+            plane_name=plane_name,
+            tiff_index=self.tiff_index,
+            deinterleaving_reader=deinterleaving_reader,
+            verbose=verbose,
+        )
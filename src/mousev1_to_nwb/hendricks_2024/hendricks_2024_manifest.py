@@ -0,0 +1,372 @@
+"""Manifest of the conversion of one epoch, used to skip the unchanged epochs and to resume the interrupted ones."""
+
+import hashlib
+import json
+import os
+from importlib.metadata import version
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Literal, Optional
+
+import h5py
+import numpy as np
+from hdmf.backends.hdf5 import H5SpecWriter
+from hdmf.backends.hdf5.h5tools import SPEC_LOC_ATTR
+from hdmf.backends.utils import NamespaceToBuilderHelper
+from hdmf.data_utils import AbstractDataChunkIterator
+from pynwb import NWBHDF5IO, NWBFile, get_manager
+
+from neuroconv.tools.nwb_helpers import HDF5BackendConfiguration, configure_backend
+from neuroconv.tools.roiextractors.imagingextractordatachunkiterator import ImagingExtractorDataChunkIterator
+from neuroconv.utils import FilePathType, FolderPathType
+
+from hendricks_2024_stimulusfile import Hendricks2024StimulusGroup
+
+
+# Bump when a change of the conversion changes the NWB files written from the same inputs, so that they are rewritten
+CONVERTER_VERSION = "1"
+
+
+def _get_versions() -> bytes:
+    return f"{CONVERTER_VERSION}:{version('neuroconv')};".encode()
+
+
+def _update_with_file_content(hash_object, file_path: Path, block_size: int = 2**24) -> None:
+    with open(file_path, mode="rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            hash_object.update(block)
+
+
+def _update_with_file_stat(hash_object, file_path: Path, name: str) -> None:
+    stat = file_path.stat()
+    hash_object.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+
+
+def _update_with_stimulus_group(hash_object, stimulus_group: Hendricks2024StimulusGroup) -> None:
+    # Only the layout of the group is read, its content is covered by the size and modification time of the file
+    for key in sorted(stimulus_group):
+        item = stimulus_group[key]
+        hash_object.update(item.name.encode())
+        if isinstance(item, Hendricks2024StimulusGroup):
+            _update_with_stimulus_group(hash_object, item)
+        else:
+            hash_object.update(f"{item.shape}{item.dtype}".encode())
+
+
+def get_epoch_fingerprint(
+    imaging_file_paths: Iterable[FilePathType],
+    segmentation_folder_path: Optional[FolderPathType] = None,
+    stimulus_groups: Optional[Iterable[Hendricks2024StimulusGroup]] = None,
+    data_parameters: Optional[dict] = None,
+    metadata_file_paths: Optional[Iterable[FilePathType]] = None,
+    metadata_parameters: Optional[dict] = None,
+) -> Dict[str, str]:
+    """
+    Return the fingerprint of the inputs of the conversion of one epoch, split into the data and the metadata inputs.
+
+    Parameters
+    ----------
+    imaging_file_paths : iterable of FilePathType
+        The ScanImage .tif files of the epoch, fingerprinted from their name, size and modification time.
+    segmentation_folder_path : FolderPathType, optional
+        The folder with the Suite2P segmentation output, fingerprinted from the name, size and modification time of
+        its .npy files.
+    stimulus_groups : iterable of Hendricks2024StimulusGroup, optional
+        The groups of the stimulus file used by the epoch, fingerprinted from the name, size and modification time
+        of the file and from the names, shapes and dtypes of their datasets (the data itself is not read).
+    data_parameters : dict, optional
+        The conversion parameters that change the data written (must be serializable to JSON).
+    metadata_file_paths : iterable of FilePathType, optional
+        The metadata .yaml files, fingerprinted from their content.
+    metadata_parameters : dict, optional
+        The conversion parameters that only change the metadata written (must be serializable to JSON).
+
+    Returns
+    -------
+    dict
+        The hexadecimal SHA-256 digest of the "data" and of the "metadata" inputs, both including the version of the
+        conversion (CONVERTER_VERSION) and of neuroconv.
+    """
+    data_hash = hashlib.sha256(_get_versions())
+    for file_path in imaging_file_paths:
+        _update_with_file_stat(data_hash, Path(file_path), name=Path(file_path).name)
+    if segmentation_folder_path is not None:
+        segmentation_folder_path = Path(segmentation_folder_path)
+        for file_path in sorted(segmentation_folder_path.rglob("*.npy")):
+            _update_with_file_stat(data_hash, file_path, name=str(file_path.relative_to(segmentation_folder_path)))
+    for stimulus_group in stimulus_groups or []:
+        _update_with_file_stat(data_hash, stimulus_group.file_path, name=stimulus_group.file_path.name)
+        _update_with_stimulus_group(data_hash, stimulus_group)
+    data_hash.update(json.dumps(data_parameters or dict(), sort_keys=True, default=str).encode())
+
+    metadata_fingerprint = get_metadata_fingerprint(
+        metadata_file_paths=metadata_file_paths, metadata_parameters=metadata_parameters
+    )
+    return dict(data=data_hash.hexdigest(), metadata=metadata_fingerprint)
+
+
+def get_metadata_fingerprint(
+    metadata_file_paths: Optional[Iterable[FilePathType]] = None, metadata_parameters: Optional[dict] = None
+) -> str:
+    """Return the "metadata" part of the fingerprint of `get_epoch_fingerprint`, without reading the data inputs."""
+    metadata_hash = hashlib.sha256(_get_versions())
+    for file_path in metadata_file_paths or []:
+        metadata_hash.update(Path(file_path).name.encode())
+        _update_with_file_content(metadata_hash, Path(file_path))
+    metadata_hash.update(json.dumps(metadata_parameters or dict(), sort_keys=True, default=str).encode())
+    return metadata_hash.hexdigest()
+
+
+class Hendricks2024ConversionManifest:
+    """
+    Manifest of the conversion of one epoch, saved next to the NWB file (e.g. "w57-1-2024223-7expt.nwb.manifest.json").
+
+    The manifest records the fingerprint of the data and of the metadata inputs, the interfaces already written to the
+    file and the number of frames of each imaging series written so far. The imaging series are written last, so when
+    the first frames of an imaging series are written all the other interfaces are already in the file.
+    """
+
+    manifest_file_suffix = ".manifest.json"
+
+    def __init__(self, nwbfile_path: FilePathType):
+        """
+        Parameters
+        ----------
+        nwbfile_path : FilePathType
+            The path to the NWB file of the epoch.
+        """
+        self.nwbfile_path = Path(nwbfile_path)
+        self.manifest_file_path = self.nwbfile_path.with_name(self.nwbfile_path.name + self.manifest_file_suffix)
+        # Flushes the NWB file, so that the frames recorded in the manifest are on disk
+        self.flush_output = None
+        self.content = self._load()
+
+    def _load(self) -> dict:
+        if not self.manifest_file_path.is_file():
+            return dict()
+        try:
+            with open(self.manifest_file_path, mode="r") as file:
+                return json.load(file)
+        except json.JSONDecodeError:
+            print(f"Warning: the manifest '{self.manifest_file_path}' is corrupted and will be ignored.")
+            return dict()
+
+    def save(self) -> None:
+        # The manifest is replaced atomically, so that it is never left half-written
+        temporary_file_path = self.manifest_file_path.with_name(self.manifest_file_path.name + ".tmp")
+        with open(temporary_file_path, mode="w") as file:
+            json.dump(self.content, file, indent=4)
+        os.replace(temporary_file_path, self.manifest_file_path)
+
+    def start(
+        self, input_fingerprint: Dict[str, str], interface_names: List[str], imaging_interface_names: List[str]
+    ) -> None:
+        """Start a new conversion of the epoch, which discards the progress of the previous one."""
+        self.content = dict(
+            input_fingerprint=input_fingerprint,
+            status="started",
+            interface_names=list(interface_names),
+            completed_interfaces=[],
+            imaging_series={interface_name: dict(frames_written=0) for interface_name in imaging_interface_names},
+        )
+        self.save()
+
+    def is_completed(self, input_fingerprint: Dict[str, str]) -> bool:
+        """Whether the NWB file was fully written from the same inputs."""
+        return (
+            self.content.get("status") == "completed"
+            and self.content.get("input_fingerprint") == input_fingerprint
+            and self.nwbfile_path.exists()
+        )
+
+    def can_resume(self, input_fingerprint: Dict[str, str]) -> bool:
+        """Whether the NWB file was interrupted while writing the imaging series of the same inputs."""
+        return (
+            self.content.get("status") == "writing_imaging"
+            and self.content.get("input_fingerprint") == input_fingerprint
+            and self.nwbfile_path.is_file()
+        )
+
+    def needs_metadata_patch(self, input_fingerprint: Dict[str, str]) -> bool:
+        """Whether the NWB file was fully written from the same data, but only its metadata inputs have changed."""
+        previous_input_fingerprint = self.content.get("input_fingerprint") or dict()
+        return (
+            self.content.get("status") == "completed"
+            and previous_input_fingerprint.get("data") == input_fingerprint["data"]
+            and previous_input_fingerprint.get("metadata") != input_fingerprint["metadata"]
+            and self.nwbfile_path.exists()
+        )
+
+    def get_conversion_step(
+        self, input_fingerprint: Dict[str, str], backend: Literal["hdf5", "zarr"] = "hdf5"
+    ) -> Literal["skip", "patch_metadata", "resume", "write"]:
+        """
+        Return how to bring the NWB file up to date with the inputs of `input_fingerprint`.
+
+        The NWB file is skipped if it was fully written from the same inputs, its metadata is patched in place if only
+        the metadata inputs have changed, its imaging series are resumed if it was interrupted while writing them, and
+        it is written from scratch otherwise. Only HDF5 files are patched and resumed in place.
+        """
+        if self.is_completed(input_fingerprint=input_fingerprint):
+            return "skip"
+        if backend == "hdf5" and self.needs_metadata_patch(input_fingerprint=input_fingerprint):
+            return "patch_metadata"
+        if backend == "hdf5" and self.can_resume(input_fingerprint=input_fingerprint):
+            return "resume"
+        return "write"
+
+    def record_metadata_patch(self, metadata_fingerprint: str) -> None:
+        """Record that the metadata of the completed NWB file was patched, from the inputs of `metadata_fingerprint`."""
+        input_fingerprint = self.content.get("input_fingerprint")
+        if self.content.get("status") != "completed" or input_fingerprint is None:
+            return
+        input_fingerprint.update(metadata=metadata_fingerprint)
+        self.save()
+
+    def get_frames_written(self, interface_name: str) -> int:
+        return self.content["imaging_series"][interface_name]["frames_written"]
+
+    def record_imaging_progress(self, interface_name: str, frames_written: int) -> None:
+        """Record that the first `frames_written` frames of the imaging series of an interface are in the file."""
+        if self.flush_output is not None:
+            self.flush_output()
+        if self.content["status"] != "writing_imaging":
+            # The imaging series are written after all the other interfaces
+            self.content["status"] = "writing_imaging"
+            self.content["completed_interfaces"] = [
+                name for name in self.content["interface_names"] if name not in self.content["imaging_series"]
+            ]
+        imaging_series = self.content["imaging_series"][interface_name]
+        imaging_series["frames_written"] = max(imaging_series["frames_written"], int(frames_written))
+        self.save()
+
+    def get_progress_callback(self, interface_name: str) -> Callable[[int], None]:
+        """Return the callback that records the progress of the imaging series of an interface."""
+
+        def on_frames_requested(start_frame: int) -> None:
+            self.record_imaging_progress(interface_name=interface_name, frames_written=start_frame)
+
+        return on_frames_requested
+
+    def mark_completed(self, input_fingerprint: Optional[Dict[str, str]] = None) -> None:
+        """Record that the NWB file is complete, written (or patched) from `input_fingerprint` if given."""
+        self.content.update(status="completed", completed_interfaces=list(self.content.get("interface_names", [])))
+        if input_fingerprint is not None:
+            self.content.update(input_fingerprint=input_fingerprint)
+        self.save()
+
+
+def _read_data_chunk_iterator(data_iterator: AbstractDataChunkIterator) -> np.ndarray:
+    assert None not in data_iterator.maxshape, "The shape of the data iterator is not known in advance."
+    data = np.empty(shape=data_iterator.maxshape, dtype=data_iterator.dtype)
+    for data_chunk in data_iterator:
+        data[data_chunk.selection] = data_chunk.data
+    return data
+
+
+def write_nwbfile_with_manifest(
+    nwbfile: NWBFile,
+    nwbfile_path: FilePathType,
+    backend_configuration: HDF5BackendConfiguration,
+    manifest: Hendricks2024ConversionManifest,
+) -> None:
+    """
+    Write an in-memory NWB file to HDF5, recording the progress of the imaging series in the manifest.
+
+    The other data iterators (e.g. the Suite2p traces) are read into memory first, so that the imaging series are
+    the only datasets written once all the other objects are in the file. Otherwise the data iterators would be written
+    together (one chunk of each in turn) and the other datasets could still be incomplete when the progress of the
+    imaging series is recorded. The file is flushed each time the progress is recorded.
+    """
+    for neurodata_object in nwbfile.objects.values():
+        for field_name, field_value in neurodata_object.fields.items():
+            if isinstance(field_value, AbstractDataChunkIterator) and not isinstance(
+                field_value, ImagingExtractorDataChunkIterator
+            ):
+                neurodata_object.fields[field_name] = _read_data_chunk_iterator(data_iterator=field_value)
+    configure_backend(nwbfile=nwbfile, backend_configuration=backend_configuration)
+    with NWBHDF5IO(path=str(nwbfile_path), mode="w") as io:
+        manifest.flush_output = io._file.flush
+        try:
+            io.write(nwbfile, exhaust_dci=False)
+        finally:
+            manifest.flush_output = None
+
+
+def write_spec_cache(file: h5py.File) -> None:
+    """
+    Cache the specification of the namespaces in an NWB file, as done by `NWBHDF5IO.write` once the whole file is
+    written (so an interrupted file has none).
+    """
+    spec_location = file.attrs.get(SPEC_LOC_ATTR)
+    spec_group = file[spec_location] if spec_location is not None else file.require_group("specifications")
+    file.attrs[SPEC_LOC_ATTR] = spec_group.ref
+    namespace_catalog = get_manager().namespace_catalog
+    for namespace_name in namespace_catalog.namespaces:
+        namespace = namespace_catalog.get_namespace(namespace_name)
+        group_name = f"{namespace_name}/{namespace.version}"
+        if group_name in spec_group:
+            continue
+        namespace_builder = NamespaceToBuilderHelper.convert_namespace(namespace_catalog, namespace_name)
+        namespace_builder.export("namespace", writer=H5SpecWriter(spec_group.create_group(group_name)))
+
+
+def resume_imaging_series(
+    nwbfile_path: FilePathType,
+    imaging_extractors: Dict[str, object],
+    photon_series_names: Dict[str, str],
+    manifest: Hendricks2024ConversionManifest,
+    frames_per_write: int = 100,
+) -> bool:
+    """
+    Write the frames of the imaging series that are missing from an interrupted NWB file, then cache the specification
+    of its namespaces.
+
+    Parameters
+    ----------
+    nwbfile_path : FilePathType
+        The path to the interrupted NWB file.
+    imaging_extractors : dict
+        The imaging extractor of each imaging interface (sliced to the written frames for a stub test), by interface
+        name.
+    photon_series_names : dict
+        The name of the TwoPhotonSeries of each imaging interface, by interface name.
+    manifest : Hendricks2024ConversionManifest
+        The manifest of the interrupted conversion.
+    frames_per_write : int, default: 100
+        The number of frames read and written at once.
+
+    Returns
+    -------
+    bool
+        Whether the imaging series could be completed. If not, the epoch has to be converted again from scratch.
+    """
+    try:
+        file = h5py.File(nwbfile_path, mode="r+")
+    except OSError:  # The file was not closed properly and can not be opened anymore
+        return False
+
+    with file:
+        for interface_name, imaging_extractor in imaging_extractors.items():
+            dataset_path = f"acquisition/{photon_series_names[interface_name]}/data"
+            if dataset_path not in file:
+                return False
+            dataset = file[dataset_path]
+            # The frames are read and laid out as written by the imaging data chunk iterator of neuroconv, the dataset
+            # was created with the full shape of the imaging series
+            data_iterator = ImagingExtractorDataChunkIterator(imaging_extractor=imaging_extractor)
+            if dataset.shape != data_iterator.maxshape:
+                print(
+                    f"Warning: the shape {dataset.shape} of '{dataset_path}' does not match the shape "
+                    f"{data_iterator.maxshape} of the imaging series, it can not be resumed."
+                )
+                return False
+            num_frames = data_iterator.maxshape[0]
+            frames_written = manifest.get_frames_written(interface_name=interface_name)
+            for start_frame in range(frames_written, num_frames, frames_per_write):
+                end_frame = min(start_frame + frames_per_write, num_frames)
+                selection = (slice(start_frame, end_frame), *(slice(None),) * (len(dataset.shape) - 1))
+                dataset[start_frame:end_frame] = data_iterator._get_data(selection=selection)
+                file.flush()
+                manifest.record_imaging_progress(interface_name=interface_name, frames_written=end_frame)
+        write_spec_cache(file=file)
+    return True
@@ -0,0 +1,90 @@
+from typing import Optional
+
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex
+
+# The share of the memory budget given to each of the buffers of the conversion, the rest is left to the stimulus
+# tables and the Python objects of the conversion
+IMAGING_BUFFER_SHARE = 0.5
+PREFETCH_BUFFER_SHARE = 0.25
+DEINTERLEAVING_BUFFER_SHARE = 0.1
+SEGMENTATION_BUFFER_SHARE = 0.1
+STIMULUS_BUFFER_SHARE = 0.05
+
+
+def get_frame_size_in_bytes(tiff_index: Hendricks2024ScanImageTiffIndex) -> int:
+    """Return the size in bytes of one frame (one page) of the .tif files, read from the ScanImage header."""
+    extra_metadata = tiff_index.get_extra_metadata()
+    num_rows = int(extra_metadata["SI.hRoiManager.linesPerFrame"])
+    num_columns = int(extra_metadata["SI.hRoiManager.pixelsPerLine"])
+    # ScanImage saves the frames as int16
+    return num_rows * num_columns * 2
+
+
+def get_memory_budget_options(
+    memory_budget_gb: float,
+    frame_size_in_bytes: int,
+    num_imaging_series: int,
+    pipeline_imaging: bool = False,
+    deinterleave_imaging: bool = False,
+    prefetch_depth: int = 2,
+) -> dict:
+    """
+    Split a memory budget between the buffers through which the data of an epoch is streamed.
+
+    The imaging frames, the Suite2p traces and the stimulus onsets are written in blocks sized from the budget, so
+    that the peak memory of the conversion does not grow with the length of the epoch.
+
+    Parameters
+    ----------
+    memory_budget_gb : float
+        The memory (in GB) that the buffers of the conversion can use at once.
+    frame_size_in_bytes : int
+        The size of one frame of an imaging series, see `get_frame_size_in_bytes`.
+    num_imaging_series : int
+        The number of imaging series (channels times planes) of the epoch.
+    pipeline_imaging : bool, default: False
+        Whether the frames are read ahead while the previous ones are written, in which case a share of the budget is
+        set aside for the frames read ahead of all the imaging series.
+    deinterleave_imaging : bool, default: False
+        Whether the .tif files are de-interleaved, in which case a share of the budget is set aside for the pages read
+        at once.
+    prefetch_depth : int, default: 2
+        The number of blocks of frames queued ahead for each imaging series.
+
+    Returns
+    -------
+    dict
+        The options of the conversion: "imaging_buffer_gb", "prefetch_frames_per_block",
+        "deinterleaving_pages_per_read", "segmentation_buffer_gb" and "stimulus_buffer_gb".
+    """
+    if memory_budget_gb <= 0:
+        raise ValueError(f"The memory budget must be positive, got {memory_budget_gb} GB.")
+    budget_in_bytes = memory_budget_gb * 1e9
+    imaging_share, prefetch_share, deinterleaving_share = IMAGING_BUFFER_SHARE, 0.0, 0.0
+    # The shares of the buffers that are not used are given to the imaging write buffer
+    if pipeline_imaging:
+        prefetch_share = PREFETCH_BUFFER_SHARE
+    else:
+        imaging_share += PREFETCH_BUFFER_SHARE
+    if deinterleave_imaging:
+        deinterleaving_share = DEINTERLEAVING_BUFFER_SHARE
+    else:
+        imaging_share += DEINTERLEAVING_BUFFER_SHARE
+
+    # The imaging buffer must hold at least one frame, the frames are written one series at a time
+    imaging_buffer_gb = max(imaging_share * memory_budget_gb, frame_size_in_bytes / 1e9)
+    # The frames of all the imaging series are read ahead at once, `prefetch_depth` blocks in the queue of each series
+    # and the block being read
+    blocks_per_series = max(1, prefetch_depth) + 1
+    prefetch_frames_per_block = int(
+        prefetch_share * budget_in_bytes / (frame_size_in_bytes * max(1, num_imaging_series) * blocks_per_series)
+    )
+    deinterleaving_pages_per_read = int(deinterleaving_share * budget_in_bytes / frame_size_in_bytes)
+
+    return dict(
+        imaging_buffer_gb=imaging_buffer_gb,
+        prefetch_frames_per_block=max(1, prefetch_frames_per_block),
+        deinterleaving_pages_per_read=max(1, deinterleaving_pages_per_read),
+        segmentation_buffer_gb=SEGMENTATION_BUFFER_SHARE * memory_budget_gb,
+        stimulus_buffer_gb=STIMULUS_BUFFER_SHARE * memory_budget_gb,
+    )
@@ -0,0 +1,158 @@
+"""Rewrite the metadata of an existing NWB file in place, without rewriting its data."""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import h5py
+import numpy as np
+
+from neuroconv.utils import FilePathType
+
+# The NWBFile fields that identify the file or that the timestamps are relative to, which are never patched
+NWBFILE_FIELDS_NOT_PATCHED = ("identifier", "session_start_time", "timestamps_reference_time", "file_create_date")
+# The NWBFile fields stored at the root of the file, the other ones are stored in the "general" group
+NWBFILE_ROOT_FIELDS = ("session_description",)
+
+
+def _to_hdf5_data(value):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    if isinstance(value, str):
+        return np.array(value, dtype=h5py.string_dtype())
+    if isinstance(value, (list, tuple)) and all(isinstance(element, str) for element in value):
+        return np.array(value, dtype=h5py.string_dtype())
+    return np.asarray(value)
+
+
+def _is_equal(stored_value, value) -> bool:
+    if isinstance(stored_value, bytes):
+        stored_value = stored_value.decode()
+    if isinstance(stored_value, np.ndarray) and stored_value.dtype.kind == "O":
+        stored_value = [element.decode() if isinstance(element, bytes) else element for element in stored_value]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return np.array_equal(np.asarray(stored_value), np.asarray(value))
+
+
+def set_field(group: h5py.Group, field_name: str, value) -> bool:
+    """
+    Set the value of a field of an NWB object, stored either as an attribute or as a dataset of its group.
+
+    Parameters
+    ----------
+    group : h5py.Group
+        The group of the NWB object.
+    field_name : str
+        The name of the field.
+    value
+        The new value of the field. Fields set to None are left untouched. A field that is not in the file yet is
+        added as a dataset (e.g. the optional fields of the Subject).
+
+    Returns
+    -------
+    bool
+        Whether the value of the field was changed.
+    """
+    if value is None:
+        return False
+    if field_name in group.attrs:
+        if _is_equal(group.attrs[field_name], value):
+            return False
+        group.attrs[field_name] = _to_hdf5_data(value)
+        return True
+    if field_name in group:
+        dataset = group[field_name]
+        if not isinstance(dataset, h5py.Dataset) or _is_equal(dataset[()], value):
+            return False
+        # A scalar or string dataset can change shape or length, so it is replaced (with its attributes)
+        attributes = dict(dataset.attrs)
+        del group[field_name]
+        dataset = group.create_dataset(field_name, data=_to_hdf5_data(value))
+        dataset.attrs.update(attributes)
+        return True
+    group.create_dataset(field_name, data=_to_hdf5_data(value))
+    return True
+
+
+def _patch_object_fields(
+    parent_group: Optional[h5py.Group], object_metadata: dict, fields_not_patched: Tuple[str, ...] = ("name",)
+) -> List[str]:
+    """Patch the fields of the NWB object `object_metadata["name"]` of `parent_group` that are already in the file."""
+    object_name = object_metadata["name"]
+    if parent_group is None or object_name not in parent_group:
+        print(f"Warning: '{object_name}' is not in the NWB file and is not patched.")
+        return []
+    object_group = parent_group[object_name]
+    patched_fields = []
+    for field_name, value in object_metadata.items():
+        if field_name in fields_not_patched or value is None:
+            continue
+        if field_name not in object_group.attrs and field_name not in object_group:
+            # The fields of the NWB object are fixed by its type, a field missing from the file can not be added
+            print(f"Warning: '{object_group.name}' has no field '{field_name}', it is not patched.")
+            continue
+        if set_field(group=object_group, field_name=field_name, value=value):
+            patched_fields.append(f"{object_group.name}/{field_name}")
+    return patched_fields
+
+
+def patch_nwbfile_metadata(nwbfile_path: FilePathType, metadata: dict) -> List[str]:
+    """
+    Rewrite in place the metadata of an existing NWB file (HDF5 backend).
+
+    The NWBFile fields, the Subject, the devices (the imaging device and the optogenetic devices), the optogenetic
+    stimulus sites and the lab metadata (e.g. TemporalFocusing) are rewritten. The datasets of the acquisition and
+    processing modules (e.g. the imaging data) are not read or rewritten.
+
+    Parameters
+    ----------
+    nwbfile_path : FilePathType
+        The path to the NWB file.
+    metadata : dict
+        The metadata of the conversion, as passed to `run_conversion`.
+
+    Returns
+    -------
+    list of str
+        The location in the file of the fields that were changed.
+    """
+    patched_fields = []
+    with h5py.File(nwbfile_path, mode="r+") as file:
+        general_group = file.require_group("general")
+        for field_name, value in metadata.get("NWBFile", dict()).items():
+            if field_name in NWBFILE_FIELDS_NOT_PATCHED:
+                continue
+            group = file if field_name in NWBFILE_ROOT_FIELDS else general_group
+            if set_field(group=group, field_name=field_name, value=value):
+                patched_fields.append(f"{group.name.rstrip('/')}/{field_name}")
+
+        if "Subject" in metadata:
+            if "subject" not in general_group:
+                print(f"Warning: '{nwbfile_path}' has no Subject, the Subject metadata is not patched.")
+            else:
+                subject_group = general_group["subject"]
+                for field_name, value in metadata["Subject"].items():
+                    if set_field(group=subject_group, field_name=field_name, value=value):
+                        patched_fields.append(f"{subject_group.name}/{field_name}")
+
+        ophys_metadata = metadata.get("Ophys", dict())
+        devices_group = general_group.get("devices")
+        device_metadata_list = list(ophys_metadata.get("Device", []))
+        device_metadata_list += list(ophys_metadata.get("OptogeneticDevice", dict()).values())
+        for device_metadata in device_metadata_list:
+            patched_fields += _patch_object_fields(parent_group=devices_group, object_metadata=device_metadata)
+
+        # The links of the stimulus sites to their devices are left as they are
+        optogenetics_group = general_group.get("optogenetics")
+        for stimulus_site_metadata in ophys_metadata.get("OptogeneticStimulusSite", []):
+            patched_fields += _patch_object_fields(
+                parent_group=optogenetics_group,
+                object_metadata=stimulus_site_metadata,
+                fields_not_patched=("name", "device", "spatial_light_modulator", "light_source"),
+            )
+
+        # The lab metadata are stored directly in the "general" group
+        for lab_meta_data_metadata in metadata.get("LabMetaData", dict()).values():
+            patched_fields += _patch_object_fields(parent_group=general_group, object_metadata=lab_meta_data_metadata)
+
+    return patched_fields
@@ -1,18 +1,38 @@
 """Primary NWBConverter class for this dataset."""
 
-from typing import Optional
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Callable, Literal, Optional, Type, List
 
-from neuroconv import NWBConverter
+from neuroconv import NWBConverter, BaseDataInterface
 from neuroconv.utils import FolderPathType, FilePathType, DeepDict
+from pynwb import NWBFile
 
-from hendricks_2024_imaginginterface import Hendricks2024SinglePlaneImagingInterface
+from hendricks_2024_imaginginterface import (
+    Hendricks2024SinglePlaneImagingInterface,
+    Hendricks2024DeinterleavedSinglePlaneImagingInterface,
+)
+from hendricks_2024_imagingextractor import (
+    Hendricks2024DeinterleavingTiffReader,
+    Hendricks2024ImagingPrefetcher,
+    Hendricks2024PrefetchingImagingExtractor,
+    Hendricks2024ProgressImagingExtractor,
+)
 from hendricks_2024_segmentationinterface import Hendricks2024SegmentationInterface
 from hendricks_2024_holostiminterface import Hendricks2024HolographicStimulationInterface
 from hendricks_2024_visualstimulusinterface import Hendricks2024VisualStimuliInterface
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex, get_tiff_index
+from hendricks_2024_stimulusfile import Hendricks2024StimulusFile
+from hendricks_2024_segmentationextractor import Hendricks2024Suite2pSessionStore, get_suite2p_store
+from hendricks_2024_manifest import Hendricks2024ConversionManifest
+from hendricks_2024_profiling import Hendricks2024ConversionProfiler, Hendricks2024ProfiledImagingExtractor
 
 
 def get_default_segmentation_to_imaging_name_mapping(
-    imaging_folder_path: FolderPathType, segmentation_folder_path: FolderPathType
+    imaging_folder_path: FolderPathType,
+    segmentation_folder_path: FolderPathType,
+    tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
+    suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
 ) -> dict or None:
     """
     Get the default mapping between imaging and segmentation planes.
@@ -23,20 +43,27 @@ def get_default_segmentation_to_imaging_name_mapping(
         The folder path that contains the ScanImage TIF imaging output (.tif files).
     segmentation_folder_path: FolderPathType
         The folder that contains the Suite2P segmentation output. (usually named "suite2p")
+    tiff_index: Hendricks2024ScanImageTiffIndex, optional
+        The index of the .tif files in `imaging_folder_path`. If not provided, a new one is created.
+    suite2p_store: Hendricks2024Suite2pSessionStore, optional
+        The store of the Suite2p output in `segmentation_folder_path`. If not provided, a new one is created.
     """
+    # The Suite2p folders are listed first, the .tif header is only read if a mapping is needed
+    suite2p_store = get_suite2p_store(folder_path=segmentation_folder_path, suite2p_store=suite2p_store)
+    s2p_available_channels = suite2p_store.get_available_channels()
+    s2p_available_planes = suite2p_store.get_available_planes()
+
+    if len(s2p_available_channels) == 1 and len(s2p_available_planes) == 1:
+        return None
+
+    tiff_index = get_tiff_index(folder_path=imaging_folder_path, tiff_index=tiff_index)
     si_available_channels = Hendricks2024SinglePlaneImagingInterface.get_available_channels(
-        folder_path=imaging_folder_path
+        folder_path=imaging_folder_path, tiff_index=tiff_index
     )
     si_available_channels = [channel_name.replace(" ", "") for channel_name in si_available_channels]
-    si_available_planes = Hendricks2024SinglePlaneImagingInterface.get_available_planes(folder_path=imaging_folder_path)
-
-    s2p_available_channels = Hendricks2024SegmentationInterface.get_available_channels(
-        folder_path=segmentation_folder_path
+    si_available_planes = Hendricks2024SinglePlaneImagingInterface.get_available_planes(
+        folder_path=imaging_folder_path, tiff_index=tiff_index
     )
-    s2p_available_planes = Hendricks2024SegmentationInterface.get_available_planes(folder_path=segmentation_folder_path)
-
-    if len(s2p_available_channels) == 1 and len(s2p_available_planes) == 1:
-        return None
 
     segmentation_channel_plane_names = [
         f"{channel_name.capitalize()}{plane_name.capitalize()}"
@@ -58,6 +85,92 @@ def get_default_segmentation_to_imaging_name_mapping(
     return segmentation_to_imaging_name_mapping
 
 
+class LazyDataInterfaceDict(MutableMapping):
+    """
+    Mapping of interface names to data interfaces, where each interface is constructed only once,
+    the first time it is accessed.
+
+    The interfaces can also be registered by a provider, which is only called the first time the names of the
+    interfaces are needed (e.g. when they depend on the channels and planes found in the source data).
+    The interfaces keep the order in which they (or their providers) were added.
+    """
+
+    def __init__(self, profiler: Optional[Hendricks2024ConversionProfiler] = None):
+        # When a profiler is given, the construction and the methods of each interface are measured
+        self.profiler = profiler
+        self._interface_classes_and_source_data = dict()
+        self._data_interface_objects = dict()
+        self._pending_registrations = []
+        self._is_resolving = False
+
+    def _resolve_registrations(self) -> None:
+        if self._is_resolving:
+            return
+        self._is_resolving = True
+        try:
+            while self._pending_registrations:
+                register = self._pending_registrations.pop(0)
+                register()
+        finally:
+            self._is_resolving = False
+
+    def add_interface_provider(self, provider: Callable[[], None]) -> None:
+        """Register a provider, which registers its interfaces with `add_interface` when it is called."""
+        self._pending_registrations.append(provider)
+
+    def add_interface(self, interface_name: str, interface_class: Type[BaseDataInterface], source_data: dict) -> None:
+        """Register an interface, which is constructed with `interface_class(**source_data)` on first access."""
+        if self._pending_registrations and not self._is_resolving:
+            # Registered after the interfaces of the providers added before it
+            self._pending_registrations.append(lambda: self.add_interface(interface_name, interface_class, source_data))
+            return
+        self._interface_classes_and_source_data[interface_name] = (interface_class, source_data)
+        self._data_interface_objects.pop(interface_name, None)
+
+    def get_interface_class_and_source_data(self, interface_name: str) -> tuple:
+        self._resolve_registrations()
+        return self._interface_classes_and_source_data[interface_name]
+
+    def is_constructed(self, interface_name: str) -> bool:
+        return interface_name in self._data_interface_objects
+
+    def __getitem__(self, interface_name: str) -> BaseDataInterface:
+        if interface_name not in self._data_interface_objects:
+            self._resolve_registrations()
+            interface_class, source_data = self._interface_classes_and_source_data[interface_name]
+            if self.profiler is None:
+                self._data_interface_objects[interface_name] = interface_class(**source_data)
+            else:
+                with self.profiler.phase(f"{interface_name}.__init__"):
+                    data_interface = interface_class(**source_data)
+                self.profiler.instrument_interface(interface_name=interface_name, interface=data_interface)
+                self._data_interface_objects[interface_name] = data_interface
+        return self._data_interface_objects[interface_name]
+
+    def __setitem__(self, interface_name: str, data_interface: BaseDataInterface) -> None:
+        self._resolve_registrations()
+        self._interface_classes_and_source_data[interface_name] = (type(data_interface), data_interface.source_data)
+        self._data_interface_objects[interface_name] = data_interface
+
+    def __delitem__(self, interface_name: str) -> None:
+        self._resolve_registrations()
+        del self._interface_classes_and_source_data[interface_name]
+        self._data_interface_objects.pop(interface_name, None)
+
+    def __contains__(self, interface_name: object) -> bool:
+        # Membership does not require the interface to be constructed
+        self._resolve_registrations()
+        return interface_name in self._interface_classes_and_source_data
+
+    def __iter__(self):
+        self._resolve_registrations()
+        return iter(self._interface_classes_and_source_data)
+
+    def __len__(self) -> int:
+        self._resolve_registrations()
+        return len(self._interface_classes_and_source_data)
+
+
 class Hendricks2024NWBConverter(NWBConverter):
     """Primary conversion class for Hendricks2024 dataset."""
 
@@ -72,73 +185,73 @@ class Hendricks2024NWBConverter(NWBConverter):
         epoch_name: Optional[str] = None,
         visual_stimulus_file_path: Optional[FilePathType] = None,
         visual_stimulus_type: Optional[str] = None,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
+        deinterleave_imaging: bool = False,
+        deinterleaving_buffer_folder_path: Optional[FolderPathType] = None,
+        deinterleaving_pages_per_read: int = 600,
+        stimulus_files: Optional[List[Hendricks2024StimulusFile]] = None,
+        suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
+        holographic_target_matching: Optional[Literal["verify", "recompute"]] = None,
+        pipeline_imaging: bool = False,
+        prefetch_frames_per_block: int = 100,
+        prefetch_depth: int = 2,
+        profiler: Optional[Hendricks2024ConversionProfiler] = None,
         verbose: bool = True,
     ):
         self.verbose = verbose
-        self.data_interface_objects = dict()
+        # In pipelined mode the frames of all the imaging series are read ahead by one reader thread per series while
+        # the series are written one after the other, at most `prefetch_depth` blocks of frames ahead per series
+        self.pipeline_imaging = pipeline_imaging
+        self.prefetch_frames_per_block = prefetch_frames_per_block
+        self.prefetch_depth = prefetch_depth
+        self._imaging_prefetcher = None
+        # When a manifest is set, the number of frames written of each imaging series is recorded in it
+        self.manifest: Optional[Hendricks2024ConversionManifest] = None
+        self.profiler = profiler
+        # Each interface is constructed once, and only when the conversion needs it
+        self.data_interface_objects = LazyDataInterfaceDict(profiler=profiler)
 
         self.plane_map = segmentation_to_imaging_map
 
-        self.available_channels = Hendricks2024SinglePlaneImagingInterface.get_available_channels(
-            folder_path=imaging_folder_path
-        )
-        self.available_planes = Hendricks2024SinglePlaneImagingInterface.get_available_planes(
-            folder_path=imaging_folder_path
-        )
-        for channel_name in self.available_channels:
-            for plane_name in self.available_planes:
-                channel_name_without_space = channel_name.replace(" ", "")
-                imaging_interface_name = f"Imaging{channel_name_without_space}Plane{plane_name}"
-                imaging_source_data = dict(
-                    folder_path=imaging_folder_path,
-                    channel_name=channel_name,
-                    plane_name=plane_name,
-                    verbose=verbose,
-                )
-                self.data_interface_objects.update(
-                    {imaging_interface_name: Hendricks2024SinglePlaneImagingInterface(**imaging_source_data)}
-                )
+        # All the interfaces of the epoch share the same index, so that each .tif file is inspected only once
+        self.tiff_index = get_tiff_index(folder_path=imaging_folder_path, tiff_index=tiff_index)
+        # The stimulus interfaces share one handle per stimulus file (the holographic and the visual stimulation
+        # data are usually stored in the same file)
+        self.stimulus_files = {
+            stimulus_file.file_path.resolve(): stimulus_file for stimulus_file in (stimulus_files or [])
+        }
+
+        # The channels and planes (and the interfaces of each of them) are only probed when the interfaces are needed
+        self.imaging_folder_path = imaging_folder_path
+        self.deinterleave_imaging = deinterleave_imaging
+        self.deinterleaving_buffer_folder_path = deinterleaving_buffer_folder_path
+        self.deinterleaving_pages_per_read = deinterleaving_pages_per_read
+        self.deinterleaving_reader = None
+        self._available_channels = None
+        self._available_planes = None
+        self.data_interface_objects.add_interface_provider(self._add_imaging_interfaces)
 
+        self.segmentation_folder_path = segmentation_folder_path
+        self.segmentation_start_frame = segmentation_start_frame
+        self.segmentation_end_frame = segmentation_end_frame
+        self.suite2p_store = None
         if segmentation_folder_path:
-            available_planes = Hendricks2024SegmentationInterface.get_available_planes(
-                folder_path=segmentation_folder_path
-            )
-            available_channels = Hendricks2024SegmentationInterface.get_available_channels(
-                folder_path=segmentation_folder_path
-            )
-            for channel_name in available_channels:
-                for plane_name in available_planes:
-                    plane_name_suffix = f"{channel_name.capitalize()}{plane_name.capitalize()}"
-                    segmentation_interface_name = f"Segmentation{plane_name_suffix}"
-                    segmentation_source_data = dict(
-                        folder_path=segmentation_folder_path,
-                        channel_name=channel_name,
-                        plane_name=plane_name,
-                        start_frame=segmentation_start_frame,
-                        end_frame=segmentation_end_frame,
-                        verbose=verbose,
-                    )
-                    if self.plane_map:
-                        plane_segmentation_name = "PlaneSegmentation" + self.plane_map.get(
-                            plane_name_suffix, None
-                        ).replace("_", "")
-                        segmentation_source_data.update(plane_segmentation_name=plane_segmentation_name)
-                    Hendricks2024SegmentationInterface(**segmentation_source_data)
-                    self.data_interface_objects.update(
-                        {segmentation_interface_name: Hendricks2024SegmentationInterface(**segmentation_source_data)}
-                    )
-                    
+            # The Suite2p output of the session is loaded once, each segmentation interface is a view of the epoch
+            self.suite2p_store = get_suite2p_store(folder_path=segmentation_folder_path, suite2p_store=suite2p_store)
+            self.data_interface_objects.add_interface_provider(self._add_segmentation_interfaces)
+
         if visual_stimulus_file_path and visual_stimulus_type:
             visual_stimulus_interface_name = "VisualStimulus"
             visual_stimulus_source_data = dict(
                 folder_path=imaging_folder_path,
                 visual_stimulus_file_path=visual_stimulus_file_path,
                 visual_stimulus_type=visual_stimulus_type,
+                tiff_index=self.tiff_index,
+                stimulus_file=self.get_stimulus_file(visual_stimulus_file_path),
                 verbose=verbose,
             )
-            Hendricks2024VisualStimuliInterface(**visual_stimulus_source_data)
-            self.data_interface_objects.update(
-                {visual_stimulus_interface_name: Hendricks2024VisualStimuliInterface(**visual_stimulus_source_data)}
+            self.data_interface_objects.add_interface(
+                visual_stimulus_interface_name, Hendricks2024VisualStimuliInterface, visual_stimulus_source_data
             )
         if holographic_stimulation_file_path:
             holographic_stimulation_interface_name = "HolographicStimulation"
@@ -146,16 +259,157 @@ class Hendricks2024NWBConverter(NWBConverter):
                 folder_path=imaging_folder_path,
                 holographic_stimulation_file_path=holographic_stimulation_file_path,
                 epoch_name=epoch_name,
+                tiff_index=self.tiff_index,
+                stimulus_file=self.get_stimulus_file(holographic_stimulation_file_path),
+                target_matching=holographic_target_matching,
+                suite2p_store=self.suite2p_store,
                 verbose=verbose,
             )
-            Hendricks2024HolographicStimulationInterface(**holographic_stimulation_source_data)
-            self.data_interface_objects.update(
-                {
-                    holographic_stimulation_interface_name: Hendricks2024HolographicStimulationInterface(
-                        **holographic_stimulation_source_data
+            self.data_interface_objects.add_interface(
+                holographic_stimulation_interface_name,
+                Hendricks2024HolographicStimulationInterface,
+                holographic_stimulation_source_data,
+            )
+
+    @property
+    def available_channels(self) -> List[str]:
+        if self._available_channels is None:
+            self._available_channels = Hendricks2024SinglePlaneImagingInterface.get_available_channels(
+                folder_path=self.imaging_folder_path, tiff_index=self.tiff_index
+            )
+        return self._available_channels
+
+    @property
+    def available_planes(self) -> List[str]:
+        if self._available_planes is None:
+            self._available_planes = Hendricks2024SinglePlaneImagingInterface.get_available_planes(
+                folder_path=self.imaging_folder_path, tiff_index=self.tiff_index
+            )
+        return self._available_planes
+
+    def _add_imaging_interfaces(self) -> None:
+        imaging_interface_class = Hendricks2024SinglePlaneImagingInterface
+        if self.deinterleave_imaging:
+            # Read each raw .tif file once for all the channels and planes, instead of once per (channel, plane)
+            imaging_interface_class = Hendricks2024DeinterleavedSinglePlaneImagingInterface
+            self.deinterleaving_reader = Hendricks2024DeinterleavingTiffReader(
+                tiff_index=self.tiff_index,
+                buffer_folder_path=self.deinterleaving_buffer_folder_path,
+                pages_per_read=self.deinterleaving_pages_per_read,
+            )
+        for channel_name in self.available_channels:
+            for plane_name in self.available_planes:
+                channel_name_without_space = channel_name.replace(" ", "")
+                imaging_interface_name = f"Imaging{channel_name_without_space}Plane{plane_name}"
+                imaging_source_data = dict(
+                    folder_path=self.imaging_folder_path,
+                    channel_name=channel_name,
+                    plane_name=plane_name,
+                    tiff_index=self.tiff_index,
+                    verbose=self.verbose,
+                )
+                if self.deinterleaving_reader is not None:
+                    imaging_source_data.update(deinterleaving_reader=self.deinterleaving_reader)
+                self.data_interface_objects.add_interface(
+                    imaging_interface_name, imaging_interface_class, imaging_source_data
+                )
+
+    def _add_segmentation_interfaces(self) -> None:
+        available_planes = self.suite2p_store.get_available_planes()
+        available_channels = self.suite2p_store.get_available_channels()
+        for channel_name in available_channels:
+            for plane_name in available_planes:
+                plane_name_suffix = f"{channel_name.capitalize()}{plane_name.capitalize()}"
+                segmentation_interface_name = f"Segmentation{plane_name_suffix}"
+                segmentation_source_data = dict(
+                    folder_path=self.segmentation_folder_path,
+                    channel_name=channel_name,
+                    plane_name=plane_name,
+                    start_frame=self.segmentation_start_frame,
+                    end_frame=self.segmentation_end_frame,
+                    suite2p_store=self.suite2p_store,
+                    verbose=self.verbose,
+                )
+                if self.plane_map:
+                    plane_segmentation_name = "PlaneSegmentation" + self.plane_map.get(plane_name_suffix, None).replace(
+                        "_", ""
                     )
-                }
+                    segmentation_source_data.update(plane_segmentation_name=plane_segmentation_name)
+                self.data_interface_objects.add_interface(
+                    segmentation_interface_name, Hendricks2024SegmentationInterface, segmentation_source_data
+                )
+
+    def get_stimulus_file(self, file_path: FilePathType) -> Hendricks2024StimulusFile:
+        """Return the handle on a stimulus file, which is created the first time the file is requested."""
+        file_key = Path(file_path).resolve()
+        if file_key not in self.stimulus_files:
+            self.stimulus_files[file_key] = Hendricks2024StimulusFile(file_path=file_path)
+        return self.stimulus_files[file_key]
+
+    def close_stimulus_files(self) -> None:
+        for stimulus_file in self.stimulus_files.values():
+            stimulus_file.close()
+
+    def get_imaging_interface_names(self) -> List[str]:
+        return [interface_name for interface_name in self.data_interface_objects if "Imaging" in interface_name]
+
+    def _start_imaging_prefetch(self) -> None:
+        """Wrap the extractor of each imaging interface to read its frames ahead, and start reading all of them."""
+        imaging_interface_names = self.get_imaging_interface_names()
+        if not imaging_interface_names or self._imaging_prefetcher is not None:
+            return
+        imaging_extractors = dict()
+        for interface_name in imaging_interface_names:
+            imaging_extractor = self.data_interface_objects[interface_name].imaging_extractor
+            if isinstance(imaging_extractor, Hendricks2024PrefetchingImagingExtractor):
+                # Wrapped by a previous conversion, whose readers are stopped
+                imaging_extractor = imaging_extractor._imaging_extractor
+            imaging_extractors[interface_name] = imaging_extractor
+        self._imaging_prefetcher = Hendricks2024ImagingPrefetcher(
+            imaging_extractors=imaging_extractors,
+            frames_per_block=self.prefetch_frames_per_block,
+            prefetch_depth=self.prefetch_depth,
+        )
+        for interface_name, imaging_extractor in imaging_extractors.items():
+            self.data_interface_objects[interface_name].imaging_extractor = Hendricks2024PrefetchingImagingExtractor(
+                imaging_extractor=imaging_extractor, prefetcher=self._imaging_prefetcher, series_name=interface_name
             )
+        self._imaging_prefetcher.start()
+
+    def stop_imaging_prefetch(self) -> None:
+        if self._imaging_prefetcher is not None:
+            self._imaging_prefetcher.stop()
+            self._imaging_prefetcher = None
+
+    def add_to_nwbfile(self, nwbfile: NWBFile, metadata, conversion_options: Optional[dict] = None) -> None:
+        if self.pipeline_imaging:
+            # The first frames of every series are read while the other interfaces are added to the file
+            self._start_imaging_prefetch()
+        if self.manifest is not None:
+            # The progress is reported by the outermost extractor, which is the one read by the writer
+            for interface_name in self.get_imaging_interface_names():
+                interface = self.data_interface_objects[interface_name]
+                interface.imaging_extractor = Hendricks2024ProgressImagingExtractor(
+                    imaging_extractor=interface.imaging_extractor,
+                    on_frames_requested=self.manifest.get_progress_callback(interface_name=interface_name),
+                )
+        if self.profiler is not None:
+            # The reads of the frames are measured separately from the compression and the write of the series
+            for interface_name in self.get_imaging_interface_names():
+                interface = self.data_interface_objects[interface_name]
+                interface.imaging_extractor = Hendricks2024ProfiledImagingExtractor(
+                    imaging_extractor=interface.imaging_extractor,
+                    profiler=self.profiler,
+                    phase_name=f"{interface_name}.get_video",
+                )
+        super().add_to_nwbfile(nwbfile=nwbfile, metadata=metadata, conversion_options=conversion_options)
+
+    def run_conversion(self, *args, **kwargs) -> None:
+        try:
+            super().run_conversion(*args, **kwargs)
+        finally:
+            # The frames are read while the file is written, the readers are only stopped once the file is closed
+            self.stop_imaging_prefetch()
 
     def get_metadata(self) -> DeepDict:
         metadata = super().get_metadata()
@@ -0,0 +1,216 @@
+"""Timing and resource instrumentation of the conversion of one epoch."""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Literal, Optional
+
+from neuroconv import BaseDataInterface
+from neuroconv.utils import FilePathType
+
+from hendricks_2024_imagingextractor import Hendricks2024WrappedImagingExtractor
+
+
+def get_io_counters() -> dict:
+    """
+    Return the number of bytes read from and written to the storage by the process so far (Linux only).
+
+    The page cache hits are not counted, the pages of memory-mapped files read from the storage are.
+    """
+    try:
+        with open("/proc/self/io", mode="r") as file:
+            io_counters = dict(line.split(": ") for line in file.read().splitlines())
+    except OSError:  # Not available outside of Linux
+        return dict(read_bytes=None, write_bytes=None)
+    return dict(read_bytes=int(io_counters["read_bytes"]), write_bytes=int(io_counters["write_bytes"]))
+
+
+def get_rss_in_mb() -> Optional[float]:
+    """Return the current resident memory of the process in MB, or None when it is not available (Linux only)."""
+    try:
+        with open("/proc/self/statm", mode="r") as file:
+            resident_pages = int(file.read().split()[1])
+    except OSError:  # Not available outside of Linux
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def get_peak_rss_in_mb() -> Optional[float]:
+    """Return the peak resident memory of the process so far in MB (POSIX only)."""
+    try:
+        import resource
+    except ImportError:  # The resource module is not available on Windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3
+
+
+class Hendricks2024ConversionProfiler:
+    """
+    Records the wall time, the bytes read and written and the peak resident memory of each phase of a conversion.
+
+    The resident memory is sampled in a background thread while the profiler runs, the peak of a phase is the largest
+    sample (or the memory at its start or end) taken while it runs, unlike the peak of the whole process reported
+    as `process_peak_rss_in_mb`. The phases with the same name are aggregated (e.g. the `get_video` calls of an
+    imaging series). Nested phases are measured independently, so the time of a phase includes the time of the phases
+    nested in it. Optionally, the whole conversion is also captured with cProfile or pyinstrument.
+    """
+
+    def __init__(
+        self, capture: Optional[Literal["cprofile", "pyinstrument"]] = None, sampling_interval_in_s: float = 0.01
+    ):
+        """
+        Parameters
+        ----------
+        capture : {"cprofile", "pyinstrument"}, optional
+            The profiler that captures the call stacks of the whole conversion, saved next to the report.
+            pyinstrument has to be installed separately.
+        sampling_interval_in_s : float, default: 0.01
+            The interval between two samples of the resident memory.
+        """
+        if capture not in (None, "cprofile", "pyinstrument"):
+            raise ValueError(f"'{capture}' is not a valid capture, it must be one of 'cprofile' or 'pyinstrument'.")
+        self.capture = capture
+        self.sampling_interval_in_s = sampling_interval_in_s
+        self.phases = dict()
+        self._start_time = None
+        self._capture_profiler = None
+        # The peak resident memory of each phase in progress, updated by the sampler thread
+        self._phase_peak_rss = dict()
+        self._phase_peak_rss_lock = threading.Lock()
+        self._sampler_thread = None
+        self._stop_sampling = threading.Event()
+
+    def _sample_rss(self) -> None:
+        while not self._stop_sampling.wait(self.sampling_interval_in_s):
+            rss_in_mb = get_rss_in_mb()
+            if rss_in_mb is None:
+                return
+            with self._phase_peak_rss_lock:
+                for phase_token, peak_rss_in_mb in self._phase_peak_rss.items():
+                    self._phase_peak_rss[phase_token] = max(peak_rss_in_mb, rss_in_mb)
+
+    def start(self) -> None:
+        self._start_time = time.perf_counter()
+        self._stop_sampling.clear()
+        self._sampler_thread = threading.Thread(target=self._sample_rss, name="Hendricks2024RssSampler", daemon=True)
+        self._sampler_thread.start()
+        if self.capture == "cprofile":
+            import cProfile
+
+            self._capture_profiler = cProfile.Profile()
+            self._capture_profiler.enable()
+        elif self.capture == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                print("Warning: pyinstrument is not installed, the conversion will not be captured.")
+                return
+            self._capture_profiler = Profiler()
+            self._capture_profiler.start()
+
+    def stop(self) -> None:
+        if self._sampler_thread is not None:
+            self._stop_sampling.set()
+            self._sampler_thread.join()
+            self._sampler_thread = None
+        if self._capture_profiler is None:
+            return
+        if self.capture == "cprofile":
+            self._capture_profiler.disable()
+        else:
+            self._capture_profiler.stop()
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure the code run in the `with` block as the phase `name`."""
+        phase_token = object()
+        with self._phase_peak_rss_lock:
+            self._phase_peak_rss[phase_token] = get_rss_in_mb() or 0.0
+        io_counters = get_io_counters()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - start_time
+            end_io_counters = get_io_counters()
+            with self._phase_peak_rss_lock:
+                peak_rss_in_mb = max(self._phase_peak_rss.pop(phase_token), get_rss_in_mb() or 0.0)
+            phase = self.phases.setdefault(
+                name, dict(calls=0, wall_time_in_s=0.0, read_bytes=None, write_bytes=None, peak_rss_in_mb=None)
+            )
+            phase["calls"] += 1
+            phase["wall_time_in_s"] += wall_time
+            for counter_name in ("read_bytes", "write_bytes"):
+                if end_io_counters[counter_name] is not None:
+                    counter = end_io_counters[counter_name] - io_counters[counter_name]
+                    phase[counter_name] = (phase[counter_name] or 0) + counter
+            if peak_rss_in_mb:
+                phase["peak_rss_in_mb"] = max(phase["peak_rss_in_mb"] or 0.0, peak_rss_in_mb)
+
+    def wrap(self, name: str, function: Callable) -> Callable:
+        """Return `function` measured as the phase `name` each time it is called."""
+
+        @wraps(function)
+        def profiled_function(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+
+        return profiled_function
+
+    def instrument_interface(self, interface_name: str, interface: BaseDataInterface) -> None:
+        """Measure the `get_metadata` and `add_to_nwbfile` calls of an interface."""
+        interface.get_metadata = self.wrap(f"{interface_name}.get_metadata", interface.get_metadata)
+        interface.add_to_nwbfile = self.wrap(f"{interface_name}.add_to_nwbfile", interface.add_to_nwbfile)
+
+    def save_report(self, report_file_path: FilePathType, **report_info) -> Path:
+        """
+        Save the phases as a JSON report, along with the call stacks captured (if any).
+
+        Parameters
+        ----------
+        report_file_path : FilePathType
+            The path to the JSON report, e.g. "w57-1-2024223-7expt.nwb.profile.json".
+        report_info : dict
+            The other information saved in the report (e.g. the epoch name and the conversion options).
+        """
+        report_file_path = Path(report_file_path)
+        report = dict(report_info)
+        report.update(
+            total_wall_time_in_s=time.perf_counter() - self._start_time if self._start_time is not None else None,
+            process_peak_rss_in_mb=get_peak_rss_in_mb(),
+            pid=os.getpid(),
+            phases=self.phases,
+        )
+        if self._capture_profiler is not None:
+            if self.capture == "cprofile":
+                capture_file_path = report_file_path.with_suffix(".prof")
+                self._capture_profiler.dump_stats(str(capture_file_path))
+            else:
+                capture_file_path = report_file_path.with_suffix(".html")
+                capture_file_path.write_text(self._capture_profiler.output_html())
+            report.update(capture_file_path=str(capture_file_path))
+        with open(report_file_path, mode="w") as file:
+            json.dump(report, file, indent=4, default=str)
+        return report_file_path
+
+
+class Hendricks2024ProfiledImagingExtractor(Hendricks2024WrappedImagingExtractor):
+    """Wrapper of an imaging extractor that measures the reads of the frames as a phase of a profiler."""
+
+    extractor_name = "Hendricks2024ProfiledImagingExtractor"
+
+    def __init__(self, imaging_extractor, profiler: Hendricks2024ConversionProfiler, phase_name: str) -> None:
+        super().__init__(imaging_extractor=imaging_extractor)
+        self.profiler = profiler
+        self.phase_name = phase_name
+
+    def get_video(self, start_frame: Optional[int] = None, end_frame: Optional[int] = None, channel: int = 0):
+        with self.profiler.phase(self.phase_name):
+            return self._imaging_extractor.get_video(start_frame=start_frame, end_frame=end_frame)
@@ -0,0 +1,165 @@
+from pathlib import Path
+from typing import Optional, List
+import numpy as np
+
+from neuroconv.utils import FolderPathType
+
+from roiextractors.extractors.suite2p.suite2psegmentationextractor import Suite2pSegmentationExtractor
+from roiextractors.segmentationextractor import FrameSliceSegmentationExtractor
+
+
+class Hendricks2024Suite2pSessionStore:
+    """
+    Session-scoped store of the Suite2p output (usually the "suite2p" folder) of all the epochs of a session.
+
+    Suite2p concatenates the epochs in time, so the output of the whole session is loaded once per (channel, plane):
+    the ROI masks, images and options are read once and the traces (F.npy, Fneu.npy and spks.npy) are memory-mapped,
+    so each epoch is served as a zero-copy view of its frame range.
+    """
+
+    def __init__(self, folder_path: FolderPathType):
+        """
+        Parameters
+        ----------
+        folder_path : FolderPathType
+            The folder that contains the Suite2P segmentation output. (usually named "suite2p")
+        """
+        self.folder_path = Path(folder_path)
+        assert self.folder_path.is_dir(), f"The Suite2p folder '{self.folder_path}' is missing."
+
+        self._available_channels = None
+        self._available_planes = None
+        self._extractors = dict()
+        self._ops = dict()
+        self._roi_medians = dict()
+
+    def get_available_channels(self) -> List[str]:
+        if self._available_channels is None:
+            self._available_channels = Suite2pSegmentationExtractor.get_available_channels(folder_path=self.folder_path)
+        return self._available_channels
+
+    def get_available_planes(self) -> List[str]:
+        if self._available_planes is None:
+            self._available_planes = Suite2pSegmentationExtractor.get_available_planes(folder_path=self.folder_path)
+        return self._available_planes
+
+    def get_ops(self, plane_name: str = "plane0") -> dict:
+        """Return the Suite2p options ('ops.npy') of a plane."""
+        if plane_name not in self._ops:
+            ops_file_path = self.folder_path / plane_name / "ops.npy"
+            assert ops_file_path.is_file(), f"The Suite2p options file '{ops_file_path}' is missing."
+            self._ops[plane_name] = np.load(ops_file_path, allow_pickle=True).item()
+        return self._ops[plane_name]
+
+    def get_roi_medians(self, plane_name: str = "plane0") -> np.ndarray:
+        """
+        Return the (x, y) median pixel location ('med' in 'stat.npy') of the rois of a plane that are classified as
+        cells ('iscell.npy'), in the order of Suite2p.
+        """
+        if plane_name not in self._roi_medians:
+            plane_folder_path = self.folder_path / plane_name
+            stat_file_path = plane_folder_path / "stat.npy"
+            assert stat_file_path.is_file(), f"The Suite2p ROI statistics file '{stat_file_path}' is missing."
+            iscell_file_path = plane_folder_path / "iscell.npy"
+            assert iscell_file_path.is_file(), f"The Suite2p classification file '{iscell_file_path}' is missing."
+            stat = np.load(stat_file_path, allow_pickle=True)
+            is_accepted = np.load(iscell_file_path)[:, 0].astype(bool)
+            # 'med' is (y, x)
+            medians = np.array([roi_stat["med"] for roi_stat in stat], dtype=float).reshape(-1, 2)[:, ::-1]
+            self._roi_medians[plane_name] = medians[is_accepted]
+        return self._roi_medians[plane_name]
+
+    def get_accepted_roi_coordinates(self) -> np.ndarray:
+        """
+        Return the (x, y, plane index) coordinates of the rois classified as cells of all the planes, concatenated
+        over the planes as the 'suite2p_targets' of the holographic stimulation data.
+        """
+        coordinates = [
+            np.column_stack([medians, np.full(len(medians), plane_index, dtype=float)])
+            for plane_index, medians in enumerate(map(self.get_roi_medians, self.get_available_planes()))
+        ]
+        return np.concatenate(coordinates) if coordinates else np.empty((0, 3))
+
+    def get_extractor(self, channel_name: str, plane_name: str) -> Suite2pSegmentationExtractor:
+        """Return the segmentation extractor of the whole session for a channel and a plane, loaded only once."""
+        if (channel_name, plane_name) not in self._extractors:
+            self._extractors[(channel_name, plane_name)] = Suite2pSegmentationExtractor(
+                folder_path=self.folder_path, channel_name=channel_name, plane_name=plane_name
+            )
+        return self._extractors[(channel_name, plane_name)]
+
+
+# The stores of the process, so that the epochs converted one after the other by the same (worker) process share the
+# Suite2p output of the session even when no store is passed to them
+_suite2p_stores = dict()
+
+
+def get_suite2p_store(
+    folder_path: FolderPathType, suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None
+) -> Hendricks2024Suite2pSessionStore:
+    """
+    Return the given store if it was built for `folder_path`, otherwise the store of `folder_path` of this process,
+    which is built on the first call.
+    """
+    if suite2p_store is not None:
+        assert suite2p_store.folder_path == Path(
+            folder_path
+        ), f"The Suite2p store was built for '{suite2p_store.folder_path}' and can not be used for '{folder_path}'."
+        return suite2p_store
+    store_key = Path(folder_path).resolve()
+    if store_key not in _suite2p_stores:
+        _suite2p_stores[store_key] = Hendricks2024Suite2pSessionStore(folder_path=folder_path)
+    return _suite2p_stores[store_key]
+
+
+class Hendricks2024Suite2pSegmentationExtractor(FrameSliceSegmentationExtractor):
+    """
+    Segmentation extractor for the frames of one epoch of a Suite2p output concatenated over the epochs.
+
+    The Suite2p output is loaded once by the Hendricks2024Suite2pSessionStore, this extractor is a view of the frames
+    between `start_frame` and `end_frame`.
+    """
+
+    extractor_name = "Hendricks2024Suite2pSegmentationExtractor"
+
+    @classmethod
+    def get_available_channels(cls, folder_path: FolderPathType) -> List[str]:
+        return Suite2pSegmentationExtractor.get_available_channels(folder_path=folder_path)
+
+    @classmethod
+    def get_available_planes(cls, folder_path: FolderPathType) -> List[str]:
+        return Suite2pSegmentationExtractor.get_available_planes(folder_path=folder_path)
+
+    def __init__(
+        self,
+        folder_path: FolderPathType,
+        channel_name: str,
+        plane_name: str,
+        start_frame: int,
+        end_frame: int,
+        suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
+    ):
+        """
+        Parameters
+        ----------
+        folder_path : FolderPathType
+            The folder that contains the Suite2P segmentation output. (usually named "suite2p")
+        channel_name : str
+            The name of the channel to load.
+        plane_name : str
+            The name of the plane to load.
+        start_frame : int
+            The first frame of the epoch in the Suite2p output.
+        end_frame : int
+            The end frame (exclusive) of the epoch in the Suite2p output.
+        suite2p_store : Hendricks2024Suite2pSessionStore, optional
+            The store of the Suite2p output in `folder_path`, shared between the epochs of the session.
+            If not provided, a new one is created.
+        """
+        self.suite2p_store = get_suite2p_store(folder_path=folder_path, suite2p_store=suite2p_store)
+        parent_segmentation = self.suite2p_store.get_extractor(channel_name=channel_name, plane_name=plane_name)
+        super().__init__(
+            parent_segmentation=parent_segmentation, start_frame=int(start_frame), end_frame=int(end_frame)
+        )
+        self.channel_name = channel_name
+        self.plane_name = plane_name
@@ -1,33 +1,68 @@
+from typing import Optional
+
 from neuroconv.utils import FolderPathType
+from neuroconv.datainterfaces.ophys.basesegmentationextractorinterface import BaseSegmentationExtractorInterface
 from neuroconv.datainterfaces.ophys.suite2p.suite2pdatainterface import Suite2pSegmentationInterface
 
-from roiextractors.extractors.suite2p.suite2psegmentationextractor import Suite2pSegmentationExtractor
+from hendricks_2024_segmentationextractor import (
+    Hendricks2024Suite2pSegmentationExtractor,
+    Hendricks2024Suite2pSessionStore,
+)
+
 
 class Hendricks2024SegmentationInterface(Suite2pSegmentationInterface):
     """
     Data Interface for writing imaging data for the MouseV1 to NWB file using Hendricks2024SinglePlaneImagingExtractor.
     """
 
-    Extractor = Suite2pSegmentationExtractor
+    Extractor = Hendricks2024Suite2pSegmentationExtractor
 
     def __init__(
         self,
         folder_path: FolderPathType,
         channel_name: str,
         plane_name: str,
-        plane_segmentation_name: str,
         start_frame: int,
         end_frame: int,
+        plane_segmentation_name: Optional[str] = None,
+        suite2p_store: Optional[Hendricks2024Suite2pSessionStore] = None,
         verbose: bool = True,
     ):
-        super().__init__(
+        """
+        Parameters
+        ----------
+        folder_path : FolderPathType
+            The folder that contains the Suite2P segmentation output. (usually named "suite2p")
+        channel_name : str
+            The name of the channel to load.
+        plane_name : str
+            The name of the plane to load.
+        start_frame : int
+            The first frame of the epoch in the Suite2p output (concatenated over the epochs).
+        end_frame : int
+            The end frame (exclusive) of the epoch in the Suite2p output.
+        plane_segmentation_name : str, optional
+            The name of the plane segmentation to be added.
+        suite2p_store : Hendricks2024Suite2pSessionStore, optional
+            The store of the Suite2p output in `folder_path`, shared between the epochs of the session so that the
+            output is loaded only once. If not provided, a new one is created.
+        verbose : bool, default: True
+        """
+        # The epoch is a view of the session-wide extractor, instead of a frame slice of a freshly loaded one
+        BaseSegmentationExtractorInterface.__init__(
+            self,
             folder_path=folder_path,
             channel_name=channel_name,
             plane_name=plane_name,
-            plane_segmentation_name=plane_segmentation_name,
-            verbose=verbose,
+            start_frame=start_frame,
+            end_frame=end_frame,
+            suite2p_store=suite2p_store,
         )
-        self.segmentation_extractor = self.segmentation_extractor.frame_slice(
-            start_frame=start_frame, end_frame=end_frame
-        )
-
+        if plane_segmentation_name is None:
+            suite2p_store = self.segmentation_extractor.suite2p_store
+            if len(suite2p_store.get_available_channels()) == 1 and len(suite2p_store.get_available_planes()) == 1:
+                plane_segmentation_name = "PlaneSegmentation"
+            else:
+                plane_segmentation_name = f"PlaneSegmentation{channel_name.capitalize()}{plane_name.capitalize()}"
+        self.plane_segmentation_name = plane_segmentation_name
+        self.verbose = verbose
@@ -0,0 +1,140 @@
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Optional, List, Union
+import numpy as np
+import h5py
+
+from neuroconv.utils import FilePathType
+
+
+class Hendricks2024LazyDataset:
+    """
+    Read-only proxy of an HDF5 dataset of the stimulus file, where nothing is read until the proxy is sliced.
+
+    Slicing the proxy (e.g. `dataset[:num_trials]`) reads only the selection from disk, while the shape and the
+    dtype are available from the header without reading any data.
+    """
+
+    def __init__(self, dataset: h5py.Dataset):
+        self._dataset = dataset
+
+    @property
+    def name(self) -> str:
+        return self._dataset.name
+
+    @property
+    def shape(self) -> tuple:
+        return self._dataset.shape
+
+    @property
+    def ndim(self) -> int:
+        return self._dataset.ndim
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dataset.dtype
+
+    def __len__(self) -> int:
+        return len(self._dataset)
+
+    def __getitem__(self, selection) -> np.ndarray:
+        return self._dataset[selection]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        data = self._dataset[()]
+        return np.asarray(data, dtype=dtype)
+
+    def read(self, num_rows: Optional[int] = None) -> np.ndarray:
+        """Read the whole dataset, or only its first `num_rows` along the first axis."""
+        if self.ndim == 0 or num_rows is None:
+            return self._dataset[()]
+        return self._dataset[:num_rows]
+
+
+class Hendricks2024StimulusGroup(Mapping):
+    """Read-only mapping of the datasets (as Hendricks2024LazyDataset) and subgroups of a group of the stimulus file."""
+
+    def __init__(self, group: h5py.Group):
+        self._group = group
+
+    @property
+    def name(self) -> str:
+        return self._group.name
+
+    @property
+    def file_path(self) -> Path:
+        return Path(self._group.file.filename)
+
+    def __getitem__(self, key: str) -> Union[Hendricks2024LazyDataset, "Hendricks2024StimulusGroup"]:
+        item = self._group[key]
+        if isinstance(item, h5py.Group):
+            return Hendricks2024StimulusGroup(item)
+        return Hendricks2024LazyDataset(item)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._group
+
+    def __iter__(self):
+        return iter(self._group.keys())
+
+    def __len__(self) -> int:
+        return len(self._group)
+
+
+class Hendricks2024StimulusFile:
+    """
+    Shared read-only handle on the .hdf5 file with the holographic and visual stimulation data of the experiment.
+
+    The file is opened once, on first access, and stays open until `close` is called (or the `with` block is exited),
+    so all the interfaces and checks of a conversion can share the same handle. The groups and datasets are returned
+    as lazy proxies: only the slices that are used are read from disk.
+    """
+
+    def __init__(self, file_path: FilePathType):
+        """
+        Parameters
+        ----------
+        file_path : FilePathType
+            The file path of the .hdf5 file that contains the stimulation data.
+        """
+        self.file_path = Path(file_path)
+        assert self.file_path.is_file(), f"The stimulus file '{self.file_path}' is missing."
+        self._file = None
+
+    @property
+    def file(self) -> h5py.File:
+        if self._file is None or not self._file.id.valid:
+            self._file = h5py.File(self.file_path, "r")
+        return self._file
+
+    def keys(self) -> List[str]:
+        return list(self.file.keys())
+
+    def __contains__(self, group_name: object) -> bool:
+        return group_name in self.file
+
+    def __getitem__(self, group_name: str) -> Hendricks2024StimulusGroup:
+        return Hendricks2024StimulusGroup(self.file[group_name])
+
+    def close(self) -> None:
+        if self._file is not None and self._file.id.valid:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self) -> "Hendricks2024StimulusFile":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def get_stimulus_file(
+    file_path: FilePathType, stimulus_file: Optional[Hendricks2024StimulusFile] = None
+) -> Hendricks2024StimulusFile:
+    """Return the given handle if it was opened on `file_path`, otherwise create a new one."""
+    if stimulus_file is not None:
+        assert (
+            stimulus_file.file_path.resolve() == Path(file_path).resolve()
+        ), f"The stimulus file handle was opened on '{stimulus_file.file_path}' and can not be used for '{file_path}'."
+        return stimulus_file
+    return Hendricks2024StimulusFile(file_path=file_path)
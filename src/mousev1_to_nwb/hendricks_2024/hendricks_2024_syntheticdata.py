@@ -0,0 +1,738 @@
+"""Synthetic inputs of the Hendricks2024 conversion (ScanImage .tif files, Suite2p output and stimulus .hdf5 file)."""
+
+import json
+import struct
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import h5py
+
+from neuroconv.utils import FilePathType, FolderPathType
+
+# The ScanImage static metadata block, written between the BigTIFF header and the first IFD
+SCANIMAGE_TIFF_MAGIC_NUMBER = 117637889
+SCANIMAGE_TIFF_VERSION = 3
+
+_TIFF_SAMPLE_FORMATS = {"u": 1, "i": 2, "f": 3}
+_TIFF_TYPE_FORMATS = {2: "Q", 3: "H", 4: "I", 16: "Q"}  # ASCII (always stored as an offset), SHORT, LONG, LONG8
+_BIGTIFF_IFD_ENTRY = struct.Struct("<HHQ8s")
+
+_VISUAL_STIMULUS_FIELDS = {
+    "vis_simple_example": ("vis_ids", "vis_times"),
+    "vis_orientation_tuning_example": ("vis_ids", "vis_times", "orientation", "size_vdeg", "contrast"),
+    "vis_retinotopy_example": ("vis_times", "locations", "size_vdeg", "contrast"),
+}
+
+
+def _get_bigtiff_ifd_entry(tag: int, tag_type: int, count: int, value: int) -> bytes:
+    value_bytes = struct.pack(f"<{_TIFF_TYPE_FORMATS[tag_type]}", value).ljust(8, b"\0")
+    return _BIGTIFF_IFD_ENTRY.pack(tag, tag_type, count, value_bytes)
+
+
+def write_scanimage_tiff(
+    file_path: FilePathType,
+    pages: np.ndarray,
+    page_descriptions: Sequence[str],
+    non_varying_frame_data: str,
+    roi_group_data: str,
+) -> None:
+    """
+    Write a multi-page BigTIFF file laid out as the ones written by ScanImage.
+
+    The ScanImage static metadata (the "SI.*" header and the JSON of the ROI groups) is written right after the BigTIFF
+    header, and each page is an uncompressed single strip, preceded by its IFD and by its description (the per-frame
+    header with e.g. 'frameTimestamps_sec').
+
+    Parameters
+    ----------
+    file_path : FilePathType
+        The path of the .tif file.
+    pages : np.ndarray
+        The pages, of shape (num_pages, num_rows, num_columns).
+    page_descriptions : sequence of str
+        The description of each page.
+    non_varying_frame_data : str
+        The "SI.*" header, one "key = value" per line.
+    roi_group_data : str
+        The JSON of the ROI groups.
+    """
+    pages = np.asarray(pages)
+    num_pages, num_rows, num_columns = pages.shape
+    assert len(page_descriptions) == num_pages, "There must be one description per page."
+    dtype = pages.dtype.newbyteorder("<")
+    sample_format = _TIFF_SAMPLE_FORMATS[dtype.kind]
+    page_size_in_bytes = num_rows * num_columns * dtype.itemsize
+
+    non_varying_frame_bytes = non_varying_frame_data.encode()
+    roi_group_bytes = roi_group_data.encode()
+    static_metadata = struct.pack(
+        "<IIII", SCANIMAGE_TIFF_MAGIC_NUMBER, SCANIMAGE_TIFF_VERSION, len(non_varying_frame_bytes), len(roi_group_bytes)
+    )
+    static_metadata += non_varying_frame_bytes + roi_group_bytes
+
+    num_entries = 12
+    ifd_size = 8 + num_entries * _BIGTIFF_IFD_ENTRY.size + 8
+    ifd_offset = 16 + len(static_metadata)
+    with open(file_path, mode="wb") as file:
+        file.write(struct.pack("<2sHHHQ", b"II", 43, 8, 0, ifd_offset))
+        file.write(static_metadata)
+        for page_index, (page, description) in enumerate(zip(pages, page_descriptions)):
+            description_bytes = description.encode() + b"\0"
+            description_offset = ifd_offset + ifd_size
+            data_offset = description_offset + len(description_bytes)
+            next_ifd_offset = data_offset + page_size_in_bytes if page_index < num_pages - 1 else 0
+            entries = [
+                _get_bigtiff_ifd_entry(256, 3, 1, num_columns),  # ImageWidth
+                _get_bigtiff_ifd_entry(257, 3, 1, num_rows),  # ImageLength
+                _get_bigtiff_ifd_entry(258, 3, 1, dtype.itemsize * 8),  # BitsPerSample
+                _get_bigtiff_ifd_entry(259, 3, 1, 1),  # Compression: none
+                _get_bigtiff_ifd_entry(262, 3, 1, 1),  # PhotometricInterpretation: BlackIsZero
+                _get_bigtiff_ifd_entry(270, 2, len(description_bytes), description_offset),  # ImageDescription
+                _get_bigtiff_ifd_entry(273, 16, 1, data_offset),  # StripOffsets
+                _get_bigtiff_ifd_entry(277, 3, 1, 1),  # SamplesPerPixel
+                _get_bigtiff_ifd_entry(278, 3, 1, num_rows),  # RowsPerStrip
+                _get_bigtiff_ifd_entry(279, 16, 1, page_size_in_bytes),  # StripByteCounts
+                _get_bigtiff_ifd_entry(284, 3, 1, 1),  # PlanarConfiguration: contiguous
+                _get_bigtiff_ifd_entry(339, 3, 1, sample_format),  # SampleFormat
+            ]
+            file.write(struct.pack("<Q", num_entries) + b"".join(entries) + struct.pack("<Q", next_ifd_offset))
+            file.write(description_bytes)
+            file.write(np.ascontiguousarray(page, dtype=dtype).tobytes())
+            ifd_offset = next_ifd_offset
+
+
+def get_scanimage_header(
+    num_channels: int,
+    num_planes: int,
+    frame_shape: Tuple[int, int],
+    num_volumes: int,
+    frame_rate: float = 19.0686,
+    fov_size_in_um: Tuple[float, float] = (13.5, 13.5),
+) -> Tuple[str, str]:
+    """
+    Return the "SI.*" header and the JSON of the ROI groups of a round-robin acquisition, as written by ScanImage 2020.
+
+    The values that are not set by the parameters are the ones of the example data (see hendricks_2024_notes.md).
+    """
+    num_rows, num_columns = frame_shape
+    channel_save = "[" + ";".join(str(channel) for channel in range(1, num_channels + 1)) + "]"
+    if num_channels == 1:
+        channel_save = "1"
+    header = {
+        "SI.VERSION_MAJOR": "2020",
+        "SI.VERSION_MINOR": "1",
+        "SI.hChannels.channelMergeColor": "{'green';'red';'red';'red'}",
+        "SI.hChannels.channelName": "{'Channel 1' 'Channel 2' 'Channel 3' 'Channel 4'}",
+        "SI.hChannels.channelSave": channel_save,
+        "SI.hChannels.channelsActive": channel_save,
+        "SI.hFastZ.enable": "true",
+        "SI.hFastZ.numVolumes": str(num_volumes),
+        "SI.hRoiManager.linePeriod": f"{1 / (frame_rate * num_rows * 1.3):.6g}",
+        "SI.hRoiManager.linesPerFrame": str(num_rows),
+        "SI.hRoiManager.pixelsPerLine": str(num_columns),
+        "SI.hRoiManager.scanFramePeriod": f"{1 / frame_rate:.6g}",
+        "SI.hRoiManager.scanFrameRate": f"{frame_rate:.6g}",
+        "SI.hRoiManager.scanVolumeRate": f"{frame_rate / num_planes:.6g}",
+        "SI.hScan2D.channelsDataType": "'int16'",
+        "SI.hStackManager.actualNumSlices": str(num_planes),
+        "SI.hStackManager.actualNumVolumes": str(num_volumes),
+        "SI.hStackManager.framesPerSlice": "1",
+        "SI.hStackManager.numSlices": str(num_planes),
+        "SI.hStackManager.numVolumes": str(num_volumes),
+        "SI.hStackManager.zs": "[" + " ".join(str(30 * plane_index) for plane_index in range(num_planes)) + "]",
+    }
+    non_varying_frame_data = "".join(f"{key} = {value}\n" for key, value in header.items()) + "\n"
+
+    scanfield = {
+        "ver": 1,
+        "classname": "scanimage.mroi.scanfield.fields.RotatedRectangle",
+        "name": "Default Imaging Scanfield",
+        "centerXY": [-1.776356839e-16, 0.1],
+        "sizeXY": list(fov_size_in_um),
+        "rotationDegrees": 0,
+        "pixelResolutionXY": [num_columns, num_rows],
+    }
+    roi_groups = {
+        "RoiGroups": {
+            "imagingRoiGroup": {
+                "ver": 1,
+                "classname": "scanimage.mroi.RoiGroup",
+                "name": "Default Imaging ROI Group",
+                "UserData": None,
+                "rois": {
+                    "ver": 1,
+                    "classname": "scanimage.mroi.Roi",
+                    "name": "Default Imaging Roi",
+                    "zs": 0,
+                    "scanfields": scanfield,
+                    "discretePlaneMode": 0,
+                    "powers": None,
+                },
+            },
+            "photostimRoiGroups": None,
+            "integrationRoiGroup": {
+                "ver": 1,
+                "classname": "scanimage.mroi.RoiGroup",
+                "name": "",
+                "UserData": None,
+                "rois": [],
+            },
+        }
+    }
+    return non_varying_frame_data, json.dumps(roi_groups, indent=2) + "\n"
+
+
+def get_scanimage_frame_description(
+    frame_number: int,
+    acquisition_number: int,
+    frame_number_acquisition: int,
+    timestamp: float,
+    acquisition_start_time: datetime,
+) -> str:
+    """Return the per-frame header ScanImage writes in the description of each page."""
+    epoch = acquisition_start_time
+    seconds = epoch.second + epoch.microsecond / 1e6
+    description = {
+        "frameNumbers": str(frame_number),
+        "acquisitionNumbers": str(acquisition_number),
+        "frameNumberAcquisition": str(frame_number_acquisition),
+        "frameTimestamps_sec": f"{timestamp:.9f}",
+        "acqTriggerTimestamps_sec": "",
+        "nextFileMarkerTimestamps_sec": "",
+        "endOfAcquisition": "0",
+        "endOfAcquisitionMode": "0",
+        "dcOverVoltage": "0",
+        "epoch": f"[{epoch.year} {epoch.month} {epoch.day} {epoch.hour} {epoch.minute} {seconds:.3f}]",
+        "auxTrigger0": "[]",
+        "auxTrigger1": "[]",
+        "auxTrigger2": "[]",
+        "auxTrigger3": "[]",
+        "I2CData": "{}",
+    }
+    return "".join(f"{key} = {value}\n" for key, value in description.items())
+
+
+def get_synthetic_cell_positions(
+    num_planes: int,
+    num_cells_per_plane: int,
+    frame_shape: Tuple[int, int],
+    cell_radius: int = 5,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Draw the positions of the cells, at least two cell diameters apart in each plane.
+
+    Returns
+    -------
+    np.ndarray
+        The (x, y, plane) pixel position of each cell, of shape (num_cells, 3), sorted by plane.
+    """
+    rng = np.random.default_rng(seed)
+    margin = 2 * cell_radius
+    min_distance = 4 * cell_radius
+    positions = []
+    for plane_index in range(num_planes):
+        plane_positions = []
+        for _ in range(100 * num_cells_per_plane):
+            if len(plane_positions) == num_cells_per_plane:
+                break
+            position = rng.integers(margin, np.array(frame_shape[::-1]) - margin)
+            if all(np.hypot(*(position - other_position)) >= min_distance for other_position in plane_positions):
+                plane_positions.append(position)
+        if len(plane_positions) < num_cells_per_plane:
+            raise ValueError(f"{num_cells_per_plane} cells do not fit in a plane of {frame_shape} pixels.")
+        positions.extend((x, y, plane_index) for x, y in plane_positions)
+    return np.array(positions, dtype=int).reshape(-1, 3)
+
+
+def _get_cell_pixels(position: np.ndarray, frame_shape: Tuple[int, int], cell_radius: int) -> Tuple[np.ndarray, ...]:
+    x, y = int(position[0]), int(position[1])
+    offsets = np.arange(-cell_radius, cell_radius + 1)
+    y_offsets, x_offsets = np.meshgrid(offsets, offsets, indexing="ij")
+    distance = np.hypot(y_offsets, x_offsets)
+    is_in_cell = distance <= cell_radius
+    ypix = np.clip(y + y_offsets[is_in_cell], 0, frame_shape[0] - 1)
+    xpix = np.clip(x + x_offsets[is_in_cell], 0, frame_shape[1] - 1)
+    lam = np.exp(-(distance[is_in_cell] ** 2) / (2 * (cell_radius / 2) ** 2))
+    return ypix, xpix, lam / lam.sum()
+
+
+def _get_mean_images(
+    cell_positions: np.ndarray, num_planes: int, frame_shape: Tuple[int, int], cell_radius: int
+) -> np.ndarray:
+    mean_images = np.full((num_planes, *frame_shape), 200.0)
+    for position in cell_positions:
+        ypix, xpix, lam = _get_cell_pixels(position=position, frame_shape=frame_shape, cell_radius=cell_radius)
+        mean_images[position[2], ypix, xpix] += 800.0 * lam / lam.max()
+    return mean_images
+
+
+def generate_scanimage_epoch(
+    folder_path: FolderPathType,
+    num_trials: int,
+    volumes_per_trial: int,
+    cell_positions: np.ndarray,
+    num_channels: int = 2,
+    num_planes: int = 3,
+    frame_shape: Tuple[int, int] = (512, 512),
+    frame_rate: float = 19.0686,
+    inter_trial_interval: float = 1.0,
+    acquisition_start_time: Optional[datetime] = None,
+    file_name_prefix: str = "file",
+    cell_radius: int = 5,
+    seed: int = 0,
+) -> List[Path]:
+    """
+    Write the ScanImage .tif files of one epoch, one file per trial.
+
+    The planes and the channels are acquired round-robin: the pages of a file are ordered by volume, then by plane,
+    then by channel. The first channel has the fluorescence of the cells (with a random gain per frame), the other
+    channels a dimmer static image, both with noise.
+
+    Parameters
+    ----------
+    folder_path : FolderPathType
+        The folder of the epoch (e.g. "raw-tiffs/5stim"), created if it does not exist.
+    num_trials : int
+        The number of trials, i.e. of .tif files.
+    volumes_per_trial : int
+        The number of volumes (frames of each plane) of each trial.
+    cell_positions : np.ndarray
+        The (x, y, plane) pixel position of each cell, as returned by `get_synthetic_cell_positions`.
+    inter_trial_interval : float, default: 1.0
+        The time (in seconds) between the end of a trial and the start of the next one.
+    acquisition_start_time : datetime, optional
+        The start time of the acquisition, written in the 'epoch' field of each page. Defaults to now.
+
+    Returns
+    -------
+    list of Path
+        The paths of the .tif files.
+    """
+    folder_path = Path(folder_path)
+    folder_path.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    acquisition_start_time = acquisition_start_time or datetime.now().replace(microsecond=0)
+    non_varying_frame_data, roi_group_data = get_scanimage_header(
+        num_channels=num_channels,
+        num_planes=num_planes,
+        frame_shape=frame_shape,
+        num_volumes=volumes_per_trial,
+        frame_rate=frame_rate,
+    )
+    mean_images = _get_mean_images(
+        cell_positions=cell_positions, num_planes=num_planes, frame_shape=frame_shape, cell_radius=cell_radius
+    )
+    frames_per_trial = volumes_per_trial * num_planes
+    trial_duration = frames_per_trial / frame_rate
+
+    file_paths = []
+    for trial_index in range(num_trials):
+        trial_start_time = trial_index * (trial_duration + inter_trial_interval)
+        pages = np.empty((frames_per_trial * num_channels, *frame_shape), dtype=np.int16)
+        page_descriptions = []
+        for frame_index in range(frames_per_trial):
+            plane_index = frame_index % num_planes
+            description = get_scanimage_frame_description(
+                frame_number=trial_index * frames_per_trial + frame_index + 1,
+                acquisition_number=trial_index + 1,
+                frame_number_acquisition=frame_index + 1,
+                timestamp=trial_start_time + frame_index / frame_rate,
+                acquisition_start_time=acquisition_start_time,
+            )
+            gain = 1.0 + 0.3 * rng.random()
+            for channel_index in range(num_channels):
+                image = mean_images[plane_index] * (gain if channel_index == 0 else 0.5)
+                noise = rng.integers(0, 64, size=frame_shape, dtype=np.int16)
+                pages[frame_index * num_channels + channel_index] = image.astype(np.int16) + noise
+                page_descriptions.append(description)
+        file_path = folder_path / f"{file_name_prefix}_{trial_index + 1:05d}.tif"
+        write_scanimage_tiff(
+            file_path=file_path,
+            pages=pages,
+            page_descriptions=page_descriptions,
+            non_varying_frame_data=non_varying_frame_data,
+            roi_group_data=roi_group_data,
+        )
+        file_paths.append(file_path)
+    return file_paths
+
+
+def generate_suite2p_folder(
+    folder_path: FolderPathType,
+    frames_per_folder: Sequence[int],
+    cell_positions: np.ndarray,
+    num_channels: int = 2,
+    num_planes: int = 3,
+    frame_shape: Tuple[int, int] = (512, 512),
+    sampling_frequency: float = 6.35621,
+    fraction_of_accepted_cells: float = 0.8,
+    cell_radius: int = 5,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Write a Suite2p output (the "suite2p" folder, with one "plane<index>" folder per plane) of epochs concatenated in
+    time.
+
+    Parameters
+    ----------
+    folder_path : FolderPathType
+        The "suite2p" folder, created if it does not exist.
+    frames_per_folder : sequence of int
+        The number of frames (per plane) of each epoch, saved as 'frames_per_folder' in the options of each plane.
+    cell_positions : np.ndarray
+        The (x, y, plane) pixel position of each cell, as returned by `get_synthetic_cell_positions`.
+    fraction_of_accepted_cells : float, default: 0.8
+        The fraction of the cells classified as cells ('iscell.npy').
+
+    Returns
+    -------
+    np.ndarray
+        Whether each cell of `cell_positions` is accepted.
+    """
+    folder_path = Path(folder_path)
+    rng = np.random.default_rng(seed)
+    num_frames = int(np.sum(frames_per_folder))
+    mean_images = _get_mean_images(
+        cell_positions=cell_positions, num_planes=num_planes, frame_shape=frame_shape, cell_radius=cell_radius
+    )
+    is_accepted = rng.random(len(cell_positions)) < fraction_of_accepted_cells
+
+    for plane_index in range(num_planes):
+        plane_folder_path = folder_path / f"plane{plane_index}"
+        plane_folder_path.mkdir(parents=True, exist_ok=True)
+        is_in_plane = cell_positions[:, 2] == plane_index
+        num_cells = int(np.sum(is_in_plane))
+
+        ops = dict(
+            nplanes=num_planes,
+            nchannels=num_channels,
+            fs=sampling_frequency,
+            Ly=frame_shape[0],
+            Lx=frame_shape[1],
+            nframes=num_frames,
+            frames_per_folder=np.array(frames_per_folder),
+            xrange=np.array([0, frame_shape[1]]),
+            yrange=np.array([0, frame_shape[0]]),
+            meanImg=mean_images[plane_index],
+            meanImgE=mean_images[plane_index],
+            max_proj=1.3 * mean_images[plane_index],
+            Vcorr=mean_images[plane_index] / mean_images[plane_index].max(),
+        )
+        if num_channels > 1:
+            ops.update(meanImg_chan2=0.5 * mean_images[plane_index])
+        np.save(plane_folder_path / "ops.npy", ops, allow_pickle=True)
+
+        stat = []
+        for position in cell_positions[is_in_plane]:
+            ypix, xpix, lam = _get_cell_pixels(position=position, frame_shape=frame_shape, cell_radius=cell_radius)
+            stat.append(
+                dict(
+                    ypix=ypix,
+                    xpix=xpix,
+                    lam=lam.astype(np.float32),
+                    med=[int(position[1]), int(position[0])],
+                    npix=len(ypix),
+                    radius=float(cell_radius),
+                    iplane=plane_index,
+                )
+            )
+        np.save(plane_folder_path / "stat.npy", np.array(stat, dtype=object), allow_pickle=True)
+        iscell = np.stack([is_accepted[is_in_plane], rng.random(num_cells)], axis=1).astype(float)
+        np.save(plane_folder_path / "iscell.npy", iscell)
+
+        # Calcium transients on top of a baseline, the neuropil is a fraction of the baseline
+        spikes = (rng.random((num_cells, num_frames)) < 0.02).astype(np.float32)
+        kernel = np.exp(-np.arange(20) / 5.0).astype(np.float32)
+        fluorescence = np.stack([np.convolve(cell_spikes, kernel)[:num_frames] for cell_spikes in spikes])
+        fluorescence = 300.0 + 200.0 * fluorescence + rng.normal(scale=10.0, size=fluorescence.shape)
+        np.save(plane_folder_path / "F.npy", fluorescence.astype(np.float32))
+        np.save(plane_folder_path / "Fneu.npy", (0.7 * fluorescence).astype(np.float32))
+        np.save(plane_folder_path / "spks.npy", spikes)
+        if num_channels > 1:
+            np.save(plane_folder_path / "F_chan2.npy", np.full((num_cells, num_frames), 150.0, dtype=np.float32))
+            np.save(plane_folder_path / "Fneu_chan2.npy", np.full((num_cells, num_frames), 100.0, dtype=np.float32))
+    return is_accepted
+
+
+def _write_holographic_stimulation_group(
+    file: h5py.File,
+    epoch_name: str,
+    num_trials: int,
+    segmented_positions: np.ndarray,
+    frame_shape: Tuple[int, int],
+    num_targets: int,
+    num_holograms: int,
+    max_rois_per_hologram: int,
+    rng: np.random.Generator,
+    max_matching_distance: float = 2.0,
+) -> None:
+    # Most targets are on a segmented cell (with a small offset), the other ones are far from any cell, as when
+    # Suite2p does not detect the targeted cell, and are not matched (NaN)
+    num_matched_targets = min(int(round(0.8 * num_targets)), len(segmented_positions))
+    matched_rois = rng.choice(len(segmented_positions), size=num_matched_targets, replace=False)
+    offsets = rng.uniform(-1.0, 1.0, size=(num_matched_targets, 2)) * max_matching_distance / np.sqrt(2)
+    target_positions = [
+        (*(segmented_positions[roi, :2] + offset), segmented_positions[roi, 2])
+        for roi, offset in zip(matched_rois, offsets)
+    ]
+    targeted_cells = list(matched_rois.astype(float))
+    num_planes = int(segmented_positions[:, 2].max()) + 1 if len(segmented_positions) else 1
+    for _ in range(1000 * num_targets):
+        if len(target_positions) == num_targets:
+            break
+        plane_index = rng.integers(0, num_planes)
+        position = rng.uniform(0, np.array(frame_shape[::-1]))
+        plane_positions = segmented_positions[segmented_positions[:, 2] == plane_index, :2]
+        if len(plane_positions) and np.min(np.hypot(*(plane_positions - position).T)) < 5 * max_matching_distance:
+            continue
+        target_positions.append((*position, plane_index))
+        targeted_cells.append(np.nan)
+    if len(target_positions) < num_targets:
+        raise ValueError(f"{num_targets} targets do not fit in a plane of {frame_shape} pixels.")
+    target_order = rng.permutation(num_targets)
+    target_positions = np.array(target_positions, dtype=float)[target_order]
+    targeted_cells = np.array(targeted_cells, dtype=float)[target_order]
+
+    # Holograms of single cells and of ensembles, stored as rows of target indexes padded with NaN
+    hologram_list = np.full((num_holograms, max_rois_per_hologram), np.nan)
+    for hologram_index in range(num_holograms):
+        num_rois = 1
+        if hologram_index >= num_holograms // 2 and max_rois_per_hologram > 1:
+            num_rois = min(rng.integers(2, max_rois_per_hologram + 1), num_targets)
+        hologram_list[hologram_index, :num_rois] = rng.choice(num_targets, size=num_rois, replace=False)
+
+    stim_times = rng.uniform(0.5, 1.0, size=num_targets)
+    stim_times[rng.random(num_targets) < 0.1] = np.nan
+    roi_powers = rng.uniform(20.0, 60.0, size=num_targets)
+    roi_powers[rng.random(num_targets) < 0.05] = np.nan
+
+    group = file.create_group(epoch_name)
+    group.create_dataset("targeted_cells", data=targeted_cells)
+    group.create_dataset("suite2p_targets", data=segmented_positions.astype(float))
+    group.create_dataset("scanimage_targets", data=target_positions)
+    group.create_dataset("scanimage_hologram_list", data=hologram_list)
+    # stim_id 0 is the control condition, the other ones index the hologram list (from 1)
+    group.create_dataset("stim_id", data=rng.integers(0, num_holograms + 1, size=num_trials).astype(float))
+    group.create_dataset("hz_per_cell", data=np.full(num_trials, 30.0))
+    group.create_dataset("spikes_per_cell", data=np.full(num_trials, 5.0))
+    group.create_dataset("stim_times", data=stim_times)
+    group.create_dataset("roi_powers_mW", data=roi_powers)
+
+
+def _write_visual_stimulus_group(
+    file: h5py.File, visual_stimulus_type: str, num_trials: int, rng: np.random.Generator
+) -> None:
+    fields = _VISUAL_STIMULUS_FIELDS.get(visual_stimulus_type, _VISUAL_STIMULUS_FIELDS["vis_simple_example"])
+    vis_on = rng.uniform(0.2, 0.5, size=num_trials)
+    data = dict(
+        vis_ids=rng.integers(1, 9, size=num_trials).astype(float),
+        vis_times=np.stack([vis_on, vis_on + 1.0]),
+        orientation=rng.choice(np.arange(0, 360, 45), size=num_trials).astype(float),
+        contrast=rng.choice([0.25, 0.5, 1.0], size=num_trials),
+        locations=rng.uniform(-30.0, 30.0, size=(num_trials, 2)),
+    )
+    # The size is a scalar in the retinotopy group, as in the example data
+    data.update(size_vdeg=20.0 if "locations" in fields else rng.choice([10.0, 20.0, 40.0], size=num_trials))
+    group = file.create_group(visual_stimulus_type)
+    for field in fields:
+        group.create_dataset(field, data=data[field])
+
+
+def generate_stimulus_file(
+    file_path: FilePathType,
+    cell_positions: np.ndarray,
+    is_accepted: np.ndarray,
+    frame_shape: Tuple[int, int],
+    holographic_num_trials: Optional[Dict[str, int]] = None,
+    visual_num_trials: Optional[Dict[str, int]] = None,
+    num_targets: int = 50,
+    num_holograms: int = 20,
+    max_rois_per_hologram: int = 10,
+    seed: int = 0,
+) -> Path:
+    """
+    Write the .hdf5 file with the holographic and visual stimulation data, one group per epoch (or visual stimulus).
+
+    The datasets of each group follow the schema of the example data (see hendricks_2024_notes.md).
+    The 'suite2p_targets' are the accepted Suite2p cells concatenated over the planes and the 'targeted_cells' are the
+    ground truth of the matching of each target to them.
+
+    Parameters
+    ----------
+    file_path : FilePathType
+        The path of the .hdf5 file.
+    cell_positions : np.ndarray
+        The (x, y, plane) pixel position of each cell, as returned by `get_synthetic_cell_positions`.
+    is_accepted : np.ndarray
+        Whether each cell is accepted by Suite2p, as returned by `generate_suite2p_folder`.
+    holographic_num_trials : dict, optional
+        The number of trials of each epoch with holographic stimulation (e.g. {"5stim": 100}).
+    visual_num_trials : dict, optional
+        The number of trials of each visual stimulus group (e.g. {"vis_orientation_tuning_example": 100}).
+    """
+    file_path = Path(file_path)
+    rng = np.random.default_rng(seed)
+    segmented_positions = cell_positions[is_accepted]
+    with h5py.File(file_path, mode="w") as file:
+        for epoch_name, num_trials in (holographic_num_trials or dict()).items():
+            _write_holographic_stimulation_group(
+                file=file,
+                epoch_name=epoch_name,
+                num_trials=num_trials,
+                segmented_positions=segmented_positions,
+                frame_shape=frame_shape,
+                num_targets=num_targets,
+                num_holograms=num_holograms,
+                max_rois_per_hologram=max_rois_per_hologram,
+                rng=rng,
+            )
+        for visual_stimulus_type, num_trials in (visual_num_trials or dict()).items():
+            _write_visual_stimulus_group(
+                file=file, visual_stimulus_type=visual_stimulus_type, num_trials=num_trials, rng=rng
+            )
+    return file_path
+
+
+def generate_synthetic_session(
+    folder_path: FolderPathType,
+    epoch_names: Sequence[str] = ("4ori", "5stim"),
+    holographic_epoch_names: Sequence[str] = ("5stim",),
+    epoch_name_visual_stimulus_mapping: Optional[Dict[str, str]] = None,
+    num_trials: int = 20,
+    volumes_per_trial: int = 10,
+    num_channels: int = 2,
+    num_planes: int = 3,
+    frame_shape: Tuple[int, int] = (512, 512),
+    num_cells_per_plane: int = 100,
+    num_targets: int = 50,
+    num_holograms: int = 20,
+    max_rois_per_hologram: int = 10,
+    seed: int = 0,
+    overwrite: bool = False,
+) -> dict:
+    """
+    Write the inputs of a synthetic session laid out as the example data: a "raw-tiffs" folder with the .tif files of
+    each epoch, a "suite2p" folder with the Suite2p output of the epochs concatenated in time and a "stimulus.hdf5"
+    file.
+
+    The inputs are only written again if the parameters changed since they were written in `folder_path`
+    (or if `overwrite` is True).
+
+    Parameters
+    ----------
+    folder_path : FolderPathType
+        The folder of the session.
+    epoch_names : sequence of str, default: ("4ori", "5stim")
+        The epochs, in the order they were acquired.
+    holographic_epoch_names : sequence of str, default: ("5stim",)
+        The epochs with holographic stimulation.
+    epoch_name_visual_stimulus_mapping : dict, optional
+        The visual stimulus group of the epochs with visual stimulation,
+        defaults to {"4ori": "vis_orientation_tuning_example"}.
+    num_trials : int, default: 20
+        The number of trials (.tif files) of each epoch.
+    volumes_per_trial : int, default: 10
+        The number of volumes (frames of each plane) of each trial.
+    num_cells_per_plane : int, default: 100
+        The number of cells segmented by Suite2p in each plane.
+    num_targets, num_holograms, max_rois_per_hologram : int
+        The number of holographic targets, the number of holograms and the largest ensemble of each holographic epoch.
+
+    Returns
+    -------
+    dict
+        The paths and the epochs of the session: 'imaging_folder_path' (with one folder per epoch),
+        'segmentation_folder_path', 'stimulus_file_path', 'epoch_names', 'holographic_epoch_names' and
+        'epoch_name_visual_stimulus_mapping'.
+    """
+    folder_path = Path(folder_path)
+    if epoch_name_visual_stimulus_mapping is None:
+        epoch_name_visual_stimulus_mapping = {"4ori": "vis_orientation_tuning_example"}
+    epoch_name_visual_stimulus_mapping = {
+        epoch_name: visual_stimulus_type
+        for epoch_name, visual_stimulus_type in epoch_name_visual_stimulus_mapping.items()
+        if epoch_name in epoch_names
+    }
+    holographic_epoch_names = [epoch_name for epoch_name in holographic_epoch_names if epoch_name in epoch_names]
+    parameters = dict(
+        epoch_names=list(epoch_names),
+        holographic_epoch_names=holographic_epoch_names,
+        epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
+        num_trials=num_trials,
+        volumes_per_trial=volumes_per_trial,
+        num_channels=num_channels,
+        num_planes=num_planes,
+        frame_shape=list(frame_shape),
+        num_cells_per_plane=num_cells_per_plane,
+        num_targets=num_targets,
+        num_holograms=num_holograms,
+        max_rois_per_hologram=max_rois_per_hologram,
+        seed=seed,
+    )
+    session = dict(
+        imaging_folder_path=folder_path / "raw-tiffs",
+        segmentation_folder_path=folder_path / "suite2p",
+        stimulus_file_path=folder_path / "stimulus.hdf5",
+        epoch_names=list(epoch_names),
+        holographic_epoch_names=holographic_epoch_names,
+        epoch_name_visual_stimulus_mapping=epoch_name_visual_stimulus_mapping,
+    )
+    # The parameters are saved last, so a session whose generation was interrupted is generated again
+    parameters_file_path = folder_path / "synthetic_session.json"
+    if not overwrite and parameters_file_path.is_file():
+        with open(parameters_file_path, mode="r") as file:
+            if json.load(file) == parameters:
+                return session
+    folder_path.mkdir(parents=True, exist_ok=True)
+    parameters_file_path.unlink(missing_ok=True)
+
+    frame_shape = tuple(frame_shape)
+    cell_positions = get_synthetic_cell_positions(
+        num_planes=num_planes, num_cells_per_plane=num_cells_per_plane, frame_shape=frame_shape, seed=seed
+    )
+    session_start_time = datetime(2024, 2, 23, 14, 0, 0)
+    for epoch_index, epoch_name in enumerate(epoch_names):
+        epoch_folder_path = session["imaging_folder_path"] / epoch_name
+        for file_path in epoch_folder_path.glob("*.tif"):
+            file_path.unlink()
+        generate_scanimage_epoch(
+            folder_path=epoch_folder_path,
+            num_trials=num_trials,
+            volumes_per_trial=volumes_per_trial,
+            cell_positions=cell_positions,
+            num_channels=num_channels,
+            num_planes=num_planes,
+            frame_shape=frame_shape,
+            acquisition_start_time=session_start_time + timedelta(hours=epoch_index),
+            file_name_prefix=f"synthetic_{epoch_name}",
+            seed=seed + epoch_index,
+        )
+    is_accepted = generate_suite2p_folder(
+        folder_path=session["segmentation_folder_path"],
+        frames_per_folder=[num_trials * volumes_per_trial] * len(epoch_names),
+        cell_positions=cell_positions,
+        num_channels=num_channels,
+        num_planes=num_planes,
+        frame_shape=frame_shape,
+        seed=seed,
+    )
+    generate_stimulus_file(
+        file_path=session["stimulus_file_path"],
+        cell_positions=cell_positions,
+        is_accepted=is_accepted,
+        frame_shape=frame_shape,
+        holographic_num_trials={epoch_name: num_trials for epoch_name in holographic_epoch_names},
+        visual_num_trials={
+            visual_stimulus_type: num_trials for visual_stimulus_type in epoch_name_visual_stimulus_mapping.values()
+        },
+        num_targets=num_targets,
+        num_holograms=num_holograms,
+        max_rois_per_hologram=max_rois_per_hologram,
+        seed=seed,
+    )
+
+    with open(parameters_file_path, mode="w") as file:
+        json.dump(parameters, file, indent=4)
+    return session
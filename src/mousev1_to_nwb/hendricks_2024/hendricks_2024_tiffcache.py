@@ -0,0 +1,150 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from pathlib import Path
+import numpy as np
+
+from neuroconv.utils import FilePathType
+
+
+class Hendricks2024TiffMetadataCache:
+    """
+    Persistent on-disk cache (SQLite) of the ScanImage .tif headers and timestamps.
+
+    Each entry is keyed on the absolute file path and is only valid as long as the size and the modification time of
+    the file are unchanged, so a re-run of the conversion never re-opens a .tif file that was already inspected.
+    The least recently used entries are evicted once the cached payload exceeds `max_size_in_mb`.
+    """
+
+    cache_file_name = ".hendricks_2024_tiff_metadata_cache.sqlite"
+    schema_version = 1
+
+    def __init__(self, cache_file_path: FilePathType, max_size_in_mb: float = 256.0):
+        """
+        Parameters
+        ----------
+        cache_file_path : FilePathType
+            The path of the SQLite file. If a folder is given, the cache is stored as `cache_file_name` inside it.
+        max_size_in_mb : float, default: 256.0
+            The maximum size of the cached payload in MB.
+        """
+        cache_file_path = Path(cache_file_path)
+        if cache_file_path.is_dir():
+            cache_file_path = cache_file_path / self.cache_file_name
+        cache_file_path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_file_path = cache_file_path
+        self.max_size_in_bytes = int(max_size_in_mb * 1e6)
+
+        # The connection is shared between the threads of the same process, the lock serializes the queries
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(str(self.cache_file_path), timeout=60.0, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS cache_schema (version INTEGER)")
+            version = self._connection.execute("SELECT version FROM cache_schema").fetchone()
+            if version is None or version[0] != self.schema_version:
+                self._connection.execute("DROP TABLE IF EXISTS tiff_metadata")
+                self._connection.execute("DELETE FROM cache_schema")
+                self._connection.execute("INSERT INTO cache_schema (version) VALUES (?)", (self.schema_version,))
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS tiff_metadata ("
+                "file_path TEXT, field TEXT, file_size INTEGER, file_mtime_ns INTEGER, "
+                "payload BLOB, payload_size INTEGER, last_used REAL, PRIMARY KEY (file_path, field))"
+            )
+
+    @staticmethod
+    def _get_file_key(file_path: FilePathType):
+        file_path = Path(file_path).absolute()
+        file_stat = os.stat(file_path)
+        return str(file_path), file_stat.st_size, file_stat.st_mtime_ns
+
+    def _get(self, file_path: FilePathType, field: str) -> Optional[bytes]:
+        with self._lock:
+            return self._get_unlocked(file_path=file_path, field=field)
+
+    def _get_unlocked(self, file_path: FilePathType, field: str) -> Optional[bytes]:
+        key, file_size, file_mtime_ns = self._get_file_key(file_path)
+        row = self._connection.execute(
+            "SELECT payload, file_size, file_mtime_ns FROM tiff_metadata WHERE file_path = ? AND field = ?",
+            (key, field),
+        ).fetchone()
+        if row is None:
+            return None
+        payload, cached_file_size, cached_file_mtime_ns = row
+        if (cached_file_size, cached_file_mtime_ns) != (file_size, file_mtime_ns):
+            # The file has been modified since it was cached
+            self.invalidate(file_path=file_path)
+            return None
+        with self._connection:
+            self._connection.execute(
+                "UPDATE tiff_metadata SET last_used = ? WHERE file_path = ? AND field = ?", (time.time(), key, field)
+            )
+        return payload
+
+    def _set(self, file_path: FilePathType, field: str, payload: bytes) -> None:
+        key, file_size, file_mtime_ns = self._get_file_key(file_path)
+        with self._lock:
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO tiff_metadata VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, field, file_size, file_mtime_ns, payload, len(payload), time.time()),
+                )
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cached payload fits in `max_size_in_mb`."""
+        (total_size,) = self._connection.execute("SELECT COALESCE(SUM(payload_size), 0) FROM tiff_metadata").fetchone()
+        if total_size <= self.max_size_in_bytes:
+            return
+        rows = self._connection.execute(
+            "SELECT file_path, field, payload_size FROM tiff_metadata ORDER BY last_used ASC"
+        ).fetchall()
+        with self._connection:
+            for key, field, payload_size in rows:
+                if total_size <= self.max_size_in_bytes:
+                    break
+                self._connection.execute("DELETE FROM tiff_metadata WHERE file_path = ? AND field = ?", (key, field))
+                total_size -= payload_size
+
+    def invalidate(self, file_path: Optional[FilePathType] = None) -> None:
+        """Remove the entries of one file, or all the entries if `file_path` is not given."""
+        with self._lock, self._connection:
+            if file_path is None:
+                self._connection.execute("DELETE FROM tiff_metadata")
+            else:
+                key = str(Path(file_path).absolute())
+                self._connection.execute("DELETE FROM tiff_metadata WHERE file_path = ?", (key,))
+
+    def get_extra_metadata(self, file_path: FilePathType) -> Optional[dict]:
+        payload = self._get(file_path=file_path, field="extra_metadata")
+        return None if payload is None else json.loads(payload.decode("utf-8"))
+
+    def set_extra_metadata(self, file_path: FilePathType, extra_metadata: dict) -> None:
+        self._set(file_path=file_path, field="extra_metadata", payload=json.dumps(extra_metadata).encode("utf-8"))
+
+    def get_timestamps(self, file_path: FilePathType) -> Optional[np.ndarray]:
+        payload = self._get(file_path=file_path, field="timestamps")
+        return None if payload is None else np.frombuffer(payload, dtype="float64").copy()
+
+    def set_timestamps(self, file_path: FilePathType, timestamps: np.ndarray) -> None:
+        payload = np.ascontiguousarray(timestamps, dtype="float64").tobytes()
+        self._set(file_path=file_path, field="timestamps", payload=payload)
+
+    def get_trial_start_time(self, file_path: FilePathType) -> Optional[float]:
+        payload = self._get(file_path=file_path, field="trial_start_time")
+        return None if payload is None else float(payload.decode("utf-8"))
+
+    def set_trial_start_time(self, file_path: FilePathType, trial_start_time: float) -> None:
+        self._set(file_path=file_path, field="trial_start_time", payload=repr(float(trial_start_time)).encode("utf-8"))
+
+    def get_num_pages(self, file_path: FilePathType) -> Optional[int]:
+        payload = self._get(file_path=file_path, field="num_pages")
+        return None if payload is None else int(payload.decode("utf-8"))
+
+    def set_num_pages(self, file_path: FilePathType, num_pages: int) -> None:
+        self._set(file_path=file_path, field="num_pages", payload=str(int(num_pages)).encode("utf-8"))
+
+    def close(self) -> None:
+        self._connection.close()
@@ -0,0 +1,158 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List
+from pathlib import Path
+from natsort import natsorted
+import numpy as np
+
+from neuroconv.utils import FilePathType, FolderPathType
+
+from roiextractors.extractors.tiffimagingextractors.scanimagetiff_utils import (
+    parse_metadata,
+    extract_extra_metadata,
+    extract_timestamps_from_file,
+)
+from ScanImageTiffReader import ScanImageTiffReader
+
+from hendricks_2024_tiffcache import Hendricks2024TiffMetadataCache
+
+
+def extract_first_frame_timestamp(file_path: FilePathType) -> float:
+    """Return the ScanImage 'frameTimestamps_sec' of the first page of a .tif file, read from that page only."""
+    with ScanImageTiffReader(str(file_path)) as io:
+        description = io.description(0)
+    match = re.search(r"frameTimestamps_sec\s*=\s*([-+0-9.eE]+)", description)
+    if match is None:
+        raise ValueError(f"The first page of '{file_path}' has no 'frameTimestamps_sec'.")
+    return float(match.group(1))
+
+
+class Hendricks2024ScanImageTiffIndex:
+    """
+    Session-scoped index over the ScanImage .tif files of one epoch folder (e.g. "raw-tiffs/5stim").
+
+    The folder is listed once and every per-file quantity (header, parsed metadata, number of pages and timestamps)
+    is read at most once and memoized, so all the Hendricks2024 interfaces built for the same epoch can share it.
+    When a persistent cache is given, the files that were already inspected by a previous run are not re-opened.
+    """
+
+    def __init__(
+        self,
+        folder_path: FolderPathType,
+        cache: Optional[Hendricks2024TiffMetadataCache] = None,
+        max_workers: int = 8,
+    ):
+        """
+        Parameters
+        ----------
+        folder_path : FolderPathType
+            The folder path that contains the ScanImage TIF imaging output (.tif files) of one epoch.
+        cache : Hendricks2024TiffMetadataCache, optional
+            The persistent cache of the .tif headers and timestamps. If not provided, nothing is persisted.
+        max_workers : int, default: 8
+            The maximum number of threads that read the trial start times of the files.
+        """
+        self.folder_path = Path(folder_path)
+        self.cache = cache
+        self.max_workers = max_workers
+        self.file_paths = natsorted(self.folder_path.glob("*.tif"))
+        assert self.file_paths, f"The TIF image files are missing from '{self.folder_path}'."
+
+        self._extra_metadata = dict()
+        self._parsed_metadata = dict()
+        self._num_pages = dict()
+        self._timestamps = dict()
+        self._trial_start_times = None
+
+    def __len__(self) -> int:
+        return len(self.file_paths)
+
+    def _get_file_path(self, file_index: int) -> Path:
+        return self.file_paths[file_index]
+
+    def get_extra_metadata(self, file_index: int = 0) -> dict:
+        """Return the ScanImage header of a file as returned by `extract_extra_metadata`."""
+        if file_index not in self._extra_metadata:
+            file_path = self._get_file_path(file_index)
+            extra_metadata = self.cache.get_extra_metadata(file_path=file_path) if self.cache else None
+            if extra_metadata is None:
+                extra_metadata = extract_extra_metadata(file_path=file_path)
+                if self.cache:
+                    self.cache.set_extra_metadata(file_path=file_path, extra_metadata=extra_metadata)
+            self._extra_metadata[file_index] = extra_metadata
+        return self._extra_metadata[file_index]
+
+    def get_parsed_metadata(self, file_index: int = 0) -> dict:
+        """Return the ScanImage header of a file as returned by `parse_metadata`."""
+        if file_index not in self._parsed_metadata:
+            self._parsed_metadata[file_index] = parse_metadata(self.get_extra_metadata(file_index=file_index))
+        return self._parsed_metadata[file_index]
+
+    def get_num_pages(self, file_index: int) -> int:
+        """Return the number of IFD pages (frames over all the channels and planes) stored in a file."""
+        if file_index not in self._num_pages:
+            file_path = self._get_file_path(file_index)
+            num_pages = self.cache.get_num_pages(file_path=file_path) if self.cache else None
+            if num_pages is None:
+                with ScanImageTiffReader(str(file_path)) as io:
+                    num_pages = int(io.shape()[0])
+                if self.cache:
+                    self.cache.set_num_pages(file_path=file_path, num_pages=num_pages)
+            self._num_pages[file_index] = num_pages
+        return self._num_pages[file_index]
+
+    def get_timestamps(self, file_index: int) -> np.ndarray:
+        """Return the ScanImage 'frameTimestamps_sec' of every page of a file."""
+        if file_index not in self._timestamps:
+            file_path = self._get_file_path(file_index)
+            timestamps = self.cache.get_timestamps(file_path=file_path) if self.cache else None
+            if timestamps is None:
+                timestamps = extract_timestamps_from_file(file_path=file_path)
+                if self.cache:
+                    self.cache.set_timestamps(file_path=file_path, timestamps=timestamps)
+            self._timestamps[file_index] = timestamps
+        return self._timestamps[file_index]
+
+    def get_trial_start_time(self, file_index: int) -> float:
+        """Return the ScanImage 'frameTimestamps_sec' of the first page of a file."""
+        if file_index in self._timestamps:
+            return float(self._timestamps[file_index][0])
+        file_path = self._get_file_path(file_index)
+        trial_start_time = self.cache.get_trial_start_time(file_path=file_path) if self.cache else None
+        if trial_start_time is None:
+            trial_start_time = extract_first_frame_timestamp(file_path=file_path)
+            if self.cache:
+                self.cache.set_trial_start_time(file_path=file_path, trial_start_time=trial_start_time)
+        return trial_start_time
+
+    def get_trial_start_times(self) -> List[float]:
+        """
+        Return the timestamp of the first frame of each file, where each file corresponds to one trial.
+
+        Only the description of the first page of each file is read, and the files are read concurrently by at most
+        `max_workers` threads, since the time is spent waiting for the disk.
+        """
+        if self._trial_start_times is None:
+            max_workers = max(1, min(self.max_workers, len(self)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Hendricks2024TiffIndex") as executor:
+                self._trial_start_times = list(executor.map(self.get_trial_start_time, range(len(self))))
+        return self._trial_start_times
+
+    def get_available_channels(self) -> List[str]:
+        return self.get_parsed_metadata()["channel_names"]
+
+    def get_available_planes(self) -> List[str]:
+        num_planes = self.get_parsed_metadata()["num_planes"]
+        return [str(plane_index) for plane_index in range(num_planes)]
+
+
+def get_tiff_index(
+    folder_path: FolderPathType, tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None
+) -> Hendricks2024ScanImageTiffIndex:
+    """Return the given index if it was built for `folder_path`, otherwise build a new one."""
+    if tiff_index is not None:
+        assert tiff_index.folder_path == Path(
+            folder_path
+        ), f"The TIF index was built for '{tiff_index.folder_path}' and can not be used for '{folder_path}'."
+        return tiff_index
+    return Hendricks2024ScanImageTiffIndex(folder_path=folder_path)
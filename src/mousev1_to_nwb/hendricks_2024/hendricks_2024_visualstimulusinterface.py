@@ -1,28 +1,145 @@
-from typing import Optional
+from typing import Optional, List, Union
 from pathlib import Path
-from natsort import natsorted
 import numpy as np
-import h5py
 
 from neuroconv import BaseDataInterface
 from neuroconv.utils import FilePathType, FolderPathType
 
+from hdmf.common import VectorData
+
 from pynwb import NWBFile
 from pynwb.epoch import TimeIntervals
 
-from roiextractors.extractors.tiffimagingextractors.scanimagetiff_utils import extract_timestamps_from_file
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex, get_tiff_index
+from hendricks_2024_stimulusfile import Hendricks2024StimulusFile, get_stimulus_file
 
 
-def h5py_to_dict(item):
-    if isinstance(item, h5py.Group):
-        group_dict = {}
-        for key, subitem in item.items():
-            group_dict[key] = h5py_to_dict(subitem)
-        return group_dict
-    elif isinstance(item, h5py.Dataset):
-        return item[()]
-    else:
-        return None
+_VARIABLES_DESCRIPTION = {
+    "orientation": "orientation of drifting grating in degrees (0-360)",
+    "size_vdeg": "size of stimulus in visual degrees, 1d of length n trials",
+    "contrast": "contrast of gratings, values between 0-1",
+    "location": "(X,Y) location on screen in visual degrees",
+}
+
+
+def get_visual_stimulus_group_columns(trial_start_times: np.ndarray, visual_stim_dict: dict) -> dict:
+    """
+    Compute the columns of the VisualStimuli table for one visual stimulus group as whole arrays.
+
+    Parameters
+    ----------
+    trial_start_times : np.ndarray
+        The start time of each trial.
+    visual_stim_dict : dict
+        The content of the visual stimulus group in the .hdf5 file ("vis_times" and the trial-wise variables),
+        either as arrays or as lazy datasets (e.g. a Hendricks2024StimulusGroup). When the group has more trials
+        than `trial_start_times` (e.g. the last .tif files are missing), only the first `len(trial_start_times)`
+        trials are read and a warning is printed. A group with fewer trials raises a ValueError.
+
+    Returns
+    -------
+    dict
+        One array per column ('start_time', 'stop_time' and the extra variables), with one element per trial.
+    """
+    trial_start_times = np.asarray(trial_start_times)
+    num_trials = len(trial_start_times)
+    num_stimulus_trials = {"vis_times": visual_stim_dict["vis_times"].shape[1]}
+    num_stimulus_trials.update(
+        {
+            key: len(visual_stim_dict[key])
+            for key in visual_stim_dict.keys()
+            if key not in ["vis_ids", "vis_times"] and np.ndim(visual_stim_dict[key]) > 0
+        }
+    )
+    short_variables = [key for key, num_values in num_stimulus_trials.items() if num_values < num_trials]
+    if short_variables:
+        raise ValueError(
+            f"The visual stimulus variables {short_variables} have fewer trials than the {num_trials} .tif files."
+        )
+    if any(num_values > num_trials for num_values in num_stimulus_trials.values()):
+        print(
+            f"Warning: the visual stimulus group has {max(num_stimulus_trials.values())} trials but there are only "
+            f"{num_trials} .tif files, only the first {num_trials} trials are added."
+        )
+    vis_times = visual_stim_dict["vis_times"][:, :num_trials]
+    columns = dict(
+        start_time=trial_start_times + vis_times[0],
+        stop_time=trial_start_times + vis_times[1],
+    )
+    extra_columns = [key for key in visual_stim_dict.keys() if key not in ["vis_ids", "vis_times"]]
+    for column_name in extra_columns:
+        values = visual_stim_dict[column_name]
+        if np.ndim(values) == 0:
+            # if it is define as scalar, copy the value for each trial
+            columns[column_name] = np.full(num_trials, values[()], dtype=float)
+        else:
+            columns[column_name] = np.asarray(values[:num_trials])
+    return columns
+
+
+def create_visual_stimuli_table(
+    visual_stimulus_groups: dict, name: str = "VisualStimuli", description: Optional[str] = None
+) -> TimeIntervals:
+    """
+    Create the TimeIntervals table of the visual stimuli in one step from whole columns.
+
+    Parameters
+    ----------
+    visual_stimulus_groups : dict
+        The columns (as returned by `get_visual_stimulus_group_columns`) of each visual stimulus group,
+        keyed by the name of the group. When more than one group is given, the rows of all the groups are sorted by
+        start time, the columns missing from a group are filled with NaN (or an empty string for the text columns)
+        and a 'visual_stimulus_type' column records the group of each row.
+    name : str, default: "VisualStimuli"
+    description : str, optional
+        The description of the table, defaults to the name(s) of the visual stimulus group(s).
+    """
+    group_names = list(visual_stimulus_groups.keys())
+    column_names = []
+    for group_columns in visual_stimulus_groups.values():
+        column_names.extend(column_name for column_name in group_columns if column_name not in column_names)
+
+    columns_data = dict()
+    for column_name in column_names:
+        reference = next(group[column_name] for group in visual_stimulus_groups.values() if column_name in group)
+        column_data = []
+        for group_columns in visual_stimulus_groups.values():
+            if column_name in group_columns:
+                column_data.append(np.asarray(group_columns[column_name]))
+            else:
+                num_trials = len(group_columns["start_time"])
+                reference_dtype = np.asarray(reference).dtype
+                if reference_dtype.kind in "USO":
+                    fill_value, fill_dtype = "", reference_dtype
+                else:
+                    fill_value, fill_dtype = np.nan, float
+                column_data.append(np.full((num_trials, *np.shape(reference)[1:]), fill_value, dtype=fill_dtype))
+        columns_data[column_name] = np.concatenate(column_data)
+    if len(group_names) > 1:
+        columns_data["visual_stimulus_type"] = np.concatenate(
+            [[group_name] * len(group["start_time"]) for group_name, group in visual_stimulus_groups.items()]
+        )
+        sorting_indices = np.argsort(columns_data["start_time"], kind="stable")
+        columns_data = {column_name: data[sorting_indices] for column_name, data in columns_data.items()}
+
+    time_intervals_descriptions = {
+        column_spec["name"]: column_spec["description"] for column_spec in TimeIntervals.__columns__
+    }
+    columns = [
+        VectorData(
+            name=column_name,
+            description=(
+                time_intervals_descriptions.get(column_name)
+                or _VARIABLES_DESCRIPTION.get(column_name)
+                or column_name.replace("_", " ")
+            ),
+            data=data,
+        )
+        for column_name, data in columns_data.items()
+    ]
+    if description is None:
+        description = ", ".join(group_name.replace("_", " ") for group_name in group_names)
+    return TimeIntervals(name=name, description=description, columns=columns)
 
 
 class Hendricks2024VisualStimuliInterface(BaseDataInterface):
@@ -35,7 +152,9 @@ class Hendricks2024VisualStimuliInterface(BaseDataInterface):
         self,
         folder_path: FolderPathType,
         visual_stimulus_file_path: FilePathType,
-        visual_stimulus_type: str = None,
+        visual_stimulus_type: Union[str, List[str]] = None,
+        tiff_index: Optional[Hendricks2024ScanImageTiffIndex] = None,
+        stimulus_file: Optional[Hendricks2024StimulusFile] = None,
         verbose: bool = True,
     ):
         """
@@ -47,73 +166,61 @@ class Hendricks2024VisualStimuliInterface(BaseDataInterface):
             The folder path that contains the imaging data.
         visual_stimulus_file_path: FilePathType
             The file path for the .hdf5 file that contains the  visual stimuli data
-        visual_stimulus_type: str, default: None
-            The name of the visual stimulus applied in the current epoch as reported in the .hdf5 header
+        visual_stimulus_type: str or list of str, default: None
+            The name of the visual stimulus applied in the current epoch as reported in the .hdf5 header.
+            A list of names adds the visual stimuli of all these groups to the same table.
+        tiff_index: Hendricks2024ScanImageTiffIndex, optional
+            The index of the .tif files in `folder_path`, shared between the interfaces of the same epoch.
+            If not provided, a new one is created.
+        stimulus_file: Hendricks2024StimulusFile, optional
+            The open handle on `visual_stimulus_file_path`, shared between the interfaces of the conversion.
+            If not provided, a new one is created.
         verbose : bool, default: True
         """
 
         folder_path = Path(folder_path)
-        tif_file_paths = natsorted(folder_path.glob("*.tif"))
-        assert tif_file_paths, f"The TIF image files are missing from '{folder_path}'."
-        self._total_number_of_trials = len(tif_file_paths)
-
-        self.trial_start_times = []
-        for tif_file_path in tif_file_paths:
-            timestamps = extract_timestamps_from_file(file_path=tif_file_path)
-            self.trial_start_times.append(timestamps[0])
-
-        data = h5py.File(visual_stimulus_file_path, "r")
-        if visual_stimulus_type not in data.keys() or visual_stimulus_type is None:
+        self.tiff_index = get_tiff_index(folder_path=folder_path, tiff_index=tiff_index)
+        # The timestamps of the .tif files are only read (once, by the shared index) when the trials are added
+        self._total_number_of_trials = len(self.tiff_index)
+
+        self.stimulus_file = get_stimulus_file(file_path=visual_stimulus_file_path, stimulus_file=stimulus_file)
+        visual_stimulus_types = visual_stimulus_type
+        if isinstance(visual_stimulus_type, str):
+            visual_stimulus_types = [visual_stimulus_type]
+        if not visual_stimulus_types or any(name not in self.stimulus_file for name in visual_stimulus_types):
             raise ValueError(
                 f"'{visual_stimulus_type}' is not a valid visual_stimulus_type"
-                f" it must be one of the following {list(data.keys())} as defined in {visual_stimulus_file_path}"
+                f" it must be one of the following {self.stimulus_file.keys()}"
+                f" as defined in {visual_stimulus_file_path}"
             )
-        else:
-            self.visual_stimulus_type = visual_stimulus_type
-
-        data = data[self.visual_stimulus_type]
-        self.visual_stim_dict = dict()
-        for key, item in data.items():
-            self.visual_stim_dict[key] = h5py_to_dict(item)
+        self.visual_stimulus_types = list(visual_stimulus_types)
+        self.visual_stimulus_type = self.visual_stimulus_types[0]
 
-            self._variables_description = {
-                "orientation": "orientation of drifting grating in degrees (0-360)",
-                "size_vdeg": "size of stimulus in visual degrees, 1d of length n trials",
-                "contrast": "contrast of gratings, values between 0-1",
-                "location": "(X,Y) location on screen in visual degrees",
-            }
+        # Lazy views of the groups, the trial-wise variables are only read when the table is written
+        self.visual_stim_dicts = {
+            visual_stimulus_type: self.stimulus_file[visual_stimulus_type]
+            for visual_stimulus_type in self.visual_stimulus_types
+        }
+        self.visual_stim_dict = self.visual_stim_dicts[self.visual_stimulus_type]
 
         super().__init__()
         self.verbose = verbose
 
+    @property
+    def trial_start_times(self) -> List[float]:
+        return self.tiff_index.get_trial_start_times()
+
     def add_to_nwbfile(
         self,
         nwbfile: NWBFile,
         metadata: Optional[dict] = None,
         stub_test: bool = False,
     ) -> None:
-        stimulus_table = TimeIntervals(
-            name="VisualStimuli",
-            description=self.visual_stimulus_type.replace("_", " "),
-        )
-        start_times = self.trial_start_times + self.visual_stim_dict["vis_times"][0]
-        stop_times = self.trial_start_times + self.visual_stim_dict["vis_times"][1]
-        for t in range(self._total_number_of_trials):
-            stimulus_table.add_interval(start_time=start_times[t], stop_time=stop_times[t])
-
-        extra_columns = [key for key in self.visual_stim_dict.keys() if key not in ["vis_ids", "vis_times"]]
-
-        for column_name in extra_columns:
-            if isinstance(self.visual_stim_dict[column_name], (int, float, np.generic)):
-                # if it is define as scalar, copy the value for each trial
-                self.visual_stim_dict[column_name] = (
-                    np.ones((len(self.visual_stim_dict["vis_times"][0]))) * self.visual_stim_dict[column_name]
-                )
-            description = self._variables_description.get(column_name)
-            stimulus_table.add_column(
-                name=column_name,
-                description=description or column_name.replace("_", " "),
-                data=self.visual_stim_dict[column_name],
+        visual_stimulus_groups = {
+            visual_stimulus_type: get_visual_stimulus_group_columns(
+                trial_start_times=self.trial_start_times, visual_stim_dict=visual_stim_dict
             )
-
+            for visual_stimulus_type, visual_stim_dict in self.visual_stim_dicts.items()
+        }
+        stimulus_table = create_visual_stimuli_table(visual_stimulus_groups=visual_stimulus_groups)
         nwbfile.add_time_intervals(stimulus_table)
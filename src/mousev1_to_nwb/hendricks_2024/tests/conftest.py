@@ -0,0 +1,105 @@
+"""Fixtures of the checks of the Hendricks2024 conversion, over a small synthetic session."""
+
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+import pytest
+
+# The modules of the conversion import each other by module name, as when they are run from their folder
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from hendricks_2024_syntheticdata import generate_synthetic_session
+from hendricks_2024_convert_session import get_epoch_frame_ranges, session_to_nwb
+
+
+@pytest.fixture(scope="session")
+def synthetic_session(tmp_path_factory) -> dict:
+    """
+    A session with 4 trials of 4 volumes of 256x256 frames in each epoch, with the frame range of each epoch and the id
+    of the subject.
+    """
+    synthetic_session = generate_synthetic_session(
+        folder_path=tmp_path_factory.mktemp("synthetic_session"),
+        num_trials=4,
+        volumes_per_trial=4,
+        frame_shape=(256, 256),
+        num_cells_per_plane=5,
+        num_targets=6,
+        num_holograms=3,
+        max_rois_per_hologram=3,
+    )
+    synthetic_session["epoch_frame_ranges"] = get_epoch_frame_ranges(
+        segmentation_folder_path=synthetic_session["segmentation_folder_path"],
+        epoch_names=synthetic_session["epoch_names"],
+    )
+    synthetic_session["subject_id"] = "synthetic"
+    return synthetic_session
+
+
+@pytest.fixture(scope="session")
+def convert_epoch(synthetic_session):
+    """Convert one epoch of the synthetic session with `session_to_nwb`, the keyword arguments are passed through."""
+
+    def _convert_epoch(epoch_name: str, output_dir_path: Path, **session_to_nwb_kwargs) -> Path:
+        visual_stimulus_mapping = synthetic_session["epoch_name_visual_stimulus_mapping"]
+        is_holographic = epoch_name in synthetic_session["holographic_epoch_names"]
+        start_frame, end_frame = synthetic_session["epoch_frame_ranges"][epoch_name]
+        session_to_nwb_kwargs.setdefault("use_tiff_metadata_cache", False)
+        return session_to_nwb(
+            epoch_name=epoch_name,
+            subject_id=synthetic_session["subject_id"],
+            output_dir_path=output_dir_path,
+            imaging_folder_path=synthetic_session["imaging_folder_path"] / epoch_name,
+            segmentation_folder_path=synthetic_session["segmentation_folder_path"],
+            visual_stimulus_file_path=(
+                synthetic_session["stimulus_file_path"] if epoch_name in visual_stimulus_mapping else None
+            ),
+            epoch_name_visual_stimulus_mapping=visual_stimulus_mapping,
+            holographic_stimulation_file_path=synthetic_session["stimulus_file_path"] if is_holographic else None,
+            segmentation_start_frame=start_frame,
+            segmentation_end_frame=end_frame,
+            epoch_name_description_mapping={epoch_name: f"The synthetic {epoch_name} epoch."},
+            **session_to_nwb_kwargs,
+        )
+
+    return _convert_epoch
+
+
+@pytest.fixture(scope="session")
+def default_nwbfile_paths(synthetic_session, convert_epoch, tmp_path_factory) -> dict:
+    """The NWB file of each epoch converted with the default options, by epoch name."""
+    output_dir_path = tmp_path_factory.mktemp("default")
+    return {
+        epoch_name: convert_epoch(epoch_name=epoch_name, output_dir_path=output_dir_path)
+        for epoch_name in synthetic_session["epoch_names"]
+    }
+
+
+def _get_datasets(file: h5py.File) -> dict:
+    datasets = dict()
+    file.visititems(lambda name, item: datasets.update({name: item}) if isinstance(item, h5py.Dataset) else None)
+    return datasets
+
+
+@pytest.fixture(scope="session")
+def assert_same_datasets():
+    """Assert that two NWB files have the same datasets, except those that change with each write."""
+
+    def _assert_same_datasets(nwbfile_path: Path, expected_nwbfile_path: Path) -> None:
+        with h5py.File(nwbfile_path, mode="r") as file, h5py.File(expected_nwbfile_path, mode="r") as expected_file:
+            datasets = _get_datasets(file)
+            expected_datasets = _get_datasets(expected_file)
+            assert set(datasets) ^ set(expected_datasets) == set()
+            for name, expected_dataset in expected_datasets.items():
+                if name.split("/")[-1] in ("file_create_date", "identifier"):
+                    continue
+                dataset = datasets[name]
+                assert dataset.shape == expected_dataset.shape, name
+                if expected_dataset.dtype.kind in "fiub":
+                    np.testing.assert_array_equal(dataset[()], expected_dataset[()], err_msg=name)
+                elif h5py.check_string_dtype(expected_dataset.dtype) is not None:
+                    np.testing.assert_array_equal(dataset.asstr()[()], expected_dataset.asstr()[()], err_msg=name)
+
+    return _assert_same_datasets
@@ -0,0 +1,9 @@
+from hendricks_2024_benchmarksuite import benchmark_synthetic_session
+
+
+def test_benchmark_synthetic_session(synthetic_session, tmp_path):
+    """The benchmarks of the conversion steps run to the end on every epoch of a synthetic session."""
+    metrics = benchmark_synthetic_session(session=synthetic_session, output_folder_path=tmp_path, num_repeats=1)
+    for epoch_name in synthetic_session["epoch_names"]:
+        assert f"{epoch_name}.session_to_nwb.conversion_time" in metrics
+    assert "5stim.holographic_stimulus_table.column_wise_time" in metrics
@@ -0,0 +1,55 @@
+import h5py
+import pytest
+
+from hendricks_2024_convert_session import get_session_metadata
+
+CONVERSION_MODES = dict(
+    resume=dict(resume=True),
+    deinterleave_imaging=dict(deinterleave_imaging=True),
+    pipeline_imaging=dict(pipeline_imaging=True),
+    deinterleave_and_pipeline_imaging=dict(deinterleave_imaging=True, pipeline_imaging=True),
+    imaging_buffer_gb=dict(imaging_buffer_gb=0.001),
+    memory_budget_gb=dict(memory_budget_gb=0.5),
+    imaging_dataset_options=dict(imaging_dataset_options=dict(frames_per_chunk=2, compression_method="lzf")),
+    holographic_target_matching=dict(holographic_target_matching="verify"),
+)
+
+
+@pytest.mark.parametrize("epoch_name", ["4ori", "5stim"])
+@pytest.mark.parametrize("conversion_mode", CONVERSION_MODES.keys())
+def test_conversion_mode(
+    conversion_mode, epoch_name, convert_epoch, default_nwbfile_paths, assert_same_datasets, tmp_path
+):
+    """The options that change how an epoch is read and written do not change the data written."""
+    nwbfile_path = convert_epoch(epoch_name=epoch_name, output_dir_path=tmp_path, **CONVERSION_MODES[conversion_mode])
+    assert_same_datasets(nwbfile_path=nwbfile_path, expected_nwbfile_path=default_nwbfile_paths[epoch_name])
+
+
+def test_resume_patches_changed_session_metadata(synthetic_session, convert_epoch, tmp_path):
+    """With `resume`, an epoch whose session metadata changed is patched instead of skipped."""
+    nwbfile_path = convert_epoch(epoch_name="4ori", output_dir_path=tmp_path, resume=True)
+
+    session_metadata = get_session_metadata(subject_id=synthetic_session["subject_id"])
+    session_metadata["NWBFile"]["institution"] = "Synthetic institution"
+    session_metadata["Subject"]["weight"] = "0.03"
+    convert_epoch(epoch_name="4ori", output_dir_path=tmp_path, resume=True, session_metadata=session_metadata)
+    with h5py.File(nwbfile_path, mode="r") as file:
+        assert file["general/institution"][()].decode() == "Synthetic institution"
+        assert file["general/subject/weight"][()].decode() == "0.03"
+
+
+def test_metadata_only_then_skip(synthetic_session, convert_epoch, tmp_path, capsys):
+    """After its metadata is rewritten with `metadata_only`, an epoch with the same inputs is skipped by `resume`."""
+    nwbfile_path = convert_epoch(epoch_name="5stim", output_dir_path=tmp_path, resume=True)
+
+    session_metadata = get_session_metadata(subject_id=synthetic_session["subject_id"])
+    session_metadata["NWBFile"]["lab"] = "Synthetic lab"
+    convert_epoch(
+        epoch_name="5stim", output_dir_path=tmp_path, metadata_only=True, resume=True, session_metadata=session_metadata
+    )
+    with h5py.File(nwbfile_path, mode="r") as file:
+        assert file["general/lab"][()].decode() == "Synthetic lab"
+
+    capsys.readouterr()
+    convert_epoch(epoch_name="5stim", output_dir_path=tmp_path, resume=True, session_metadata=session_metadata)
+    assert f"Skipping '{nwbfile_path}'" in capsys.readouterr().out
@@ -0,0 +1,55 @@
+import h5py
+import numpy as np
+import pytest
+
+from hendricks_2024_holostiminterface import Hendricks2024HolographicStimulationInterface, Hendricks2024RoiIdIndex
+
+
+def test_holographic_epoch_round_trip(synthetic_session, convert_epoch, tmp_path):
+    """The stimulus table of a holographic epoch is written, and each row of "power_per_roi" spans its hologram."""
+    epoch_name = synthetic_session["holographic_epoch_names"][0]
+    nwbfile_path = convert_epoch(epoch_name=epoch_name, output_dir_path=tmp_path)
+
+    interface = Hendricks2024HolographicStimulationInterface(
+        folder_path=synthetic_session["imaging_folder_path"] / epoch_name,
+        holographic_stimulation_file_path=synthetic_session["stimulus_file_path"],
+        epoch_name=epoch_name,
+        verbose=False,
+    )
+    stimulus_onsets = interface.get_stimulus_onsets()
+
+    # The table is read with h5py: the constructor of PatternedOptogeneticStimulusTable (ndx-patterned-ogen 0.1.0)
+    # checks the "_per_roi" columns with `len` on the flat data, which fails on read for a ragged column as well
+    with h5py.File(nwbfile_path, mode="r") as file:
+        stimulus_table = file["intervals/PatternedOptogeneticStimulusTable"]
+        np.testing.assert_array_equal(stimulus_table["start_time"][:], stimulus_onsets["start_time"])
+        power_per_roi = stimulus_table["power_per_roi"][:]
+        power_per_roi_index = stimulus_table["power_per_roi_index"][:]
+        row_starts = np.concatenate([[0], power_per_roi_index[:-1]])
+        for row, (row_start, row_end) in enumerate(zip(row_starts, power_per_roi_index)):
+            hologram = file[stimulus_table["targets"][row]]
+            assert row_end - row_start == len(hologram["targeted_rois"])
+            row_power = power_per_roi[row_start:row_end]
+            assert np.count_nonzero(row_power) == 1
+            assert row_power[stimulus_onsets["roi_position"][row]] == stimulus_onsets["power"][row]
+
+
+def test_roi_id_index():
+    """The unmatched targeted rois are numbered after the segmented rois, in their order."""
+    # Targeted rois 0 and 3 match the segmented roi 2, targeted roi 2 matches the segmented roi 0
+    roi_id_index = Hendricks2024RoiIdIndex(
+        targeted_to_segmented_roi_ids=[2, np.nan, 0, 2, np.nan], num_segmented_rois=4
+    )
+
+    assert roi_id_index.num_global_rois == 6
+    np.testing.assert_array_equal(roi_id_index.targeted_to_segmented_ids, [2, -1, 0, 2, -1])
+    np.testing.assert_array_equal(roi_id_index.targeted_to_global_ids, [2, 4, 0, 2, 5])
+    np.testing.assert_array_equal(roi_id_index.segmented_to_global_ids, [0, 1, 2, 3])
+    np.testing.assert_array_equal(roi_id_index.segmented_to_targeted_ids, [2, -1, 0, -1])
+    np.testing.assert_array_equal(roi_id_index.global_to_segmented_ids, [0, 1, 2, 3, -1, -1])
+    np.testing.assert_array_equal(roi_id_index.global_to_targeted_ids, [2, -1, 0, -1, 1, 4])
+
+
+def test_roi_id_index_rejects_unknown_segmented_rois():
+    with pytest.raises(ValueError, match="between 0 and 3"):
+        Hendricks2024RoiIdIndex(targeted_to_segmented_roi_ids=[0, 4], num_segmented_rois=4)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from hendricks_2024_imagingextractor import (
+    Hendricks2024DeinterleavedSinglePlaneImagingExtractor,
+    Hendricks2024DeinterleavingTiffReader,
+    Hendricks2024SinglePlaneImagingExtractor,
+)
+from hendricks_2024_tiffindex import Hendricks2024ScanImageTiffIndex
+
+
+@pytest.fixture
+def deinterleaving_reader(synthetic_session):
+    tiff_index = Hendricks2024ScanImageTiffIndex(folder_path=synthetic_session["imaging_folder_path"] / "4ori")
+    deinterleaving_reader = Hendricks2024DeinterleavingTiffReader(tiff_index=tiff_index)
+    yield deinterleaving_reader
+    deinterleaving_reader.cleanup()
+
+
+@pytest.mark.parametrize("frames_per_slice", [1, 2])
+def test_round_robin_page_math(deinterleaving_reader, frames_per_slice):
+    """The pages are ordered by cycle, then by plane, then by frame of the slice and then by channel."""
+    reader = deinterleaving_reader
+    reader.frames_per_slice = frames_per_slice
+    reader._pages_per_cycle = reader.num_channels * reader.num_planes * frames_per_slice
+    num_cycles = 3
+    page_indices = np.arange(num_cycles * reader._pages_per_cycle)
+
+    channel_indices, plane_indices, frame_indices = reader._page_to_frame_location(page_indices=page_indices)
+    expected_locations = [
+        (channel_index, plane_index, cycle_index * frames_per_slice + slice_frame_index)
+        for cycle_index in range(num_cycles)
+        for plane_index in range(reader.num_planes)
+        for slice_frame_index in range(frames_per_slice)
+        for channel_index in range(reader.num_channels)
+    ]
+    assert list(zip(channel_indices, plane_indices, frame_indices)) == expected_locations
+
+    for channel_index in range(reader.num_channels):
+        for plane_index in range(reader.num_planes):
+            is_location = (channel_indices == channel_index) & (plane_indices == plane_index)
+            np.testing.assert_array_equal(frame_indices[is_location], np.arange(num_cycles * frames_per_slice))
+            location_page_indices = reader._frame_to_page_indices(
+                channel_index=channel_index, plane_index=plane_index, frame_indices=frame_indices[is_location]
+            )
+            np.testing.assert_array_equal(location_page_indices, page_indices[is_location])
+
+
+@pytest.mark.parametrize("use_memmap", [True, False])
+def test_deinterleaved_frames(synthetic_session, use_memmap):
+    """The frames and the timestamps of each (channel, plane) are those of the ScanImage extractor."""
+    folder_path = synthetic_session["imaging_folder_path"] / "4ori"
+    tiff_index = Hendricks2024ScanImageTiffIndex(folder_path=folder_path)
+    deinterleaving_reader = Hendricks2024DeinterleavingTiffReader(tiff_index=tiff_index, use_memmap=use_memmap)
+    try:
+        for channel_name in tiff_index.get_available_channels():
+            for plane_name in tiff_index.get_available_planes():
+                imaging_extractor = Hendricks2024SinglePlaneImagingExtractor(
+                    folder_path=folder_path, channel_name=channel_name, plane_name=plane_name, tiff_index=tiff_index
+                )
+                deinterleaved_imaging_extractor = Hendricks2024DeinterleavedSinglePlaneImagingExtractor(
+                    folder_path=folder_path,
+                    channel_name=channel_name,
+                    plane_name=plane_name,
+                    tiff_index=tiff_index,
+                    deinterleaving_reader=deinterleaving_reader,
+                )
+                num_frames = imaging_extractor.get_num_frames()
+                assert deinterleaved_imaging_extractor.get_num_frames() == num_frames
+                np.testing.assert_array_equal(
+                    deinterleaved_imaging_extractor.get_video(start_frame=1, end_frame=num_frames - 1),
+                    imaging_extractor.get_video(start_frame=1, end_frame=num_frames - 1),
+                )
+                np.testing.assert_array_equal(
+                    deinterleaved_imaging_extractor.frame_to_time(np.arange(num_frames)),
+                    imaging_extractor.frame_to_time(np.arange(num_frames)),
+                )
+    finally:
+        deinterleaving_reader.cleanup()
@@ -0,0 +1,138 @@
+import json
+
+import h5py
+import pytest
+
+import hendricks_2024_convert_session
+from hendricks_2024_manifest import (
+    Hendricks2024ConversionManifest,
+    get_epoch_fingerprint,
+    get_metadata_fingerprint,
+)
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+@pytest.mark.parametrize("epoch_name", ["4ori", "5stim"])
+def test_resume_after_crash(
+    epoch_name, convert_epoch, default_nwbfile_paths, assert_same_datasets, tmp_path, monkeypatch
+):
+    """An epoch interrupted while writing its imaging series is resumed into the same file as a clean conversion."""
+    record_imaging_progress = Hendricks2024ConversionManifest.record_imaging_progress
+    num_records = 0
+
+    def record_imaging_progress_then_crash(self, interface_name: str, frames_written: int) -> None:
+        nonlocal num_records
+        num_records += 1
+        if num_records == 4:
+            raise SimulatedCrash()
+        record_imaging_progress(self, interface_name=interface_name, frames_written=frames_written)
+
+    monkeypatch.setattr(Hendricks2024ConversionManifest, "record_imaging_progress", record_imaging_progress_then_crash)
+    with pytest.raises(SimulatedCrash):
+        convert_epoch(epoch_name=epoch_name, output_dir_path=tmp_path, resume=True)
+    monkeypatch.undo()
+
+    nwbfile_path = default_nwbfile_paths[epoch_name]
+    manifest = Hendricks2024ConversionManifest(nwbfile_path=tmp_path / nwbfile_path.parent.name / nwbfile_path.name)
+    assert manifest.content["status"] == "writing_imaging"
+
+    def write_nwbfile(**kwargs) -> None:
+        raise AssertionError("The interrupted epoch was written again instead of being resumed.")
+
+    monkeypatch.setattr(hendricks_2024_convert_session, "_write_nwbfile", write_nwbfile)
+    resumed_nwbfile_path = convert_epoch(epoch_name=epoch_name, output_dir_path=tmp_path, resume=True)
+    assert json.loads(manifest.manifest_file_path.read_text())["status"] == "completed"
+    assert_same_datasets(nwbfile_path=resumed_nwbfile_path, expected_nwbfile_path=nwbfile_path)
+    with h5py.File(resumed_nwbfile_path, mode="r") as file:
+        assert "specifications" in file
+
+
+def test_conversion_steps(tmp_path):
+    """The manifest decides to write, resume, skip or patch the NWB file from its state and the fingerprint."""
+    nwbfile_path = tmp_path / "epoch.nwb"
+    input_fingerprint = dict(data="data", metadata="metadata")
+    manifest = Hendricks2024ConversionManifest(nwbfile_path=nwbfile_path)
+    assert manifest.get_conversion_step(input_fingerprint=input_fingerprint) == "write"
+
+    manifest.start(
+        input_fingerprint=input_fingerprint,
+        interface_names=["Imaging", "Segmentation"],
+        imaging_interface_names=["Imaging"],
+    )
+    nwbfile_path.touch()
+    assert manifest.get_conversion_step(input_fingerprint=input_fingerprint) == "write"
+
+    manifest.record_imaging_progress(interface_name="Imaging", frames_written=10)
+    manifest.record_imaging_progress(interface_name="Imaging", frames_written=5)
+    manifest = Hendricks2024ConversionManifest(nwbfile_path=nwbfile_path)
+    assert manifest.content["completed_interfaces"] == ["Segmentation"]
+    assert manifest.get_frames_written(interface_name="Imaging") == 10
+    assert manifest.get_conversion_step(input_fingerprint=input_fingerprint) == "resume"
+    assert manifest.get_conversion_step(input_fingerprint=input_fingerprint, backend="zarr") == "write"
+    assert manifest.get_conversion_step(input_fingerprint=dict(input_fingerprint, data="changed")) == "write"
+
+    manifest.mark_completed()
+    assert manifest.get_conversion_step(input_fingerprint=input_fingerprint) == "skip"
+    changed_metadata_fingerprint = dict(input_fingerprint, metadata="changed")
+    assert manifest.get_conversion_step(input_fingerprint=changed_metadata_fingerprint) == "patch_metadata"
+    assert manifest.get_conversion_step(input_fingerprint=changed_metadata_fingerprint, backend="zarr") == "write"
+    assert manifest.get_conversion_step(input_fingerprint=dict(input_fingerprint, data="changed")) == "write"
+
+    manifest.record_metadata_patch(metadata_fingerprint="changed")
+    assert manifest.get_conversion_step(input_fingerprint=changed_metadata_fingerprint) == "skip"
+
+    nwbfile_path.unlink()
+    assert manifest.get_conversion_step(input_fingerprint=changed_metadata_fingerprint) == "write"
+
+
+def test_corrupted_manifest_is_ignored(tmp_path, capsys):
+    nwbfile_path = tmp_path / "epoch.nwb"
+    nwbfile_path.touch()
+    manifest = Hendricks2024ConversionManifest(nwbfile_path=nwbfile_path)
+    manifest.manifest_file_path.write_text('{"status": "compl')
+
+    manifest = Hendricks2024ConversionManifest(nwbfile_path=nwbfile_path)
+    assert "is corrupted" in capsys.readouterr().out
+    assert manifest.get_conversion_step(input_fingerprint=dict(data="data", metadata="metadata")) == "write"
+
+
+def test_epoch_fingerprint(tmp_path):
+    """The data and the metadata inputs only change their own part of the fingerprint."""
+    imaging_file_path = tmp_path / "file_00001.tif"
+    imaging_file_path.write_bytes(b"frames")
+    metadata_file_path = tmp_path / "metadata.yaml"
+    metadata_file_path.write_text("NWBFile:\n  lab: Adesnik\n")
+
+    def get_fingerprint(data_parameters: dict = None, metadata_parameters: dict = None) -> dict:
+        return get_epoch_fingerprint(
+            imaging_file_paths=[imaging_file_path],
+            data_parameters=data_parameters or dict(epoch_name="4ori"),
+            metadata_file_paths=[metadata_file_path],
+            metadata_parameters=metadata_parameters or dict(metadata=dict(NWBFile=dict(institution="UC Berkeley"))),
+        )
+
+    fingerprint = get_fingerprint()
+    assert get_fingerprint() == fingerprint
+    assert fingerprint["metadata"] == get_metadata_fingerprint(
+        metadata_file_paths=[metadata_file_path],
+        metadata_parameters=dict(metadata=dict(NWBFile=dict(institution="UC Berkeley"))),
+    )
+
+    changed_fingerprint = get_fingerprint(data_parameters=dict(epoch_name="5stim"))
+    assert changed_fingerprint["data"] != fingerprint["data"]
+    assert changed_fingerprint["metadata"] == fingerprint["metadata"]
+
+    changed_fingerprint = get_fingerprint(metadata_parameters=dict(metadata=dict(NWBFile=dict(institution="UCB"))))
+    assert changed_fingerprint["data"] == fingerprint["data"]
+    assert changed_fingerprint["metadata"] != fingerprint["metadata"]
+
+    metadata_file_path.write_text("NWBFile:\n  lab: Synthetic lab\n")
+    changed_fingerprint = get_fingerprint()
+    assert changed_fingerprint["data"] == fingerprint["data"]
+    assert changed_fingerprint["metadata"] != fingerprint["metadata"]
+
+    imaging_file_path.write_bytes(b"more frames")
+    assert get_fingerprint()["data"] != fingerprint["data"]
@@ -0,0 +1,70 @@
+import shutil
+
+import h5py
+import numpy as np
+
+from hendricks_2024_metadatapatch import patch_nwbfile_metadata, set_field
+
+
+def test_set_field(tmp_path):
+    with h5py.File(tmp_path / "file.h5", mode="w") as file:
+        group = file.create_group("object")
+        group.attrs["description"] = "Old description."
+        group.create_dataset("weight", data="0.025", dtype=h5py.string_dtype())
+        group["weight"].attrs["unit"] = "kg"
+
+        assert not set_field(group=group, field_name="description", value="Old description.")
+        assert not set_field(group=group, field_name="description", value=None)
+        assert set_field(group=group, field_name="description", value="New description.")
+        assert group.attrs["description"] == "New description."
+
+        # A dataset of a different length is replaced, with its attributes
+        assert set_field(group=group, field_name="weight", value="0.0315")
+        assert group["weight"].asstr()[()] == "0.0315"
+        assert group["weight"].attrs["unit"] == "kg"
+
+        assert set_field(group=group, field_name="keywords", value=["mouse", "V1"])
+        assert list(group["keywords"].asstr()[()]) == ["mouse", "V1"]
+        assert not set_field(group=group, field_name="keywords", value=["mouse", "V1"])
+
+
+def test_patch_nwbfile_metadata(default_nwbfile_paths, tmp_path):
+    """The metadata of a holographic epoch is patched in place, and its data is left as it is."""
+    nwbfile_path = tmp_path / "epoch.nwb"
+    shutil.copy(default_nwbfile_paths["5stim"], nwbfile_path)
+    with h5py.File(nwbfile_path, mode="r") as file:
+        identifier = file["identifier"].asstr()[()]
+        imaging_data = file["acquisition/TwoPhotonSeriesChannel1Plane0/data"][()]
+
+    metadata = dict(
+        NWBFile=dict(identifier="changed", lab="Synthetic lab", session_description="A patched session."),
+        Subject=dict(weight="0.03", description="A synthetic mouse."),
+        Ophys=dict(
+            Device=[dict(name="CustomMicroscope", description="A patched microscope.")],
+            OptogeneticDevice=dict(LightSource=dict(name="LightSource", peak_power_in_W=0.05)),
+            OptogeneticStimulusSite=[dict(name="OptogeneticStimulusSite", device="LightSource", location="VISl")],
+        ),
+        LabMetaData=dict(TemporalFocusing=dict(name="TemporalFocusing", description="A patched pattern.")),
+    )
+    patched_fields = patch_nwbfile_metadata(nwbfile_path=nwbfile_path, metadata=metadata)
+    assert sorted(patched_fields) == [
+        "/general/TemporalFocusing/description",
+        "/general/devices/CustomMicroscope/description",
+        "/general/devices/LightSource/peak_power_in_W",
+        "/general/lab",
+        "/general/optogenetics/OptogeneticStimulusSite/location",
+        "/general/subject/description",
+        "/general/subject/weight",
+        "/session_description",
+    ]
+    assert patch_nwbfile_metadata(nwbfile_path=nwbfile_path, metadata=metadata) == []
+
+    with h5py.File(nwbfile_path, mode="r") as file:
+        assert file["identifier"].asstr()[()] == identifier
+        assert file["session_description"].asstr()[()] == "A patched session."
+        assert file["general/lab"].asstr()[()] == "Synthetic lab"
+        assert file["general/subject/weight"].asstr()[()] == "0.03"
+        assert file["general/subject/description"].asstr()[()] == "A synthetic mouse."
+        assert file["general/devices/LightSource"].attrs["peak_power_in_W"] == 0.05
+        assert file["general/optogenetics/OptogeneticStimulusSite/location"].asstr()[()] == "VISl"
+        np.testing.assert_array_equal(file["acquisition/TwoPhotonSeriesChannel1Plane0/data"][()], imaging_data)